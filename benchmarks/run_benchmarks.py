@@ -0,0 +1,256 @@
+"""
+Times the scanner stages on synthetic data across horizons and tick intervals.
+
+Usage, from the project root:
+
+    python -m benchmarks.run_benchmarks --horizons 1M,1Y --ticks 1min,5min
+    python -m benchmarks.run_benchmarks --save-baseline
+    python -m benchmarks.run_benchmarks --baseline benchmarks/results/baseline.json
+
+Results are written as JSON, one record per stage, horizon and tick interval, with the median
+wall time over the repeats and the peak traced memory. When a baseline is given, stages slower
+than the baseline by more than the tolerance are reported as regressions and the exit code is 1.
+
+The startup of the command line, `main.py --help` and parsing run.cfg in a fresh interpreter, is
+timed as well. It fails, with exit code 1, above the startup target or when it imports any of the
+modules only a run should import.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import statistics
+from datetime import datetime
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_data import generate_fx_bars
+from src.period import Period
+from src.utils import create_daily_date_schedule, create_overlapping_time_grid, high_low_per_window, shift_date_by_period
+from src.bar_series import BarSeries
+from src.window_scan_engine import WindowScanEngine
+from src.fx_time_interval_scanner import FxTimeIntervalScanner
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_HORIZONS = '1M,3M,1Y,5Y'
+DEFAULT_TICKS = '1min,5min,15min,30min'
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Startup of the command line, in seconds, and the modules it must leave to the run
+STARTUP_TARGET_SECONDS = 0.25
+LAZY_MODULES = ('pandas', 'numpy', 'holidays', 'dotenv', 'MetaTrader5', 'psutil', 'pyarrow')
+
+# The scanner logs every trading day, so benchmark progress goes through its own logger
+logger = logging.getLogger('benchmarks')
+
+
+class SyntheticMarketDataService:
+    """Serves pre-generated bars in place of MarketDataService."""
+
+    def __init__(self, bars: pd.DataFrame) -> None:
+        self.bars = bars
+
+    def load_market_data(self, fx_cross, tick_interval, first_day, last_day) -> pd.DataFrame:
+        return self.bars.copy()
+
+
+def measure(func, repeats: int) -> dict:
+    """Median and best wall time of func over the repeats, then its peak traced memory in one more call."""
+    timings = []
+    for _ in range(repeats):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'seconds': statistics.median(timings),
+        'min_seconds': min(timings),
+        'peak_mb': peak / 2**20,
+    }
+
+
+def benchmark_case(horizon: Period, tick_interval: Period, window: Period, repeats: int, seed: int) -> list:
+    """Times every stage for one horizon and tick interval."""
+    end = pd.Timestamp('2025-01-01')
+    start = shift_date_by_period(horizon, end, '-')
+    bars = generate_fx_bars(start, (end - start).days, str(tick_interval), seed=seed)
+    case = {'horizon': str(horizon), 'tick_interval': str(tick_interval), 'window': str(window), 'rows': len(bars)}
+
+    scanner = FxTimeIntervalScanner(
+        tick_interval, 'SYNTH', window, horizon, None, SyntheticMarketDataService(bars),
+        0.0005, 'ETC/UTC', 'ETC/UTC', '0900')
+
+    day_open = pd.Timestamp(end.year, end.month, end.day, 9, tz='UTC') - pd.Timedelta(days=3)
+    day_bars = bars.tz_localize('UTC')
+    day_bars = day_bars[(day_bars.index >= day_open) & (day_bars.index < day_open + pd.Timedelta(days=1))]
+    day_windows = create_overlapping_time_grid(day_open, day_open + pd.Timedelta(days=1), tick_interval, window, False)
+
+    bar_times = bars.index.as_unit('ns').asi8
+    day_opens = (pd.date_range(start, end, freq='D') + pd.Timedelta(hours=9)).as_unit('ns').asi8
+    engine = WindowScanEngine(tick_interval, window, 0.0005)
+    compact_bars = BarSeries.from_frame(bars, bars.index.tz_localize('UTC'))
+
+    stages = {
+        'create_daily_date_schedule': lambda: create_daily_date_schedule(
+            pd.Timestamp(start, tz='UTC'), pd.Timestamp(end, tz='UTC')),
+        'create_overlapping_time_grid': lambda: create_overlapping_time_grid(
+            day_open, day_open + pd.Timedelta(days=1), tick_interval, window, True),
+        'high_low_per_window': lambda: [high_low_per_window(w, day_bars) for w in day_windows],
+        'window_scan_engine': lambda: engine.scan(
+            bar_times, bars['high'].to_numpy(), bars['low'].to_numpy(), day_opens),
+        'compact_bars': lambda: BarSeries.from_frame(bars, bars.index.tz_localize('UTC')),
+        'window_scan_engine_compact': lambda: engine.scan_bars(compact_bars, day_opens),
+        'run_scanner': scanner.run_scanner,
+        'export_results': lambda: scanner.export_results(True),
+    }
+
+    records = []
+    for stage, func in stages.items():
+        record = dict(stage=stage, **case, **measure(func, repeats))
+        logger.info(f"{stage:<30} {record['horizon']:>3} {record['tick_interval']:>6}: "
+                    f"{record['seconds']:.4f}s, peak {record['peak_mb']:.1f}MB")
+        records.append(record)
+    return records
+
+
+def benchmark_startup(repeats: int, target: float) -> tuple:
+    """
+    Times the command line startup in fresh interpreters, then lists the lazy modules it imports
+    in one more run with -X importtime.
+
+    :return: Tuple of the records and those failing the target or importing a lazy module.
+    """
+    parse_config = ("from src.cli import build_parser, parse_overrides; from src.configuration import Configuration; "
+                    "Configuration('run.cfg', parse_overrides(build_parser().parse_args([])))")
+    commands = {
+        'startup_help': ['main.py', '--help'],
+        'startup_config': ['-c', parse_config],
+    }
+
+    records = []
+    failures = []
+    for stage, command in commands.items():
+        timings = []
+        for _ in range(repeats):
+            start = perf_counter()
+            subprocess.run([sys.executable] + command, cwd=PROJECT_DIR, capture_output=True, check=True)
+            timings.append(perf_counter() - start)
+
+        traced = subprocess.run([sys.executable, '-X', 'importtime'] + command, cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+        imported = {line.rsplit('|', 1)[-1].strip().split('.')[0] for line in traced.stderr.splitlines() if line.startswith('import time:')}
+
+        record = {
+            'stage': stage, 'horizon': '-', 'tick_interval': '-', 'window': '-', 'rows': None,
+            'seconds': statistics.median(timings), 'min_seconds': min(timings), 'peak_mb': None,
+            'target_seconds': target, 'lazy_imports': sorted(imported.intersection(LAZY_MODULES)),
+        }
+        logger.info(f"{stage:<30} {'':>3} {'':>6}: {record['seconds']:.4f}s (target {target:.2f}s)"
+                    + (f", imports {', '.join(record['lazy_imports'])}" if record['lazy_imports'] else ''))
+        records.append(record)
+        if record['seconds'] > target or record['lazy_imports']:
+            failures.append(record)
+    return records, failures
+
+
+def compare(records: list, baseline: list, tolerance: float, min_seconds: float) -> list:
+    """
+    Compares records against a baseline run.
+
+    :return: The records slower than their baseline by more than the tolerance, with the ratio.
+    """
+    reference = {(r['stage'], r['horizon'], r['tick_interval'], r['window']): r for r in baseline}
+    regressions = []
+    for record in records:
+        base = reference.get((record['stage'], record['horizon'], record['tick_interval'], record['window']))
+        if base is None:
+            continue
+
+        ratio = record['seconds'] / base['seconds'] if base['seconds'] > 0 else float('inf')
+        record['baseline_seconds'] = base['seconds']
+        record['ratio'] = ratio
+        if ratio > 1 + tolerance and record['seconds'] - base['seconds'] > min_seconds:
+            regressions.append(record)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the FX scanner stages on synthetic data.")
+    parser.add_argument('--horizons', default=DEFAULT_HORIZONS, help="comma separated horizons (default %(default)s)")
+    parser.add_argument('--ticks', default=DEFAULT_TICKS, help="comma separated tick intervals (default %(default)s)")
+    parser.add_argument('--window', default='90min', help="low/high window length (default %(default)s)")
+    parser.add_argument('--repeats', type=int, default=3, help="timed repeats per stage (default %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic data (default %(default)s)")
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'latest.json'), help="results file (default %(default)s)")
+    parser.add_argument('--baseline', help="baseline results file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="also save the results as benchmarks/results/baseline.json")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative slowdown flagged as a regression (default %(default)s)")
+    parser.add_argument('--min-seconds', type=float, default=0.005, help="absolute slowdown ignored as noise (default %(default)s)")
+    parser.add_argument('--startup-target', type=float, default=STARTUP_TARGET_SECONDS, help="command line startup target in seconds (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    logger.setLevel(logging.INFO)
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    # The scanner writes its csv outputs to ./output, keep them out of the project
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='fx_bench_')
+    os.makedirs(os.path.join(workdir, 'output'))
+    os.chdir(workdir)
+
+    records, startup_failures = benchmark_startup(args.repeats, args.startup_target)
+    for record in startup_failures:
+        logger.warning(f"STARTUP {record['stage']}: {record['seconds']:.4f}s vs a target of {record['target_seconds']:.2f}s"
+                       + (f", imports {', '.join(record['lazy_imports'])}" if record['lazy_imports'] else ''))
+
+    try:
+        for horizon in args.horizons.split(','):
+            for tick in args.ticks.split(','):
+                records += benchmark_case(Period(horizon.strip()), Period(tick.strip()), Period(args.window), args.repeats, args.seed)
+    finally:
+        os.chdir(cwd)
+
+    regressions = []
+    if baseline is not None:
+        with open(baseline) as f:
+            regressions = compare(records, json.load(f)['records'], args.tolerance, args.min_seconds)
+        for record in regressions:
+            logger.warning(f"REGRESSION {record['stage']} {record['horizon']} {record['tick_interval']}: "
+                            f"{record['seconds']:.4f}s vs {record['baseline_seconds']:.4f}s ({record['ratio']:.2f}x)")
+        if not regressions:
+            logger.info("No regressions against the baseline")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.platform(),
+        'records': records,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Results written to {output}")
+
+    if args.save_baseline:
+        with open(os.path.join(RESULTS_DIR, 'baseline.json'), 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if regressions or startup_failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
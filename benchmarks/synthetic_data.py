@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+def generate_fx_bars(start: str = '2020-01-01',
+                     days: int = 30,
+                     tick_interval: str = '5min',
+                     seed: int = 0,
+                     start_price: float = 1.1,
+                     daily_volatility: float = 0.005,
+                     gap_probability: float = 0.0,
+                     timezone: str = None) -> pd.DataFrame:
+    """
+    Generates deterministic synthetic OHLC bars in the csv layout read by MarketDataService.
+
+    Prices follow a random walk whose volatility has an intraday seasonality, peaking around
+    the London and New York opens. Weekends are closed, as on the FX market.
+
+    :param start: First calendar day, in UTC.
+    :param days: Number of calendar days to generate.
+    :param tick_interval: Bar length as a pandas frequency string (e.g. "1min").
+    :param seed: Seed of the random generator, the same seed always gives the same bars.
+    :param start_price: Opening price of the first bar.
+    :param daily_volatility: Standard deviation of the daily log return.
+    :param gap_probability: Probability of each bar being missing, to mimic data gaps.
+    :param timezone: If given, timestamps are expressed as naive wall-clock times in this
+        timezone, so DST changes produce repeated and skipped hours as in broker data.
+    :return: DataFrame indexed by a naive 'datetime' index with open, high, low and close columns.
+    """
+    rng = np.random.default_rng(seed)
+    bar_length = pd.Timedelta(tick_interval)
+    index = pd.date_range(start, periods=int(days * pd.Timedelta(days=1) / bar_length), freq=bar_length, tz='UTC')
+    index = index[index.dayofweek < 5]
+
+    # Volatility by time of day: quiet Asian session, peaks at the London and New York opens
+    hour = index.hour.to_numpy() + index.minute.to_numpy() / 60
+    seasonality = (0.5
+                   + np.exp(-0.5 * ((hour - 8) / 1.5) ** 2)
+                   + 1.2 * np.exp(-0.5 * ((hour - 13.5) / 1.5) ** 2))
+    seasonality /= np.sqrt(np.mean(seasonality ** 2))
+
+    bars_per_day = pd.Timedelta(days=1) / bar_length
+    bar_volatility = daily_volatility / np.sqrt(bars_per_day) * seasonality
+
+    returns = rng.standard_normal(len(index)) * bar_volatility
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate([[start_price], close[:-1]])
+
+    # Intra-bar excursions beyond the open and close
+    wick = np.abs(rng.standard_normal((2, len(index)))) * bar_volatility * close
+    high = np.maximum(open_, close) + wick[0]
+    low = np.minimum(open_, close) - wick[1]
+
+    df = pd.DataFrame({
+        'open': open_.round(5),
+        'high': high.round(5),
+        'low': low.round(5),
+        'close': close.round(5)}, index=index)
+
+    if gap_probability > 0:
+        df = df[rng.random(len(df)) >= gap_probability]
+
+    if timezone is not None:
+        df.index = df.index.tz_convert(timezone)
+    df.index = df.index.tz_localize(None)
+    df.index.name = 'datetime'
+    return df
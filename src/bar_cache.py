@@ -0,0 +1,149 @@
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Optional
+
+
+class BarCache:
+    """
+    Columnar on-disk cache of OHLC bars.
+
+    Each entry lives in its own directory holding one memory-mappable .npy file per column
+    plus a sorted int64 nanosecond time index, so date range reads only touch the requested rows.
+    """
+
+    INDEX_FILE = "datetime.npy"
+    META_FILE = "meta.json"
+
+    def __init__(self, cache_dir: str) -> None:
+        """
+        :param cache_dir: Root directory of the cache. Created on first write.
+        """
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(symbol: str, timeframe) -> str:
+        """Cache entry name for a symbol and timeframe (e.g. "EURUSD_5min")."""
+        return f"{symbol}_{timeframe}"
+
+    @staticmethod
+    def fingerprint(path: str) -> dict:
+        """Identifies a source file by absolute path, size and modification time."""
+        stat = os.stat(path)
+        return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def meta(self, key: str) -> Optional[dict]:
+        """Returns the metadata of an entry or None if the entry does not exist."""
+        meta_file = os.path.join(self.cache_dir, key, self.META_FILE)
+        if not os.path.exists(meta_file):
+            return None
+
+        with open(meta_file) as f:
+            return json.load(f)
+
+    def is_valid(self, key: str, source: Optional[dict] = None) -> bool:
+        """
+        Checks whether an entry exists and, if a source fingerprint is given, was built from it.
+
+        :param key: Cache entry name.
+        :param source: Fingerprint of the source the entry must have been built from.
+        """
+        meta = self.meta(key)
+        if meta is None:
+            return False
+        return source is None or meta.get("source") == source
+
+    def write(self,
+              key: str,
+              df: pd.DataFrame,
+              source: Optional[dict] = None,
+              coverage: Optional[tuple] = None) -> None:
+        """
+        Stores a bar DataFrame with a DatetimeIndex, sorted by time.
+
+        :param key: Cache entry name.
+        :param df: Bars to store. Only numeric columns are kept.
+        :param source: Optional fingerprint of the data source, used for invalidation.
+        :param coverage: Optional (start, end) timestamps of the range the bars were requested for.
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        df = df.sort_index(kind="stable")
+        columns = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+
+        # Write the metadata last so a partially written entry is never considered valid
+        meta_file = os.path.join(entry_dir, self.META_FILE)
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+
+        np.save(os.path.join(entry_dir, self.INDEX_FILE), df.index.as_unit("ns").asi8)
+        for col in columns:
+            np.save(os.path.join(entry_dir, col + ".npy"), df[col].to_numpy())
+
+        meta = {
+            "columns": columns,
+            "rows": len(df),
+            "source": source,
+            "coverage": None if coverage is None else [pd.Timestamp(ts).isoformat() for ts in coverage],
+            "updated": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(meta_file, "w") as f:
+            json.dump(meta, f, indent=2)
+
+        logging.debug(f"Cached {len(df)} bars under {entry_dir}")
+
+    def bounds(self,
+               key: str,
+               start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> Optional[tuple]:
+        """
+        First and last timestamps of an entry between start and end, both inclusive, read
+        from the memory-mapped index without loading the bars.
+
+        :return: Tuple of naive timestamps or None if the entry does not exist or has no bar in range.
+        """
+        if self.meta(key) is None:
+            return None
+
+        index = np.load(os.path.join(self.cache_dir, key, self.INDEX_FILE), mmap_mode="r")
+        first = 0 if start is None else np.searchsorted(index, pd.Timestamp(start).value, side="left")
+        last = len(index) if end is None else np.searchsorted(index, pd.Timestamp(end).value, side="right")
+        if first >= last:
+            return None
+
+        return pd.Timestamp(int(index[first])), pd.Timestamp(int(index[last - 1]))
+
+    def read(self,
+             key: str,
+             start: Optional[datetime] = None,
+             end: Optional[datetime] = None,
+             columns: Optional[list] = None) -> Optional[pd.DataFrame]:
+        """
+        Reads the bars of an entry between start and end, both inclusive.
+
+        :param key: Cache entry name.
+        :param start: First timestamp to include, naive and in the data timezone. None for no bound.
+        :param end: Last timestamp to include, naive and in the data timezone. None for no bound.
+        :param columns: Subset of columns to read. All stored columns by default.
+        :return: DataFrame indexed by datetime or None if the entry does not exist.
+        """
+        meta = self.meta(key)
+        if meta is None:
+            return None
+
+        entry_dir = os.path.join(self.cache_dir, key)
+        index = np.load(os.path.join(entry_dir, self.INDEX_FILE), mmap_mode="r")
+
+        first = 0 if start is None else np.searchsorted(index, pd.Timestamp(start).value, side="left")
+        last = len(index) if end is None else np.searchsorted(index, pd.Timestamp(end).value, side="right")
+
+        data = {}
+        for col in columns or meta["columns"]:
+            values = np.load(os.path.join(entry_dir, col + ".npy"), mmap_mode="r")
+            data[col] = np.array(values[first:last])
+
+        return pd.DataFrame(data, index=pd.DatetimeIndex(np.array(index[first:last]).view("datetime64[ns]"), name="datetime"))
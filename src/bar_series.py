@@ -0,0 +1,112 @@
+import logging
+import numpy as np
+import pandas as pd
+
+
+MAX_DECIMALS = 6
+INT32 = np.iinfo(np.int32)
+
+
+class BarSeries:
+    """
+    Compact bars holding only what the scan reads: int64 UTC nanosecond times, sorted, and the
+    high and low prices.
+
+    Prices are stored as int32 multiples of 10**-decimals (pips) when that round-trips every price
+    exactly, else as float32 when that is exact, else as float64. Decoding int pips divides by a
+    power of ten, which gives back the very float64 the prices were parsed as, so window extremes
+    and their comparisons against the spread tolerance are the same as on the float64 prices.
+    """
+
+    def __init__(self, times: np.ndarray, highs: np.ndarray, lows: np.ndarray, decimals: int = None, n_out_of_order: int = 0) -> None:
+        """
+        :param times: Bar times as sorted int64 UTC nanoseconds.
+        :param highs: Encoded bar highs aligned with times.
+        :param lows: Encoded bar lows aligned with times.
+        :param decimals: Decimals of the int pips, None if the prices are floats.
+        :param n_out_of_order: Bars that were stamped before the bar preceding them, before sorting.
+        """
+        self.times = times
+        self.highs = highs
+        self.lows = lows
+        self.decimals = decimals
+        self.n_out_of_order = n_out_of_order
+
+    @classmethod
+    def from_frame(cls, fx_data_df: pd.DataFrame, bar_index: pd.DatetimeIndex = None) -> 'BarSeries':
+        """
+        Builds the compact bars of a DataFrame with high and low columns.
+
+        :param fx_data_df: Bars to compact.
+        :param bar_index: Timezone aware index of the bars, the frame's own index by default.
+        """
+        bar_index = fx_data_df.index if bar_index is None else bar_index
+        times = bar_index.as_unit('ns').asi8
+        highs = fx_data_df['high'].to_numpy(dtype=np.float64)
+        lows = fx_data_df['low'].to_numpy(dtype=np.float64)
+
+        n_out_of_order = int(np.count_nonzero(times[1:] < times[:-1]))
+        if n_out_of_order:
+            order = np.argsort(times, kind='stable')
+            times, highs, lows = times[order], highs[order], lows[order]
+
+        highs, lows, decimals = encode_prices(highs, lows)
+        bars = cls(np.ascontiguousarray(times), highs, lows, decimals, n_out_of_order)
+        logging.debug(f"Compacted {len(bars)} bars to {bars.nbytes / 2 ** 20:.1f}MB ({highs.dtype}, "
+                      f"{fx_data_df.memory_usage(deep=True).sum() / 2 ** 20:.1f}MB as DataFrame)")
+        return bars
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.highs.nbytes + self.lows.nbytes
+
+    def between(self, start: int, end: int) -> 'BarSeries':
+        """Bars from start (inclusive) to end (exclusive) UTC nanoseconds, as views of these bars."""
+        first, last = np.searchsorted(self.times, [start, end], side='left')
+        return BarSeries(self.times[first:last], self.highs[first:last], self.lows[first:last], self.decimals)
+
+
+def encode_prices(highs: np.ndarray, lows: np.ndarray, max_decimals: int = MAX_DECIMALS) -> tuple:
+    """
+    Encodes float64 highs and lows in the smallest exact representation.
+
+    Missing highs become the int32 minimum and missing lows the int32 maximum, which never win a max
+    or a min against a price.
+
+    :return: Tuple of the encoded highs, lows and the decimals of the pips, None for floats.
+    """
+    prices = np.concatenate([highs, lows])
+    finite = np.isfinite(prices)
+    values = prices[finite]
+
+    for decimals in range(max_decimals + 1):
+        scale = 10 ** decimals
+        pips = np.rint(values * scale)
+        if len(pips) and (pips.min() <= INT32.min or pips.max() >= INT32.max):
+            break
+        if np.array_equal(pips / scale, values):
+            return _to_pips(highs, INT32.min, scale), _to_pips(lows, INT32.max, scale), decimals
+
+    if np.array_equal(values.astype(np.float32), values):
+        return highs.astype(np.float32), lows.astype(np.float32), None
+    return highs, lows, None
+
+
+def decode_prices(encoded: np.ndarray, decimals: int = None) -> np.ndarray:
+    """Float64 prices of encoded highs or lows, NaN where a price is missing."""
+    if decimals is None:
+        return encoded.astype(np.float64)
+
+    prices = encoded / 10 ** decimals
+    prices[(encoded == INT32.min) | (encoded == INT32.max)] = np.nan
+    return prices
+
+
+def _to_pips(prices: np.ndarray, missing: int, scale: int) -> np.ndarray:
+    pips = np.full(len(prices), missing, dtype=np.int32)
+    finite = np.isfinite(prices)
+    pips[finite] = np.rint(prices[finite] * scale)
+    return pips
@@ -0,0 +1,363 @@
+import os
+import json
+import logging
+import threading
+import configparser
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from src.configuration import Configuration
+from src.market_data_service import MarketDataService
+from src.parallel_runner import create_scanner, scan_pair_task, init_worker
+from src.history_store import to_utc_naive
+from src.instrumentation import instrumentation
+from src.results_store import ResultsStore
+from src.logger import Logger
+
+
+# Configuration attributes selecting where and how the bars are loaded. Jobs agreeing on all of
+# them share a MarketDataService
+SOURCE_OPTIONS = (
+    'use_api',
+    'api_backend',
+    'historical_data_filename',
+    'use_bar_cache',
+    'bar_cache_dir',
+    'use_ticks',
+    'tick_data_filename',
+    'tick_chunk_size',
+    'tick_price',
+    'api_chunk_days',
+    'api_retries',
+    'api_retry_delay',
+    'local_mt5_data_dir',
+    'local_mt5_rates_filename',
+    'local_mt5_tick_filename',
+    'local_mt5_latency_ms',
+    'local_mt5_latency_jitter_ms',
+    'local_mt5_max_rows',
+    'local_mt5_failure_rate',
+    'local_mt5_seed')
+
+
+class BatchJob:
+    """One scan job of a batch: a name and its run configuration."""
+
+    def __init__(self, name: str, cfg: Configuration) -> None:
+        self.name = name
+        self.cfg = cfg
+
+
+class DataLoad:
+    """
+    Bars loaded once for every job and pair that needs them.
+
+    Bars fetched through the API are loaded over the union of the date ranges of their jobs and
+    sliced down to each job's range. Csv and tick files are read whole whatever the range, and
+    ticks fetched through the API are only shared by jobs requesting the same range, as the bars
+    aggregated at the ends of a range depend on where it starts.
+    """
+
+    def __init__(self, source: tuple, fx_rate: str, tick_interval, sliceable: bool) -> None:
+        """
+        :param source: Values of the SOURCE_OPTIONS of the jobs' configurations.
+        :param fx_rate: FX pair loaded.
+        :param tick_interval: Bar length loaded.
+        :param sliceable: Whether the bars of a range are those of a wider range within its bounds.
+        """
+        self.source = source
+        self.fx_rate = fx_rate
+        self.tick_interval = tick_interval
+        self.sliceable = sliceable
+        self.first_day = None
+        self.last_day = None
+        # (job, fx_rate, first_day, last_day) of every scan of the bars
+        self.tasks = []
+
+    def add(self, job: BatchJob, fx_rate: str, first_day: pd.Timestamp, last_day: pd.Timestamp) -> None:
+        self.tasks.append((job, fx_rate, first_day, last_day))
+        self.first_day = first_day if self.first_day is None else min(self.first_day, first_day)
+        self.last_day = last_day if self.last_day is None else max(self.last_day, last_day)
+
+    def load(self, market_data_service: MarketDataService) -> pd.DataFrame:
+        fx_data_df = market_data_service.load_market_data(
+            self.fx_rate,
+            self.tick_interval,
+            self.first_day.to_pydatetime(),
+            self.last_day.to_pydatetime())
+
+        if fx_data_df is None:
+            raise ValueError(f"No market data available for {self.fx_rate}")
+        return fx_data_df
+
+    def slice(self, fx_data_df: pd.DataFrame, first_day: pd.Timestamp, last_day: pd.Timestamp) -> pd.DataFrame:
+        """Bars of one job's range, as loading that range alone would have returned them."""
+        if not self.sliceable or (first_day == self.first_day and last_day == self.last_day):
+            return fx_data_df
+
+        # Loaded bars are indexed by naive UTC times, both bounds being inclusive
+        index = fx_data_df.index
+        return fx_data_df[(index >= to_utc_naive(first_day)) & (index <= to_utc_naive(last_day))]
+
+
+def load_jobs(path: str, config_path: str = 'run.cfg', overrides: dict = None) -> list:
+    """
+    Reads a job file, each job overriding options of the base run configuration.
+
+    Ini job files hold one section per job, whose DEFAULT section applies to every job. Json and
+    yaml job files hold a "jobs" list, or mapping of job names, with optional "defaults". A job
+    sets run.cfg options as SECTION.OPTION keys or nested SECTION mappings, and its FX pairs as
+    pairs, a list or comma separated string:
+
+        [eurusd_london]
+        pairs = EURUSD,GBPUSD
+        MarketData.historical_data_horizon = 2Y
+        Results.ref_timezone = Europe/London
+
+    :param path: Path of the job file, read as json or yaml by extension and as ini otherwise.
+    :param config_path: Path of the base run configuration.
+    :param overrides: Options overriding the base configuration for every job, e.g. from the command line.
+    :return: The BatchJobs in file order.
+    :raises ValueError: If the file or a job is invalid.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Job file {path} not found")
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.json', '.yaml', '.yml'):
+        with open(path) as f:
+            if extension == '.json':
+                spec = json.load(f)
+            else:
+                try:
+                    import yaml
+                except ImportError:
+                    raise ValueError("Reading yaml job files needs PyYAML, use an ini or json job file instead")
+                spec = yaml.safe_load(f)
+        entries = _spec_entries(spec)
+    else:
+        parser = configparser.ConfigParser()
+        parser.optionxform = str
+        parser.read(path)
+        entries = [(section, dict(parser.items(section))) for section in parser.sections()]
+
+    if not entries:
+        raise ValueError(f"No jobs in {path}")
+
+    jobs = []
+    for name, options in entries:
+        if any(job.name == name for job in jobs):
+            raise ValueError(f"Duplicate job name {name}")
+        job_overrides = dict(overrides or {})
+        job_overrides.update(_job_overrides(name, options))
+        jobs.append(BatchJob(name, Configuration(config_path, job_overrides)))
+    return jobs
+
+
+def plan_loads(jobs: list) -> list:
+    """
+    Groups the scans of every job and pair by the bars they need, so each is loaded once.
+
+    The loads are ordered by the first job needing them, and the scans of a load run one after
+    the other, so its bars are released once they are done.
+
+    :return: The DataLoads of the batch.
+    """
+    loads = {}
+    for job in jobs:
+        source = tuple(getattr(job.cfg, option) for option in SOURCE_OPTIONS)
+        for fx_rate in job.cfg.fx_rates:
+            first_day, last_day = create_scanner(job.cfg, fx_rate).requested_range()
+
+            cfg = job.cfg
+            if not cfg.use_api and not cfg.use_ticks:
+                # The csv holds a single series, whatever the pair and range
+                key = (source,)
+            elif not cfg.use_api:
+                key = (source, fx_rate, str(cfg.tick_interval))
+            elif not cfg.use_ticks:
+                key = (source, fx_rate, str(cfg.tick_interval))
+            else:
+                key = (source, fx_rate, str(cfg.tick_interval), first_day, last_day)
+
+            if key not in loads:
+                loads[key] = DataLoad(source, fx_rate, cfg.tick_interval, cfg.use_api and not cfg.use_ticks)
+            loads[key].add(job, fx_rate, first_day, last_day)
+
+    loads = list(loads.values())
+    n_scans = sum(len(load.tasks) for load in loads)
+    logging.info(f"Planned {n_scans} scans of {len(jobs)} jobs on {len(loads)} data loads")
+    return loads
+
+
+def run_batch(cfg: Configuration,
+              jobs: list,
+              market_data_service: MarketDataService,
+              credentials: tuple = (None, None, None),
+              max_memory_mb: float = 2048,
+              results_store: ResultsStore = None) -> dict:
+    """
+    Runs the scans of every job and pair, loading the bars each needs once.
+
+    Bars are loaded one data load at a time on a single I/O thread, as the MT5 connection belongs
+    to this process. A load only starts while the bars held in memory take less than
+    max_memory_mb, and its bars are released once all of its scans are done. With cfg.workers > 1
+    the scans run on a pool of worker processes, otherwise one after the other.
+
+    :param cfg: Base run configuration. cfg.workers sets the number of processes.
+    :param jobs: BatchJobs of the batch.
+    :param market_data_service: Service loading the bars of jobs sharing the base configuration's source.
+    :param credentials: MT5 login, password and server of the services of other sources.
+    :param max_memory_mb: Memory the loaded bars may take before further loads wait for scans to finish.
+    :param results_store: Store collecting the results of every scan, if any.
+    :return: Dictionary of the failed scans, as job:pair, mapped to their error.
+    """
+    loads = plan_loads(jobs)
+    base_source = tuple(getattr(cfg, option) for option in SOURCE_OPTIONS)
+    services = {base_source: market_data_service}
+    failures = {}
+
+    memory = threading.Condition()
+    resident = {}
+
+    def load(data_load: DataLoad) -> pd.DataFrame:
+        with memory:
+            memory.wait_for(lambda: not resident or sum(resident.values()) < max_memory_mb * 2**20)
+
+        if data_load.source not in services:
+            job_cfg = data_load.tasks[0][0].cfg
+            services[data_load.source] = MarketDataService(job_cfg, *credentials)
+
+        with instrumentation.stage(data_load.fx_rate, 'batch_load') as record:
+            fx_data_df = data_load.load(services[data_load.source])
+            record['rows'] = len(fx_data_df)
+
+        with memory:
+            resident[id(data_load)] = int(fx_data_df.memory_usage(index=True).sum())
+        logging.info(f"Loaded {len(fx_data_df)} {data_load.fx_rate} bars for {len(data_load.tasks)} scans")
+        return fx_data_df
+
+    def release(data_load: DataLoad) -> None:
+        with memory:
+            resident.pop(id(data_load), None)
+            memory.notify_all()
+
+    def finish(job: BatchJob, fx_rate: str, result: tuple) -> None:
+        records, results_df = result
+        instrumentation.records += records
+        if results_store is not None:
+            results_store.add(results_df)
+        logging.info(f"Finished {job.name} for {fx_rate}")
+
+    def fail(job: BatchJob, fx_rate: str, err: Exception) -> None:
+        logging.error(f'Error running {job.name} for {fx_rate}: {err}')
+        failures[f"{job.name}:{fx_rate}"] = err
+
+    log_level = logging.getLogger().level
+    settings = (instrumentation.enabled, instrumentation.trace_memory, instrumentation.profile)
+    cpu_pool = None
+    if cfg.workers > 1:
+        cpu_pool = ProcessPoolExecutor(max_workers=cfg.workers, initializer=init_worker, initargs=(log_level, Logger.queue, settings))
+
+    try:
+        with ThreadPoolExecutor(max_workers=1) as io_pool:
+            loaded = [(data_load, io_pool.submit(load, data_load)) for data_load in loads]
+
+            scans = []
+            for data_load, load_future in loaded:
+                try:
+                    fx_data_df = load_future.result()
+                except Exception as err:
+                    for job, fx_rate, _, _ in data_load.tasks:
+                        fail(job, fx_rate, err)
+                    continue
+
+                remaining = [len(data_load.tasks)]
+
+                def scanned(_, data_load=data_load, remaining=remaining) -> None:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        release(data_load)
+
+                for job, fx_rate, first_day, last_day in data_load.tasks:
+                    logging.info(f"Starting {job.name} for {fx_rate}")
+                    task_df = data_load.slice(fx_data_df, first_day, last_day)
+
+                    if cpu_pool is None:
+                        try:
+                            finish(job, fx_rate, scan_pair_task(job.cfg, fx_rate, task_df, False, job.name))
+                        except Exception as err:
+                            fail(job, fx_rate, err)
+                        scanned(None)
+                    else:
+                        scan_future = cpu_pool.submit(scan_pair_task, job.cfg, fx_rate, task_df, False, job.name)
+                        scan_future.add_done_callback(scanned)
+                        scans.append((job, fx_rate, scan_future))
+                del fx_data_df, task_df
+
+            for job, fx_rate, scan_future in scans:
+                try:
+                    finish(job, fx_rate, scan_future.result())
+                except Exception as err:
+                    fail(job, fx_rate, err)
+
+    finally:
+        if cpu_pool is not None:
+            cpu_pool.shutdown()
+        for source, service in services.items():
+            if service is not market_data_service:
+                service.close()
+
+    return failures
+
+
+def _spec_entries(spec) -> list:
+    """(name, options) of the jobs of a parsed json or yaml job file, with the defaults applied."""
+    defaults = {}
+    jobs = spec
+    if isinstance(spec, dict):
+        defaults = spec.get('defaults') or {}
+        jobs = spec.get('jobs')
+
+    if isinstance(jobs, dict):
+        jobs = [dict(options or {}, name=name) for name, options in jobs.items()]
+    if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+        raise ValueError("A job file holds a list or mapping of jobs")
+
+    entries = []
+    for number, job in enumerate(jobs, start=1):
+        options = _flatten(defaults)
+        options.update(_flatten(job))
+        entries.append((str(options.pop('name', f"job{number}")), options))
+    return entries
+
+
+def _flatten(options: dict) -> dict:
+    """Nested SECTION mappings as SECTION.OPTION keys, lists as comma separated values."""
+    flat = {}
+    for key, value in options.items():
+        if isinstance(value, dict):
+            for option, option_value in value.items():
+                flat[f"{key}.{option}"] = option_value
+        else:
+            flat[key] = value
+    return flat
+
+
+def _job_overrides(name: str, options: dict) -> dict:
+    """Options of a job keyed by their (section, option) in run.cfg."""
+    overrides = {}
+    for key, value in options.items():
+        if isinstance(value, (list, tuple)):
+            value = ','.join(str(item) for item in value)
+        elif isinstance(value, bool):
+            value = str(value)
+
+        if key == 'pairs':
+            overrides[('Run', 'fx_rates')] = value
+            continue
+
+        section, dotted, option = key.partition('.')
+        if not dotted or not section.strip() or not option.strip():
+            raise ValueError(f"Invalid option {key} of job {name}, expected pairs or SECTION.OPTION")
+        overrides[(section.strip(), option.strip())] = value
+    return overrides
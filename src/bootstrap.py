@@ -0,0 +1,74 @@
+import numpy as np
+
+
+def bootstrap_resample_counts(hits: np.ndarray,
+                              n_resamples: int = 2000,
+                              seed: int = None,
+                              chunk_size: int = 500) -> np.ndarray:
+    """
+    Window counts over day-level bootstrap resamples of a scan.
+
+    Each resample draws as many days as scanned, with replacement, and is applied as a row of
+    day weights, so a batch of resamples is one (resamples x days) by (days x windows) matrix
+    product rather than a rescan.
+
+    :param hits: (days x windows) matrix flagging the windows hit on each day.
+    :param n_resamples: Number of bootstrap resamples.
+    :param seed: Seed of the random generator, the same seed always gives the same resamples.
+    :param chunk_size: Resamples drawn per batch, to bound the memory of the weights.
+    :return: (resamples x windows) int32 matrix of the resampled counts.
+    """
+    rng = np.random.default_rng(seed)
+    n_days, n_windows = hits.shape
+    counts = np.zeros((n_resamples, n_windows), dtype=np.int32)
+    if n_days == 0:
+        return counts
+
+    # Counts stay below 2**24, so float32 products are exact
+    hits = hits.astype(np.float32)
+    for start in range(0, n_resamples, chunk_size):
+        size = min(chunk_size, n_resamples - start)
+        drawn = rng.integers(0, n_days, size=(size, n_days))
+        drawn += np.arange(size)[:, None] * n_days
+        weights = np.bincount(drawn.ravel(), minlength=size * n_days).reshape(size, n_days)
+        counts[start:start + size] = weights.astype(np.float32) @ hits
+    return counts
+
+
+def bootstrap_intervals(hits: list,
+                        n_days: int,
+                        n_resamples: int = 2000,
+                        confidence: float = 0.95,
+                        seed: int = None) -> list:
+    """
+    Percentile confidence intervals of the window probabilities, and the probability of each
+    window being the top window.
+
+    Several hit matrices over the same days are resampled with the same draws in one product.
+    Windows tied for the top count in a resample share it equally, so the top probabilities of
+    each matrix sum to one.
+
+    :param hits: (days x windows) matrices flagging the windows hit on each day.
+    :param n_days: Number of days the probabilities are relative to.
+    :param n_resamples: Number of bootstrap resamples.
+    :param confidence: Confidence level of the intervals.
+    :param seed: Seed of the random generator.
+    :return: One tuple of the lower bounds, upper bounds and top probabilities per matrix.
+    """
+    counts = bootstrap_resample_counts(np.hstack(hits), n_resamples, seed)
+    alpha = (1 - confidence) / 2
+
+    intervals = []
+    for window_counts in np.split(counts, np.cumsum([matrix.shape[1] for matrix in hits])[:-1], axis=1):
+        n_windows = window_counts.shape[1]
+        if n_windows == 0 or n_days == 0:
+            intervals.append((np.zeros(n_windows), np.zeros(n_windows), np.zeros(n_windows)))
+            continue
+
+        lower, upper = np.quantile(window_counts, [alpha, 1 - alpha], axis=0) / n_days
+
+        is_top = window_counts == window_counts.max(axis=1, keepdims=True)
+        top_probability = (is_top / is_top.sum(axis=1, keepdims=True)).mean(axis=0)
+        intervals.append((lower, upper, top_probability))
+
+    return intervals
@@ -0,0 +1,242 @@
+"""
+Command line entry point of the scanner.
+
+Only the standard library is imported until the arguments and run.cfg are parsed. The scan,
+the market data backends and optional dependencies (holidays, python-dotenv, MetaTrader5,
+pyarrow) are imported once the configured run needs them, so --help and invalid arguments
+return at once and short per-pair invocations don't pay for what they don't use.
+"""
+import os
+import logging
+import argparse
+import configparser
+
+
+# Options overriding a run.cfg value, as (flag, section, option, help)
+OVERRIDES = (
+    ('--workers', 'Run', 'workers', "processes scanning pairs in parallel"),
+    ('--scan-workers', 'Run', 'scan_workers', "processes scanning the days of one pair in partitions"),
+    ('--log-level', 'Run', 'log_level', "Debug, Info, Warning or Error"),
+    ('--use-api', 'MarketData', 'use_api', "True to fetch the bars through the API, False to read the csv"),
+    ('--api-backend', 'MarketData', 'api_backend', "metatrader5 or local"),
+    ('--horizon', 'MarketData', 'historical_data_horizon', "historical data range, e.g. 1Y"),
+    ('--tick-interval', 'MarketData', 'tick_interval', "step between window starts, e.g. 5min"),
+    ('--low-high-interval', 'MarketData', 'low_high_interval', "window length, e.g. 90min"),
+    ('--min-coverage', 'MarketData', 'min_session_coverage', "share of its bars below which a session is left out of the scan"),
+    ('--market-open-time', 'MarketData', 'market_open_time', "comma separated hhmm open times"),
+    ('--ref-timezone', 'Results', 'ref_timezone', "comma separated reference timezones"),
+    ('--output-format', 'Results', 'output_format', "csv, parquet or both"),
+    ('--walk-forward', 'Results', 'walk_forward_lookback', "trailing period of the walk-forward statistics, e.g. 3M"),
+    ('--port', 'Service', 'port', "port of the scan service"),
+)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='main.py',
+        description="Scan FX pairs for the time windows holding the daily low or high.")
+    parser.add_argument('pairs', nargs='*', help="FX pairs to scan, those of run.cfg by default")
+    parser.add_argument('-c', '--config', default='run.cfg', help="configuration file (default %(default)s)")
+    parser.add_argument('--sweep', action='store_true', help="scan every parameter combination in the [Sweep] section of run.cfg")
+    parser.add_argument('--batch', metavar='JOBFILE', help="run the scan jobs of an ini, json or yaml job file, each overriding run.cfg")
+    parser.add_argument('--update', action='store_true', help="only scan the days completed since the state saved by the last run")
+    parser.add_argument('--no-cache', action='store_true', help="scan every pair even if the result cache holds its results")
+    parser.add_argument('--clear-cache', action='store_true', help="empty the result cache before running")
+    parser.add_argument('--serve', action='store_true', help="keep the bars in memory and answer scan queries over HTTP, see [Service] in run.cfg")
+
+    overrides = parser.add_argument_group('run.cfg overrides')
+    for flag, section, option, help_text in OVERRIDES:
+        overrides.add_argument(flag, metavar=option.split('_')[-1].upper(), help=f"{help_text} ([{section}] {option})")
+    overrides.add_argument('--set', action='append', default=[], metavar='SECTION.OPTION=VALUE',
+                           help="any other run.cfg option, can be repeated")
+    return parser
+
+
+def parse_overrides(args: argparse.Namespace) -> dict:
+    """
+    Option values given on the command line, keyed by their (section, option) in run.cfg.
+
+    :raises ValueError: If a --set value is not of the form SECTION.OPTION=VALUE.
+    """
+    overrides = {}
+    if args.pairs:
+        overrides[('Run', 'fx_rates')] = ','.join(args.pairs)
+
+    for flag, section, option, _ in OVERRIDES:
+        value = getattr(args, flag[2:].replace('-', '_'))
+        if value is not None:
+            overrides[(section, option)] = value
+
+    for entry in args.set:
+        key, assigned, value = entry.partition('=')
+        section, dotted, option = key.partition('.')
+        if not assigned or not dotted or not section.strip() or not option.strip():
+            raise ValueError(f"Invalid override {entry}, expected SECTION.OPTION=VALUE")
+        overrides[(section.strip(), option.strip())] = value.strip()
+    return overrides
+
+
+def main(argv: list = None) -> int:
+    """
+    Parses the command line and runs the scanner.
+
+    :param argv: Arguments, those of the command line by default.
+    :return: Exit code, 1 if any pair failed.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    from src.configuration import Configuration
+
+    jobs = None
+    try:
+        overrides = parse_overrides(args)
+        cfg = Configuration(args.config, overrides)
+        if args.batch:
+            from src.batch_runner import load_jobs
+
+            jobs = load_jobs(args.batch, args.config, overrides)
+    except (OSError, ValueError, configparser.Error) as err:
+        parser.error(str(err))
+
+    # The log file is only created once the configuration is valid
+    from src.logger import Logger
+
+    Logger()
+    logging.getLogger().setLevel(cfg.log_level)
+    return run(cfg, args, jobs)
+
+
+def run(cfg, args: argparse.Namespace, jobs: list = None) -> int:
+    """
+    Runs the scans selected by the parsed arguments with the given Configuration.
+
+    :param jobs: BatchJobs of the --batch job file, if any.
+    """
+    from src.instrumentation import instrumentation
+    from src.market_data_service import MarketDataService
+
+    instrumentation.configure(cfg.run_report, cfg.trace_memory, cfg.profile)
+
+    if args.clear_cache:
+        from src.result_cache import ResultCache
+
+        ResultCache(cfg.result_cache_dir, cfg.result_cache_max_mb).clear()
+    if args.no_cache:
+        cfg.use_result_cache = False
+
+    market_data_service = MarketDataService(cfg, *_credentials(cfg))
+
+    if args.serve:
+        return serve(cfg, market_data_service)
+
+    results_store = None
+    if cfg.output_format != 'csv':
+        from src.results_store import ResultsStore
+
+        results_store = ResultsStore()
+
+    failures = {}
+    if jobs is not None:
+        from src.batch_runner import run_batch
+
+        failures = run_batch(cfg, jobs, market_data_service, _credentials(cfg), cfg.batch_max_memory_mb, results_store)
+
+        if failures:
+            logging.error(f"{len(failures)} scans of the batch failed: {', '.join(failures)}")
+
+    elif args.sweep:
+        from src.parameter_sweep import ParameterSweep
+
+        for fx_rate in cfg.fx_rates:
+            logging.info(f"Starting parameter sweep for {fx_rate}")
+
+            try:
+
+                sweep = ParameterSweep(
+                    fx_rate,
+                    cfg.historical_data_horizon,
+                    market_data_service,
+                    cfg.sweep_tick_intervals,
+                    cfg.sweep_low_high_intervals,
+                    cfg.sweep_spreads,
+                    cfg.sweep_market_open_times,
+                    cfg.market_data_timezone,
+                    cfg.ref_timezone,
+                    cfg.holiday_calendars,
+                    cfg.data_quality,
+                    cfg.min_session_coverage)
+                sweep.run()
+                sweep.export_results()
+
+            except Exception as err:
+                logging.error(f'Error sweeping {fx_rate}: {err}')
+                raise
+
+    elif cfg.workers > 1:
+        from src.parallel_runner import run_pairs_parallel
+
+        failures = run_pairs_parallel(cfg, market_data_service, args.update, results_store)
+
+        if failures:
+            logging.error(f"{len(failures)} of {len(cfg.fx_rates)} pairs failed: {', '.join(failures)}")
+
+    else:
+        from src.parallel_runner import scan_pair
+
+        for fx_rate in cfg.fx_rates:
+            logging.info(f"Starting run for {fx_rate}")
+
+            try:
+
+                with instrumentation.profiled(fx_rate):
+                    for scanner in scan_pair(cfg, fx_rate, market_data_service, update=args.update):
+                        if cfg.output_format != 'parquet':
+                            scanner.export_results(cfg.full_results)
+                        if results_store is not None:
+                            results_store.add(scanner.results_frame())
+
+            except Exception as err:
+                logging.error(f'Error running {fx_rate}: {err}')
+                raise
+
+    if results_store is not None:
+        results_store.write()
+    instrumentation.export('output')
+    market_data_service.close()
+    logging.info(f"Exiting run")
+    return 1 if failures else 0
+
+
+def serve(cfg, market_data_service) -> int:
+    """Runs the resident scan service until interrupted."""
+    import asyncio
+    from src.scan_service import ScanService
+
+    service = ScanService(
+        cfg,
+        market_data_service,
+        cfg.service_workers,
+        cfg.service_refresh_minutes,
+        cfg.service_cache_size)
+
+    try:
+        asyncio.run(service.serve(cfg.service_host, cfg.service_port, cfg.service_socket))
+    except KeyboardInterrupt:
+        logging.info("Scan service stopped")
+    finally:
+        market_data_service.close()
+    return 0
+
+
+def _credentials(cfg) -> tuple:
+    """MT5 login, password and server from the environment, read from the .env file when the terminal is used."""
+    if cfg.use_api and cfg.api_backend == 'metatrader5':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+
+    return (
+        int(os.environ.get('MT5_LOGIN', 0)),
+        os.environ.get('MT5_PASSWORD', 'WRONG-KEY'),
+        os.environ.get('MT5_SERVER', 'WRONG-KEY'))
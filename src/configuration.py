@@ -1,19 +1,35 @@
-from dotenv import load_dotenv
 import os
 from src.period import Period
 import configparser
+import importlib.util
 import logging
 
 
 class Configuration:
 
-    def __init__(self, path_to_config: str):
+    def __init__(self, path_to_config: str, overrides: dict = None):
+        """
+        :param path_to_config: Path of the run.cfg file.
+        :param overrides: Option values replacing those of the file, keyed by (section, option).
+        """
         self.config = configparser.ConfigParser()
-        self.config.read(path_to_config)
+        if not self.config.read(path_to_config):
+            raise FileNotFoundError(f"Configuration file {path_to_config} not found")
+
+        for (section, option), value in (overrides or {}).items():
+            if not self.config.has_section(section):
+                self.config.add_section(section)
+            self.config.set(section, option, str(value))
 
         self.log_level = self._configure_log(self.config.get('Run', 'log_level'))
         self.fx_rates = [key.strip() for key in self.config.get('Run', 'fx_rates').split(',')]
         self.spread = float(self.config.get('Run', 'spread'))
+        self.workers = self.config.getint('Run', 'workers', fallback=1)
+        self.scan_workers = self.config.getint('Run', 'scan_workers', fallback=1)
+        self.run_report = self.config.getboolean('Run', 'run_report', fallback=True)
+        self.trace_memory = self.config.getboolean('Run', 'trace_memory', fallback=False)
+        self.profile = self.config.getboolean('Run', 'profile', fallback=False)
+        self.log_every_n_days = self.config.getint('Run', 'log_every_n_days', fallback=20)
 
         logger = logging.getLogger()
         logger.setLevel(self.log_level)
@@ -25,11 +41,74 @@ class Configuration:
         self.historical_data_horizon = Period(self.config.get('MarketData', 'historical_data_horizon'))
         self.tick_interval = Period(self.config.get('MarketData', 'tick_interval'))
         self.low_high_interval = Period(self.config.get('MarketData', 'low_high_interval'))
-        self.market_open_time = self.config.get('MarketData', 'market_open_time')
+        # Several comma separated open times and reference timezones are scanned once and projected into each
+        self.market_open_times = self._get_list('MarketData', 'market_open_time', str, [self.config.get('MarketData', 'market_open_time')])
+        self.market_open_time = self.market_open_times[0]
+        self.holiday_calendars = tuple(self._get_list('MarketData', 'holiday_calendars', str, []))
+        self.use_bar_cache = self.config.getboolean('MarketData', 'use_bar_cache', fallback=False)
+        self.bar_cache_dir = self.config.get('MarketData', 'bar_cache_dir', fallback=os.path.join('data', 'cache'))
+        self.use_ticks = self.config.getboolean('MarketData', 'use_ticks', fallback=False)
+        self.tick_data_filename = self.config.get('MarketData', 'tick_data_filename', fallback='{symbol}_ticks.csv')
+        self.tick_chunk_size = self.config.getint('MarketData', 'tick_chunk_size', fallback=1_000_000)
+        self.tick_price = self.config.get('MarketData', 'tick_price', fallback='mid')
+        self.streaming = self.config.getboolean('MarketData', 'streaming', fallback=False)
+        self.data_quality = self.config.getboolean('MarketData', 'data_quality', fallback=True)
+        self.min_session_coverage = self.config.getfloat('MarketData', 'min_session_coverage', fallback=0.0)
+        self.api_backend = self.config.get('MarketData', 'api_backend', fallback='metatrader5').strip().lower()
+        self.api_chunk_days = self.config.getint('MarketData', 'api_chunk_days', fallback=180)
+        self.api_retries = self.config.getint('MarketData', 'api_retries', fallback=0)
+        self.api_retry_delay = self.config.getfloat('MarketData', 'api_retry_delay', fallback=1.0)
+
+        # Local stand-in of the MT5 terminal
+        self.local_mt5_data_dir = self.config.get('LocalMT5', 'data_dir', fallback='data')
+        self.local_mt5_rates_filename = self.config.get('LocalMT5', 'rates_filename', fallback='{symbol}.csv')
+        self.local_mt5_tick_filename = self.config.get('LocalMT5', 'tick_filename', fallback=self.tick_data_filename)
+        self.local_mt5_latency_ms = self.config.getfloat('LocalMT5', 'latency_ms', fallback=0.0)
+        self.local_mt5_latency_jitter_ms = self.config.getfloat('LocalMT5', 'latency_jitter_ms', fallback=0.0)
+        self.local_mt5_max_rows = self.config.getint('LocalMT5', 'max_rows', fallback=100_000)
+        self.local_mt5_failure_rate = self.config.getfloat('LocalMT5', 'failure_rate', fallback=0.0)
+        self.local_mt5_seed = self.config.getint('LocalMT5', 'seed', fallback=None)
 
         # Results
-        self.ref_timezone = self.config.get('Results', 'ref_timezone')
+        self.ref_timezones = self._get_list('Results', 'ref_timezone', str, [self.config.get('Results', 'ref_timezone')])
+        self.ref_timezone = self.ref_timezones[0]
         self.full_results = self.config.getboolean('Results', 'full_results')
+        self.bootstrap_resamples = self.config.getint('Results', 'bootstrap_resamples', fallback=2000)
+        self.confidence_level = self.config.getfloat('Results', 'confidence_level', fallback=0.95)
+        self.output_format = self.config.get('Results', 'output_format', fallback='csv').strip().lower()
+        if self.output_format not in ('csv', 'parquet', 'both'):
+            raise ValueError(f"Unknown output format {self.output_format}, expected csv, parquet or both")
+        if self.output_format != 'csv' and importlib.util.find_spec('pyarrow') is None:
+            raise ValueError(f"Output format {self.output_format} requires pyarrow, install it or set output_format = csv")
+        self.use_result_cache = self.config.getboolean('Results', 'result_cache', fallback=False)
+        self.result_cache_dir = self.config.get('Results', 'result_cache_dir', fallback=os.path.join('output', 'result_cache'))
+        self.result_cache_max_mb = self.config.getfloat('Results', 'result_cache_max_mb', fallback=512)
+        walk_forward_lookback = self.config.get('Results', 'walk_forward_lookback', fallback='').strip()
+        self.walk_forward_lookback = Period(walk_forward_lookback) if walk_forward_lookback else None
+        save_state = self.config.getboolean('Results', 'save_state', fallback=False)
+        self.state_dir = self.config.get('Results', 'state_dir', fallback=os.path.join('output', 'state')) if save_state else None
+
+        # Resident scan service of python main.py --serve
+        self.service_host = self.config.get('Service', 'host', fallback='127.0.0.1')
+        self.service_port = self.config.getint('Service', 'port', fallback=8765)
+        self.service_socket = self.config.get('Service', 'socket_path', fallback='').strip() or None
+        self.service_workers = self.config.getint('Service', 'workers', fallback=4)
+        self.service_refresh_minutes = self.config.getfloat('Service', 'refresh_minutes', fallback=15.0)
+        self.service_cache_size = self.config.getint('Service', 'cache_size', fallback=256)
+
+        # Batch job runs of python main.py --batch
+        self.batch_max_memory_mb = self.config.getfloat('Batch', 'max_memory_mb', fallback=2048)
+
+        # Parameter sweep, defaulting to the single values above
+        self.sweep_tick_intervals = self._get_list('Sweep', 'tick_intervals', Period, [self.tick_interval])
+        self.sweep_low_high_intervals = self._get_list('Sweep', 'low_high_intervals', Period, [self.low_high_interval])
+        self.sweep_spreads = self._get_list('Sweep', 'spreads', float, [self.spread])
+        self.sweep_market_open_times = self._get_list('Sweep', 'market_open_times', str, self.market_open_times)
+
+    def _get_list(self, section: str, option: str, convert, fallback: list) -> list:
+        if not self.config.get(section, option, fallback='').strip():
+            return fallback
+        return [convert(key.strip()) for key in self.config.get(section, option).split(',')]
 
     def _configure_log(self, log_level: str):
         if log_level == "Debug":
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+from src.bar_series import BarSeries, INT32
+from src.window_scan_engine import DAY_NS
+
+
+class SessionQuality:
+    """
+    Bar coverage, gaps, duplicates and missing prices of every session, with the bars of the whole
+    set falling outside all sessions or out of time order.
+
+    Everything is derived in one pass of vectorized cumulative counts and segment reductions over
+    the sorted bars, without slicing them per session, so it stays cheap on tens of millions of bars.
+    """
+
+    def __init__(self,
+                 day_opens: np.ndarray,
+                 n_bars: np.ndarray,
+                 n_duplicates: np.ndarray,
+                 n_missing_prices: np.ndarray,
+                 largest_gap_ns: np.ndarray,
+                 bar_ns: int,
+                 n_outside: int = 0,
+                 n_out_of_order: int = 0) -> None:
+        """
+        :param day_opens: Session opens as int64 UTC nanoseconds.
+        :param n_bars: Bars of each session, duplicates included.
+        :param n_duplicates: Bars of each session stamped like the bar before them.
+        :param n_missing_prices: Bars of each session without a high or a low.
+        :param largest_gap_ns: Longest stretch of each session without bars beyond the bar length,
+            from the open to the first bar, between bars and from the last bar to the close.
+        :param bar_ns: Bar length the coverage is relative to, in nanoseconds.
+        :param n_outside: Bars of the whole set in none of the sessions, e.g. on weekends or holidays.
+        :param n_out_of_order: Bars of the whole set stamped before the bar preceding them.
+        """
+        self.day_opens = day_opens
+        self.n_bars = n_bars
+        self.n_duplicates = n_duplicates
+        self.n_missing_prices = n_missing_prices
+        self.largest_gap_ns = largest_gap_ns
+        self.bar_ns = bar_ns
+        self.n_outside = n_outside
+        self.n_out_of_order = n_out_of_order
+
+    @property
+    def expected_bars(self) -> int:
+        """Bars of a fully covered session."""
+        return max(DAY_NS // self.bar_ns, 1)
+
+    @property
+    def coverage(self) -> np.ndarray:
+        """Share of the expected bars each session holds, counting every stamp once."""
+        return np.clip((self.n_bars - self.n_duplicates) / self.expected_bars, 0.0, 1.0)
+
+    def mask(self, min_coverage: float = 0.0) -> np.ndarray:
+        """Flags the sessions covered at least min_coverage, all of them for 0."""
+        if min_coverage <= 0:
+            return np.ones(len(self.day_opens), dtype=bool)
+        return self.coverage >= min_coverage
+
+    def to_frame(self, dates, used: np.ndarray) -> pd.DataFrame:
+        """
+        One row per session with its dates, bar counts, coverage and largest gap in minutes.
+
+        :param dates: Session dates aligned with the opens.
+        :param used: Flags of the sessions kept in the scan.
+        """
+        return pd.DataFrame({
+            'date': pd.DatetimeIndex(dates).date,
+            'session_open': pd.to_datetime(self.day_opens, utc=True),
+            'n_bars': self.n_bars,
+            'n_duplicates': self.n_duplicates,
+            'n_missing_prices': self.n_missing_prices,
+            'coverage': self.coverage,
+            'largest_gap_minutes': self.largest_gap_ns / 60_000_000_000,
+            'used': used})
+
+
+def assess_sessions(bars: BarSeries, day_opens: np.ndarray, bar_ns: int = None) -> SessionQuality:
+    """
+    Assesses the bars of every session, a session running from its open (inclusive) to one day
+    later (exclusive).
+
+    :param bars: Compact bars, sorted as built by BarSeries.from_frame.
+    :param day_opens: Session opens as int64 UTC nanoseconds.
+    :param bar_ns: Bar length in nanoseconds, by default the median step between distinct stamps.
+    :return: SessionQuality of the sessions.
+    """
+    times = bars.times
+    day_opens = np.asarray(day_opens, dtype=np.int64)
+    first = np.searchsorted(times, day_opens, side='left')
+    last = np.searchsorted(times, day_opens + DAY_NS, side='left')
+    n_bars = last - first
+    has_bars = n_bars > 0
+
+    steps = np.diff(times)
+    if bar_ns is None:
+        positive = steps[steps > 0]
+        bar_ns = int(np.median(positive)) if len(positive) else DAY_NS
+
+    # Per-session counts are differences of cumulative counts over the whole set
+    duplicates = _cumulative(steps == 0)
+    n_duplicates = np.where(has_bars, duplicates[np.maximum(last - 1, 0)] - duplicates[np.minimum(first, len(times) - 1)], 0)
+    missing = _cumulative(_missing_prices(bars))
+    n_missing_prices = missing[last] - missing[first]
+
+    # Longest step of each session as one reduceat over (first, last - 1) pairs, with a padding
+    # step so the pairs of the session ending on the last bar stay in range
+    internal = np.zeros(len(day_opens), dtype=np.int64)
+    several = n_bars > 1
+    if several.any():
+        padded = np.append(steps, 0)
+        bounds = np.stack([first[several], last[several] - 1], axis=1).ravel()
+        internal[several] = np.maximum.reduceat(padded, bounds)[::2] - bar_ns
+
+    safe_first = np.minimum(first, max(len(times) - 1, 0))
+    safe_last = np.maximum(last - 1, 0)
+    if len(times):
+        lead = times[safe_first] - day_opens
+        trail = day_opens + DAY_NS - bar_ns - times[safe_last]
+    else:
+        lead = trail = np.zeros(len(day_opens), dtype=np.int64)
+    largest_gap_ns = np.where(has_bars, np.maximum.reduce([lead, internal, trail]), DAY_NS).clip(min=0)
+
+    # Bars within the union of the sessions' bar ranges, which overlap around DST changes
+    order = np.argsort(first, kind='stable')
+    ends = np.maximum.accumulate(last[order]) if len(order) else last
+    previous_ends = np.concatenate([[0], ends[:-1]])
+    n_covered = int(np.clip(ends - np.maximum(first[order], previous_ends), 0, None).sum())
+    n_outside = len(times) - n_covered
+
+    return SessionQuality(
+        day_opens,
+        n_bars,
+        n_duplicates,
+        n_missing_prices,
+        largest_gap_ns,
+        bar_ns,
+        n_outside,
+        bars.n_out_of_order)
+
+
+def summarize(fx_rate: str, quality_df: pd.DataFrame, n_outside: int = None, n_out_of_order: int = None) -> str:
+    """
+    One line summary of the quality of a pair's sessions.
+
+    :param n_outside: Bars outside all sessions, left out of the summary if None, e.g. when only
+        the bars of the sessions were read.
+    :param n_out_of_order: Bars stamped before the bar preceding them, left out of the summary if None.
+    """
+    if quality_df.empty:
+        return f"Data quality of {fx_rate}: no sessions"
+
+    skipped = quality_df.loc[~quality_df['used'], 'date']
+    return (f"Data quality of {fx_rate}: {len(quality_df)} sessions, median coverage "
+            f"{quality_df['coverage'].median():.1%}, {int((quality_df['coverage'] < 1).sum())} incomplete, "
+            f"largest gap {quality_df['largest_gap_minutes'].max():.0f}min, {int(quality_df['n_duplicates'].sum())} "
+            f"duplicate and {int(quality_df['n_missing_prices'].sum())} unpriced bars, "
+            + (f"{n_out_of_order} out of order, " if n_out_of_order is not None else '')
+            + (f"{n_outside} outside the sessions, " if n_outside is not None else '')
+            + f"{len(skipped)} sessions skipped"
+            + (f" ({', '.join(str(date) for date in skipped[:10])}{', ...' if len(skipped) > 10 else ''})" if len(skipped) else ''))
+
+
+def _missing_prices(bars: BarSeries) -> np.ndarray:
+    if bars.decimals is None:
+        return np.isnan(bars.highs) | np.isnan(bars.lows)
+    return (bars.highs == INT32.min) | (bars.lows == INT32.max)
+
+
+def _cumulative(flags: np.ndarray) -> np.ndarray:
+    """Running count of the flags, with a leading zero so counts over [i, j) are c[j] - c[i]."""
+    counts = np.zeros(len(flags) + 1, dtype=np.int32)
+    np.cumsum(flags, out=counts[1:])
+    return counts
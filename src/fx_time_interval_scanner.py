@@ -1,8 +1,20 @@
+import numpy as np
 import pandas as pd
 import logging
 import os
-from src.utils import high_low_per_window, create_daily_date_schedule, create_overlapping_time_grid, shift_date_by_period
+from src.utils import create_intra_day_time_grid, shift_date_by_period, time_to_ns, period_to_timedelta
+from src.trading_calendar import get_calendar
 from src.market_data_service import MarketDataService
+from src.window_scan_engine import WindowScanEngine, DAY_NS
+from src.bar_series import BarSeries
+from src.result_cache import ResultCache
+from src.scanner_state import ScannerState
+from src.instrumentation import instrumentation
+from src.results_store import dense_rank, top_k_mask
+from src.bootstrap import bootstrap_intervals
+from src.walk_forward import walk_forward
+from src.data_quality import assess_sessions, summarize
+from src.partitioned_scan import partition_count, scan_partitions
 
 
 class FxTimeIntervalScanner:
@@ -17,7 +29,21 @@ class FxTimeIntervalScanner:
                  spread=0.0,
                  market_data_timezone=None,
                  ref_timezone=None,
-                 market_open_time: str = None):
+                 market_open_time: str = None,
+                 state_dir: str = None,
+                 log_every_n_days: int = 20,
+                 holiday_calendars: tuple = (),
+                 bootstrap_resamples: int = 0,
+                 confidence_level: float = 0.95,
+                 streaming: bool = False,
+                 result_cache: ResultCache = None,
+                 view_name: str = None,
+                 walk_forward_lookback=None,
+                 data_quality: bool = True,
+                 min_session_coverage: float = 0.0,
+                 job_name: str = None,
+                 scan_workers: int = 1,
+                 quiet: bool = False):
         self.tick_interval = tick_interval
         self.fx_rate = fx_rate
         self.high_low_interval = high_low_interval
@@ -28,215 +54,567 @@ class FxTimeIntervalScanner:
         self.timezone = market_data_timezone
         self.market_open_time = market_open_time
         self.ref_timezone = ref_timezone
+        self.state_dir = state_dir
+        self.log_every_n_days = max(1, log_every_n_days)
+        self.calendar = get_calendar(tuple(holiday_calendars))
+        self.bootstrap_resamples = bootstrap_resamples
+        self.confidence_level = confidence_level
+        self.streaming = streaming
+        self.result_cache = result_cache
+        self.view_name = view_name
+        self.walk_forward_lookback = walk_forward_lookback
+        self.data_quality = data_quality
+        self.min_session_coverage = min_session_coverage
+        self.job_name = job_name
+        self.scan_workers = scan_workers
+        # Scanners built per query, e.g. by the scan service, log their progress at debug level only
+        self.quiet = quiet
+        self.log_level = logging.DEBUG if quiet else logging.INFO
         
         self.high_counter_df = None
         self.low_counter_df = None
         self.low_or_high_counter_df = None
 
+        self.windows = None
+        self.n_days = None
+        self.high_counts = None
+        self.low_counts = None
+        self.low_or_high_counts = None
+        self.walk_forward_df = None
+        self.quality_df = None
+
         msg = f"Configured run with: {tick_interval} tick interval, "
         msg += f" {fx_rate} FX rate, {high_low_interval} horizon and "
         msg += f"{historical_data_range} historical data"
-        logging.info(msg)
+        logging.log(self.log_level, msg)
 
-    def run_scanner(self):  
+    def requested_range(self) -> tuple:
+        """First and last day of the configured historical data range, ending yesterday."""
         # Define full date range for when using API
         last_day = pd.Timestamp.today(tz=self.ref_timezone) - pd.Timedelta(days=1)
         first_day = shift_date_by_period(self.historical_data_range, last_day, "-")
-
-        # Load market data
-        fx_data_df = self.market_data_service.load_market_data(
-            self.fx_rate,
-            self.tick_interval,
-            first_day.to_pydatetime(),
-            last_day.to_pydatetime())
-        
+        return first_day, last_day
+
+    def load_market_data(self, columns: list = None) -> pd.DataFrame:
+        """
+        Loads the bars for the configured historical data range from the market data service.
+
+        :param columns: Columns of csv bars to load, all of them by default as the raw dump needs them.
+        """
+        first_day, last_day = self.requested_range()
+
+        with instrumentation.stage(self.fx_rate, 'load_market_data') as record:
+            fx_data_df = self.market_data_service.load_market_data(
+                self.fx_rate,
+                self.tick_interval,
+                first_day.to_pydatetime(),
+                last_day.to_pydatetime(),
+                columns)
+            record['rows'] = None if fx_data_df is None else len(fx_data_df)
+
+        if fx_data_df is None:
+            raise ValueError(f"No market data available for {self.fx_rate}")
+        return fx_data_df
+
+    def run_scanner(self, fx_data_df: pd.DataFrame = None):  
+        if self.streaming and fx_data_df is None:
+            state, n_days = self._stream_sessions()
+        else:
+            bars, historical_period, session_opens, overlapping_intra_day_grid = self._prepare_scan(fx_data_df)
+            state = self._cached_scan(bars, historical_period, session_opens, overlapping_intra_day_grid)
+            n_days = len(historical_period)
+
+        self.set_results(state, n_days)
+
+        if self.state_dir is not None:
+            state.save(self.state_path())
+
+    def update_scanner(self, fx_data_df: pd.DataFrame = None):
+        """
+        Updates the results saved by a previous run with the days completed since.
+
+        Only sessions that were not complete when the state was saved are scanned, and days that
+        have fallen out of the historical data range are subtracted from the counters. Falls back
+        to a full scan if there is no saved state or the intra-day grid has changed.
+        """
+        if self.state_dir is None:
+            raise ValueError("A state directory is required to update the scanner")
+
+        state = ScannerState.load(self.state_path())
+        # The raw dump of the saved run only misses the bars loaded since
+        bars, historical_period, session_opens, overlapping_intra_day_grid = self._prepare_scan(
+            fx_data_df, 
+            append_raw=state is not None)
+
+        if state is None or state.windows != overlapping_intra_day_grid:
+            logging.info(f"No compatible saved state for {self.fx_rate}, running a full scan")
+            state = self.scan_sessions(bars, historical_period, session_opens, overlapping_intra_day_grid)
+
+        else:
+            day_opens = session_opens.as_unit('ns').asi8
+            complete = state.complete_days(DAY_NS)
+            keep = complete & np.isin(state.day_opens, day_opens)
+            new_days = ~np.isin(day_opens, state.day_opens[keep])
+            logging.info(f"Updating {self.fx_rate}: {int(new_days.sum())} days to scan, "
+                         f"{int((~keep).sum())} saved days dropped")
+
+            # Only the bars of the sessions to scan are laid out
+            new_opens = day_opens[new_days]
+            new_bars = bars.between(0, 0)
+            if len(new_opens):
+                new_bars = bars.between(new_opens.min(), new_opens.max() + DAY_NS)
+
+            scanned = self.scan_sessions(
+                new_bars,
+                historical_period[new_days],
+                session_opens[new_days],
+                overlapping_intra_day_grid)
+            scanned.data_end = int(bars.times[-1])
+            state = state.fold(keep, scanned)
+
+        self.set_results(state, len(historical_period))
+        state.save(self.state_path())
+
+    def state_key(self) -> str:
+        """Identifies the scan configuration whose state is saved."""
+        return ScannerState.key(fx_rate=self.fx_rate, **self.scan_params())
+
+    def scan_params(self) -> dict:
+        """Parameters that, with the bars, determine the results of a scan."""
+        return dict(
+            tick_interval=self.tick_interval,
+            high_low_interval=self.high_low_interval,
+            historical_data_range=self.historical_data_range,
+            spread=self.spread,
+            market_data_timezone=self.timezone,
+            ref_timezone=self.ref_timezone,
+            market_open_time=self.market_open_time)
+
+    def state_path(self) -> str:
+        return os.path.join(self.state_dir, f"{self.fx_rate}_{self.state_key()}.npz")
+
+    def _prepare_scan(self, fx_data_df: pd.DataFrame = None, export_raw: bool = True, append_raw: bool = False) -> tuple:
+        """
+        Loads and localizes the bars, compacts them to a BarSeries and builds the trading schedule,
+        session opens and intra-day grid. The loaded DataFrame is only kept for the raw csv dump.
+        """
+        # Load market data, unless it was loaded beforehand
+        if fx_data_df is None:
+            fx_data_df = self.load_market_data()
+
+        bars = self.compact_bars(fx_data_df, export_raw, append_raw)
+        del fx_data_df
+
+        historical_period, session_opens, overlapping_intra_day_grid = self.bars_schedule(bars)
+        return bars, historical_period, session_opens, overlapping_intra_day_grid
+
+    def compact_bars(self, fx_data_df: pd.DataFrame, export_raw: bool = True, append_raw: bool = False) -> BarSeries:
+        """
+        Localizes the loaded bars to the market data timezone and compacts them to a BarSeries.
+
+        :param export_raw: Whether to dump the loaded bars to the raw time series csv.
+        :param append_raw: Whether to only append the bars after the last one already in the csv.
+        """
         # Adjust for timezone difference
-        fx_data_df.index = fx_data_df.index.tz_localize(self.timezone)
-        fx_data_df.to_csv(os.path.join('output', self.fx_rate + '_raw_time_series.csv'))
+        with instrumentation.stage(self.fx_rate, 'tz_localize', len(fx_data_df)):
+            bar_index = fx_data_df.index.tz_localize(self.timezone)
 
-        fx_data_df.index = fx_data_df.index.tz_convert(self.ref_timezone)
+        with instrumentation.stage(self.fx_rate, 'compact_bars', len(fx_data_df)):
+            bars = BarSeries.from_frame(fx_data_df, bar_index)
 
+        if export_raw:
+            self._export_raw(fx_data_df, bar_index, bars, append_raw)
+        return bars
+
+    def bars_schedule(self, bars: BarSeries) -> tuple:
+        """
+        Builds the trading schedule, session opens and intra-day grid over the days of the loaded bars.
+
+        :return: Tuple of the schedule, session opens and grid, without the sessions left out by the
+            data quality check.
+        """
         # Check first and last date from loaded fx data. 
-        # Shift by one day as first date is never full with TwelveData
-        first_day = fx_data_df.index.min() + pd.Timedelta(days=1)
-        last_day = fx_data_df.index.max() + pd.Timedelta(days=1)
-        logging.info(f"Actual date range: {first_day.strftime('%Y-%m-%d')} to {last_day.strftime('%Y-%m-%d')}")
-
-        # Compute the historical date schedule over which to compute the highs and lows,
-        historical_period = create_daily_date_schedule(first_day, last_day)        
-
-        # Define intra-day time windows
-        start = pd.Timestamp(
-            last_day.year, 
-            last_day.month, 
-            last_day.day, 
-            int(self.market_open_time[:2]), 
-            int(self.market_open_time[2:]),
-            tz=self.timezone)
-        
-        start = start.tz_convert(self.ref_timezone)
-        
-        overlapping_intra_day_grid = create_overlapping_time_grid(
-            start, 
-            start + pd.Timedelta(days=1), 
-            self.tick_interval, 
-            self.high_low_interval,
-            True)
-                                                            
-        # Initialize counters for time window distributions.
-        # These are used to build the empirical probability distributions
-        high_counter = {k: 0 for k in overlapping_intra_day_grid}
-        low_counter = {k: 0 for k in overlapping_intra_day_grid}
-        low_or_high_counter = {k: 0 for k in overlapping_intra_day_grid}
-        
-        opening_window_metrics = []
-        for current_date in historical_period:
-            current_opening_window_metrics = []
-
-            logging.info(f'Computing {self.fx_rate} high and low windows for: {current_date.strftime('%Y-%m-%d')}')
-
-            date_open = pd.Timestamp(current_date.year, 
-                                     current_date.month, 
-                                     current_date.day, 
-                                     int(self.market_open_time[:2]), 
-                                     int(self.market_open_time[2:]), 
-                                     tz=self.timezone)
-            date_open = date_open.tz_convert(self.ref_timezone)
-            date_close = date_open + pd.Timedelta(days=1)
-            logging.info(f'Trading day: {date_open} to {date_close} {self.ref_timezone}')
-
-            daily_opening_window = (date_open, shift_date_by_period(self.high_low_interval, date_open))
-            current_opening_window_metrics.append(date_open.date())
-
-            # Set current date time windows
-            windows = create_overlapping_time_grid(
-                date_open, 
-                date_close, 
-                self.tick_interval, 
-                self.high_low_interval, 
-                False)
-
-            # Restrict dataset to current dates
-            date_query = (fx_data_df.index >= date_open) & (fx_data_df.index < date_close)
-            current_fx_data = fx_data_df[date_query]
-
-            # Get high, lows across windows
-            high_low_windows = pd.DataFrame([[
-                window,
-                *high_low_per_window(window, current_fx_data)] 
-                for window in windows], 
-                columns=["window", "low", "high"])
-
-            daily_high = current_fx_data['high'].max() - self.spread
-            found_high_windows = high_low_windows[high_low_windows['high'] >= daily_high]['window'].to_list()
-            logging.debug(f"For {current_date.strftime('%Y-%m-%d')} found {len(found_high_windows)} windows containing the high")
-
-            daily_low = current_fx_data['low'].min() + self.spread
-            found_low_windows = high_low_windows[high_low_windows['low'] <= daily_low]['window'].to_list()
-            logging.debug(f"For {current_date.strftime('%Y-%m-%d')}, found {len(found_low_windows)} windows containing the low")
-
-            current_opening_window_metrics.append(daily_high)
-            current_opening_window_metrics.append(daily_low)
-
-            low_and_high_query = (high_low_windows['high'] >= daily_high) | (high_low_windows['low'] <= daily_low)
-            found_low_high_windows = high_low_windows[low_and_high_query]['window'].to_list()
-            logging.debug(f"For {current_date.strftime('%Y-%m-%d')}, found {len(found_low_high_windows)} windows containing the low or high")
-
-            if daily_opening_window in found_low_high_windows:
-                current_opening_window_metrics.append(True) 
+        # Shift by one day as first date is never full with TwelveData. The coverage check would now
+        # leave a partial first session out by itself, but only when min_session_coverage is set, and
+        # the shift is kept so the days the probabilities are relative to match earlier results.
+        first_day = pd.Timestamp(bars.times[0], tz='UTC').tz_convert(self.ref_timezone) + pd.Timedelta(days=1)
+        last_day = pd.Timestamp(bars.times[-1], tz='UTC').tz_convert(self.ref_timezone) + pd.Timedelta(days=1)
+        historical_period, session_opens, overlapping_intra_day_grid = self._build_schedule(first_day, last_day)
+
+        if self.data_quality:
+            historical_period, session_opens = self._check_quality(bars, historical_period, session_opens)
+        return historical_period, session_opens, overlapping_intra_day_grid
+
+    def _check_quality(self, bars: BarSeries, historical_period, session_opens) -> tuple:
+        """
+        Assesses the bars of every session in one pass and leaves the sessions covering less than
+        min_session_coverage of their bars out of the schedule.
+
+        :return: Tuple of the schedule and session opens that are kept.
+        """
+        with instrumentation.stage(self.fx_rate, 'data_quality', len(bars)):
+            quality = assess_sessions(bars, session_opens.as_unit('ns').asi8)
+            used = quality.mask(self.min_session_coverage)
+            self.quality_df = quality.to_frame(historical_period, used)
+
+        logging.log(self.log_level, summarize(self.fx_rate, self.quality_df, quality.n_outside, quality.n_out_of_order))
+        if used.all():
+            return historical_period, session_opens
+        return historical_period[used], session_opens[used]
+
+    def _export_raw(self, fx_data_df: pd.DataFrame, bar_index: pd.DatetimeIndex, bars: BarSeries, append: bool = False) -> None:
+        """
+        Dumps the loaded bars to csv, unless the result cache knows the file already holds them.
+
+        :param append: Append the bars stamped after the last bar of an existing csv, as the
+            streamed scans do, instead of rewriting it.
+        """
+        raw_file = self._raw_file()
+        written_until = self._last_raw_time(raw_file) if append else None
+        if written_until is not None:
+            unwritten = bar_index > written_until
+            with instrumentation.stage(self.fx_rate, 'raw_csv_dump', int(unwritten.sum())):
+                if unwritten.any():
+                    fx_data_df[unwritten].set_axis(bar_index[unwritten]).to_csv(raw_file, mode='a', header=False)
+            return
+
+        key = None
+        if self.result_cache is not None:
+            key = self.result_cache.frame_key(fx_data_df, market_data_timezone=self.timezone)
+            if self.result_cache.export_is_current(raw_file, key):
+                logging.debug(f"Raw time series of {self.fx_rate} unchanged, not rewriting {raw_file}")
+                return
+
+        with instrumentation.stage(self.fx_rate, 'raw_csv_dump', len(fx_data_df)):
+            fx_data_df.set_axis(bar_index).to_csv(raw_file)
+
+        if key is not None:
+            self.result_cache.mark_exported(raw_file, key)
+
+    @staticmethod
+    def _last_raw_time(raw_file: str):
+        """Timestamp of the last bar of a raw time series csv, None if there is none."""
+        if not os.path.exists(raw_file):
+            return None
+
+        # Only the tail of the file is read, the last line holding the last bar
+        with open(raw_file, 'rb') as f:
+            f.seek(max(os.path.getsize(raw_file) - 4096, 0))
+            lines = f.read().decode().strip().splitlines()
+        if len(lines) < 2:
+            return None
+        return pd.Timestamp(lines[-1].split(',', 1)[0])
+
+    def _raw_file(self) -> str:
+        """Raw time series csv of the pair, one per batch job as the jobs' date ranges differ."""
+        name = self.fx_rate if self.job_name is None else f"{self.fx_rate}_{self.job_name}"
+        return os.path.join('output', name + '_raw_time_series.csv')
+
+    def _build_schedule(self, first_day: pd.Timestamp, last_day: pd.Timestamp) -> tuple:
+        """Builds the trading schedule, session opens and intra-day grid between two days in the reference timezone."""
+        with instrumentation.stage(self.fx_rate, 'schedule_grid') as record:
+            logging.log(self.log_level, f"Actual date range: {first_day.strftime('%Y-%m-%d')} to {last_day.strftime('%Y-%m-%d')}")
+
+            # Compute the historical date schedule over which to compute the highs and lows,
+            # with the session opens for every day expressed in the reference timezone
+            historical_period, session_opens, _ = self.calendar.sessions(
+                first_day,
+                last_day,
+                self.market_open_time,
+                self.timezone,
+                self.ref_timezone)
+
+            # Define intra-day time windows, adding those of the sessions that fall on other
+            # wall-clock times across DST changes in the reference timezone
+            overlapping_intra_day_grid = create_intra_day_time_grid(
+                last_day,
+                self.market_open_time,
+                self.timezone,
+                self.ref_timezone,
+                self.tick_interval,
+                self.high_low_interval)
+            engine = WindowScanEngine(self.tick_interval, self.high_low_interval, self.spread)
+            overlapping_intra_day_grid = engine.extend_grid(
+                session_opens.as_unit('ns').asi8,
+                self.ref_timezone,
+                overlapping_intra_day_grid)
+            record['rows'] = len(historical_period)
+
+        return historical_period, session_opens, overlapping_intra_day_grid
+
+    def _stream_sessions(self) -> tuple:
+        """
+        Scans the sessions one at a time as the market data service streams their bars, so memory
+        depends on the size of a session rather than of the history. Only the bars of the scanned
+        sessions are written to the raw time series csv.
+
+        :return: Tuple of the scanner state and the number of days in the schedule.
+        """
+        first_day, last_day = self.requested_range()
+        with instrumentation.stage(self.fx_rate, 'data_bounds'):
+            bounds = self.market_data_service.data_bounds(
+                self.fx_rate,
+                self.tick_interval,
+                first_day.to_pydatetime(),
+                last_day.to_pydatetime())
+
+        if bounds is None:
+            raise ValueError(f"No market data available for {self.fx_rate}")
+
+        data_start, data_end = pd.DatetimeIndex(bounds).tz_localize(self.timezone).tz_convert(self.ref_timezone)
+        historical_period, session_opens, overlapping_intra_day_grid = self._build_schedule(
+            data_start + pd.Timedelta(days=1),
+            data_end + pd.Timedelta(days=1))
+
+        # Session bounds in the data timezone, widened by an hour as DST changes repeat wall-clock
+        # times. The engine only keeps the bars within each session.
+        day_opens = session_opens.as_unit('ns').asi8
+        session_starts = pd.to_datetime(day_opens, utc=True).tz_convert(self.timezone).tz_localize(None) - pd.Timedelta(hours=1)
+        session_ends = pd.to_datetime(day_opens + DAY_NS, utc=True).tz_convert(self.timezone).tz_localize(None) + pd.Timedelta(hours=1)
+
+        engine = WindowScanEngine(self.tick_interval, self.high_low_interval, self.spread)
+        raw_file = self._raw_file()
+        written_until = None
+        days = []
+        # A session holds too few bars to infer their length from, the bars are fetched at the tick interval
+        bar_ns = period_to_timedelta(self.tick_interval).value
+        used = np.ones(len(day_opens), dtype=bool)
+        qualities = []
+
+        with instrumentation.stage(self.fx_rate, 'stream_scan') as record:
+            sessions = self.market_data_service.iter_session_bars(
+                self.fx_rate,
+                self.tick_interval,
+                first_day.to_pydatetime(),
+                last_day.to_pydatetime(),
+                session_starts,
+                session_ends)
+
+            n_bars = 0
+            for day, session_df in zip(range(len(day_opens)), sessions):
+                index = session_df.index.tz_localize(self.timezone)
+                n_bars += len(session_df)
+
+                unwritten = slice(None) if written_until is None else index > written_until
+                if len(index[unwritten]):
+                    session_df.iloc[unwritten].set_axis(index[unwritten]).to_csv(
+                        raw_file, 
+                        mode='w' if written_until is None else 'a', 
+                        header=written_until is None)
+                    written_until = index[unwritten][-1]
+
+                session_bars = BarSeries.from_frame(session_df, index)
+                if self.data_quality:
+                    quality = assess_sessions(session_bars, day_opens[day:day + 1], bar_ns)
+                    used[day] = quality.mask(self.min_session_coverage)[0]
+                    qualities.append(quality.to_frame(historical_period[day:day + 1], used[day:day + 1]))
+                    if not used[day]:
+                        continue
+
+                scan = engine.scan_bars(session_bars, day_opens[day:day + 1])
+                grid_idx = engine.map_to_grid(scan.day_opens, self.ref_timezone, overlapping_intra_day_grid)
+                days.append(ScannerState.from_scan(
+                    scan, 
+                    grid_idx, 
+                    overlapping_intra_day_grid, 
+                    session_opens.date[day:day + 1], 
+                    0))
+            record['rows'] = n_bars
+
+        if qualities:
+            self.quality_df = pd.concat(qualities, ignore_index=True)
+            # Only the bars of the sessions are streamed, those outside or out of order are not counted
+            logging.log(self.log_level, summarize(self.fx_rate, self.quality_df))
+            historical_period, session_opens = historical_period[used], session_opens[used]
+
+        state = ScannerState.concatenate(days, data_end.value, overlapping_intra_day_grid)
+        self._log_days(historical_period, session_opens, state)
+        return state, len(historical_period)
+
+    def _cached_scan(self, bars, historical_period, session_opens, overlapping_intra_day_grid) -> ScannerState:
+        """Returns the state of an identical earlier scan from the result cache, else scans and caches it."""
+        key, state = self.cache_lookup(bars, historical_period, overlapping_intra_day_grid)
+        if state is not None:
+            return state
+
+        state = self.scan_sessions(bars, historical_period, session_opens, overlapping_intra_day_grid)
+        if key is not None:
+            self.result_cache.put(key, state)
+        return state
+
+    def cache_lookup(self, bars, historical_period, overlapping_intra_day_grid) -> tuple:
+        """
+        Looks the scan of the bars up in the result cache.
+
+        :return: Tuple of the cache key, None without a result cache, and the cached state, None if there is none.
+        """
+        if self.result_cache is None:
+            return None, None
+
+        with instrumentation.stage(self.fx_rate, 'result_cache', len(bars)):
+            key = self.result_cache.key(
+                bars,
+                holiday_calendars=self.calendar.holiday_calendars,
+                min_session_coverage=self.min_session_coverage if self.data_quality else 0.0,
+                **self.scan_params())
+            state = self.result_cache.get(key)
+
+        if state is not None and state.windows == overlapping_intra_day_grid and state.n_days == len(historical_period):
+            logging.info(f"Reusing cached results for {self.fx_rate} ({key})")
+            return key, state
+        return key, None
+
+    def scan_sessions(self, bars, historical_period, session_opens, overlapping_intra_day_grid, timeline=None) -> ScannerState:
+        """
+        Scans the given sessions of a BarSeries and returns their per-day hit records on the intra-day grid.
+
+        :param timeline: BarTimeline of the bars shared with other views of the pair. Without one the
+            bars are laid out for these sessions only, in partitions of days on scan_workers processes
+            when there are enough of them.
+        """
+        # Compute every window's high and low for all days at once
+        with instrumentation.stage(self.fx_rate, 'scan', len(bars)):
+            day_opens = session_opens.as_unit('ns').asi8
+            n_partitions = partition_count(len(day_opens), self.scan_workers) if timeline is None else 1
+            if n_partitions > 1:
+                state = scan_partitions(
+                    bars,
+                    day_opens,
+                    session_opens.date,
+                    overlapping_intra_day_grid,
+                    (self.tick_interval, self.high_low_interval, self.spread),
+                    self.ref_timezone,
+                    n_partitions)
+                self._log_days(historical_period, session_opens, state)
+                return state
+
+            engine = WindowScanEngine(self.tick_interval, self.high_low_interval, self.spread)
+            if timeline is None:
+                scan = engine.scan_bars(bars, day_opens)
             else:
-                current_opening_window_metrics.append(False)    
-
-            hw_as_time = [(
-                window[0].to_pydatetime().time(),
-                window[1].to_pydatetime().time(),
-                        ) for window in found_high_windows]
-
-            lw_as_time = [(
-                window[0].to_pydatetime().time(),
-                window[1].to_pydatetime().time(),
-                        ) for window in found_low_windows]
-            
-            low_or_high_as_time = [(
-                window[0].to_pydatetime().time(),
-                window[1].to_pydatetime().time(),
-                        ) for window in found_low_high_windows]
-
-            for high_window in hw_as_time:
-                if high_window in high_counter:
-                    high_counter[high_window] += 1
-                else:
-                    raise ValueError("Problem with time window")
-                
-            for low_window in lw_as_time:
-                if low_window in low_counter:
-                    low_counter[low_window] += 1
-                else:
-                    raise ValueError("Problem with time window")
-                
-            for low_or_high_window in low_or_high_as_time:
-                if low_or_high_window in low_or_high_counter:
-                    low_or_high_counter[low_or_high_window] += 1
-                else:
-                    raise ValueError("Problem with time window")
-                
-            opening_window_metrics.append(current_opening_window_metrics)
-
-        self.high_counter_df = pd.DataFrame(list(high_counter.items()), columns=['window', 'count'])
-        self.high_counter_df['probability'] = self.high_counter_df['count'] / len(historical_period)
-
-        self.low_counter_df = pd.DataFrame(list(low_counter.items()), columns=['window', 'count'])
-        self.low_counter_df['probability'] = self.low_counter_df['count'] / len(historical_period)
-
-        self.low_or_high_counter_df = pd.DataFrame(list(low_or_high_counter.items()), columns=['window', 'count'])
-        self.low_or_high_counter_df['probability'] = self.low_or_high_counter_df['count'] / len(historical_period)
-
-        self.opening_window_metrics = pd.DataFrame(opening_window_metrics, 
-                                                   columns=['date', 'daily_high', 'daily_low', 'opening_window_contains_high_or_low'])
+                scan = engine.scan_timeline(timeline, day_opens)
+            grid_idx = engine.map_to_grid(scan.day_opens, self.ref_timezone, overlapping_intra_day_grid)
+
+            self._log_days(historical_period, session_opens, scan)
+
+            return ScannerState.from_scan(
+                scan, 
+                grid_idx, 
+                overlapping_intra_day_grid, 
+                session_opens.date, 
+                int(bars.times[-1]) if len(bars) else 0)
+
+    def _log_days(self, historical_period, session_opens, scan) -> None:
+        """
+        Logs one summary per log_every_n_days days at info level and one record per day at debug
+        level, none when quiet. Nothing is computed or formatted when the level is disabled.
+        """
+        logger = logging.getLogger()
+        if self.quiet or not logger.isEnabledFor(logging.INFO) or scan.n_days == 0:
+            return
+
+        hits_per_day = np.stack([
+            scan.high_hits.sum(axis=1),
+            scan.low_hits.sum(axis=1),
+            scan.low_or_high_hits.sum(axis=1)], axis=1)
+        dates = [current_date.strftime('%Y-%m-%d') for current_date in historical_period]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for day in range(scan.n_days):
+                logger.debug("%s trading day %s from %s %s: %d windows containing the high, %d the low, %d the low or high",
+                             self.fx_rate, dates[day], session_opens[day], self.ref_timezone, *hits_per_day[day])
+
+        for start in range(0, scan.n_days, self.log_every_n_days):
+            end = min(start + self.log_every_n_days, scan.n_days)
+            logger.info("Computed %s high and low windows for %d days from %s to %s: on average %.1f windows "
+                        "containing the high, %.1f the low, %.1f the low or high",
+                        self.fx_rate, end - start, dates[start], dates[end - 1], *hits_per_day[start:end].mean(axis=0))
+
+    def set_results(self, state: ScannerState, n_days: int) -> None:
+        """
+        Sets the counters, probabilities and derived statistics of the scanner from a scan state.
+
+        The steps of run_scanner are public so that scans sharing one load or layout of the bars,
+        such as ProjectedScan and ScanService, compose them: compact_bars, bars_schedule,
+        cache_lookup, scan_sessions and then set_results.
+
+        :param state: State of the scanned sessions.
+        :param n_days: Days in the schedule, which the probabilities are relative to.
+        """
+        # Dense counters for the time window distributions, aligned with the intra-day grid.
+        # These are used to build the empirical probability distributions
+        self.windows = state.windows
+        self.n_days = n_days
+        self.high_counts = state.high_counts
+        self.low_counts = state.low_counts
+        self.low_or_high_counts = state.low_or_high_counts
+
+        self.high_counter_df = pd.DataFrame({'window': state.windows, 'count': self.high_counts})
+        self.high_counter_df['probability'] = self.high_counter_df['count'] / n_days
+
+        self.low_counter_df = pd.DataFrame({'window': state.windows, 'count': self.low_counts})
+        self.low_counter_df['probability'] = self.low_counter_df['count'] / n_days
+
+        self.low_or_high_counter_df = pd.DataFrame({'window': state.windows, 'count': self.low_or_high_counts})
+        self.low_or_high_counter_df['probability'] = self.low_or_high_counter_df['count'] / n_days
+
+        if self.bootstrap_resamples > 0:
+            self._add_confidence_intervals(state, n_days)
+
+        if self.walk_forward_lookback is not None:
+            with instrumentation.stage(self.fx_rate, 'walk_forward', state.n_days):
+                self.walk_forward_df = walk_forward(
+                    {'high': state.high_hits, 'low': state.low_hits, 'low_or_high': state.low_or_high_hits},
+                    state.dates,
+                    state.windows,
+                    self.walk_forward_lookback)
+
+        self.opening_window_metrics = pd.DataFrame({
+            'date': pd.DatetimeIndex(state.dates).date,
+            'daily_high': state.daily_high,
+            'daily_low': state.daily_low,
+            'opening_window_contains_high_or_low': state.opening_window_hits})
+
+    def _add_confidence_intervals(self, state: ScannerState, n_days: int) -> None:
+        """
+        Adds bootstrap percentile intervals of the probabilities to the counters, with the
+        probability of each window being the top window. Days are resampled from the per-day
+        hits, with a fixed seed so reruns give the same intervals.
+        """
+        with instrumentation.stage(self.fx_rate, 'bootstrap', self.bootstrap_resamples):
+            intervals = bootstrap_intervals(
+                [state.high_hits, state.low_hits, state.low_or_high_hits],
+                n_days,
+                self.bootstrap_resamples,
+                self.confidence_level,
+                seed=0)
+
+            counter_dfs = (self.high_counter_df, self.low_counter_df, self.low_or_high_counter_df)
+            for counter_df, (lower, upper, top_probability) in zip(counter_dfs, intervals):
+                counter_df['probability_lower'] = lower
+                counter_df['probability_upper'] = upper
+                counter_df['top_probability'] = top_probability
 
     def export_results(self, full_results: bool) -> None:
+        with instrumentation.stage(self.fx_rate, 'export_results', len(self.high_counter_df)):
+            self._export_results(full_results)
+
+    def _export_results(self, full_results: bool) -> None:
         if not os.path.exists('output'):
             os.makedirs('output')
 
         prefix = self.fx_rate + '_'
+        if self.view_name is not None:
+            prefix += self.view_name + '_'
         logging.info(f"Exporting empirical distributions to csv")
         if full_results:
             self.high_counter_df.to_csv(os.path.join('output', prefix + 'market_high_counter.csv'), index=False)
             self.low_counter_df.to_csv(os.path.join('output', prefix + 'market_low_counter.csv'), index=False)
             self.low_or_high_counter_df.to_csv(os.path.join('output', prefix + 'market_low_or_high_counter.csv'), index=False)
 
-        self.high_counter_df.sort_values(by='count', ascending=False, inplace=True)
-        self.low_counter_df.sort_values(by='count', ascending=False, inplace=True)
-        self.low_or_high_counter_df.sort_values(by='count', ascending=False, inplace=True)
-
-        high_top3 = sorted(set(self.high_counter_df['count']), reverse=True)[:3]  
-        low_top3 = sorted(set(self.low_counter_df['count']), reverse=True)[:3]  
-        low_or_high_top3 = sorted(set(self.low_or_high_counter_df['count']), reverse=True)[:3]  
-
-        high_top_3_rows = pd.DataFrame()
-        for value in high_top3:
-            high_top_3_rows = pd.concat([
-                high_top_3_rows, 
-                self.high_counter_df[self.high_counter_df['count'] == value]])
-            if high_top_3_rows.shape[0] >= 3:
-                break
-
-        low_top_3_rows = pd.DataFrame()
-        for value in low_top3:
-            low_top_3_rows = pd.concat([
-                low_top_3_rows, 
-                self.low_counter_df[self.low_counter_df['count'] == value]])
-            if low_top_3_rows.shape[0] >= 3:
-                break
-
-        low_or_high_top3_rows = pd.DataFrame()
-        for value in low_or_high_top3:
-            low_or_high_top3_rows = pd.concat([
-                low_or_high_top3_rows, 
-                self.low_or_high_counter_df[self.low_or_high_counter_df['count'] == value]])
-            
-            if low_or_high_top3_rows.shape[0] >= 3:
-                break
+        high_top_3_rows = self._top_intervals(self.high_counter_df)
+        low_top_3_rows = self._top_intervals(self.low_counter_df)
+        low_or_high_top3_rows = self._top_intervals(self.low_or_high_counter_df)
 
         if full_results:
             high_top_3_rows.to_csv(os.path.join('output', prefix + 'top_intervals_market_high.csv'), index=False)
@@ -246,3 +624,51 @@ class FxTimeIntervalScanner:
 
         # opening window metrics
         self.opening_window_metrics.to_csv(os.path.join('output', prefix + 'opening_window_metrics.csv'), index=False)
+
+        # bars and gaps of every session
+        if self.quality_df is not None:
+            self.quality_df.to_csv(os.path.join('output', prefix + 'data_quality.csv'), index=False)
+
+        # top windows over every trailing period
+        if self.walk_forward_df is not None:
+            self.walk_forward_df.to_csv(os.path.join('output', prefix + 'walk_forward.csv'), index=False)
+
+    def results_frame(self) -> pd.DataFrame:
+        """
+        Counters of every window in one tidy table, with the windows as start and end minutes of
+        the day in the reference timezone and the scan parameters as columns. Windows spanning
+        midnight end on a lower minute than they start.
+        """
+        n_windows = len(self.windows)
+        results_df = pd.DataFrame({
+            'pair': self.fx_rate,
+            'tick_interval': str(self.tick_interval),
+            'low_high_interval': str(self.high_low_interval),
+            'historical_data_range': str(self.historical_data_range),
+            'spread': self.spread,
+            'market_open_time': self.market_open_time,
+            'market_data_timezone': self.timezone,
+            'ref_timezone': self.ref_timezone,
+            'window_start_minute': np.array([time_to_ns(window[0]) // 60_000_000_000 for window in self.windows], dtype=np.int16),
+            'window_end_minute': np.array([time_to_ns(window[1]) // 60_000_000_000 for window in self.windows], dtype=np.int16),
+            'n_days': np.full(n_windows, self.n_days, dtype=np.int32)},
+            index=pd.RangeIndex(n_windows))
+
+        for counter, counts in (('high', self.high_counts), ('low', self.low_counts), ('low_or_high', self.low_or_high_counts)):
+            counts = np.asarray(counts)
+            results_df[counter + '_count'] = counts.astype(np.int32)
+            results_df[counter + '_probability'] = counts / self.n_days
+            results_df[counter + '_rank'] = dense_rank(counts).astype(np.int16)
+            results_df[counter + '_top3'] = top_k_mask(counts, 3)
+
+        for counter, counter_df in (('high', self.high_counter_df), ('low', self.low_counter_df), ('low_or_high', self.low_or_high_counter_df)):
+            for column in ('probability_lower', 'probability_upper', 'top_probability'):
+                if column in counter_df:
+                    results_df[f"{counter}_{column}"] = counter_df[column].to_numpy()
+        return results_df
+
+    @staticmethod
+    def _top_intervals(counter_df: pd.DataFrame, k: int = 3) -> pd.DataFrame:
+        """Windows with the k highest counts, in descending order of count."""
+        counter_df = counter_df.sort_values(by='count', ascending=False)
+        return counter_df[top_k_mask(counter_df['count'].to_numpy(), k)]
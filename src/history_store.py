@@ -0,0 +1,115 @@
+import logging
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Optional
+from src.bar_cache import BarCache
+from src.period import Period
+
+
+class HistoryStore:
+    """
+    Persistent per symbol and timeframe bar history, kept up to date with delta fetches.
+
+    Each entry records the contiguous range it covers. A request only fetches what lies outside
+    that range from the API and merges it in, so a daily run downloads one day instead of the
+    whole horizon.
+    """
+
+    def __init__(self, bar_cache: BarCache) -> None:
+        """
+        :param bar_cache: Cache in which the histories are persisted.
+        """
+        self.bar_cache = bar_cache
+
+    def sync(self,
+             mt5_api,
+             symbol: str,
+             timeframe: Period,
+             start: datetime,
+             end: datetime) -> Optional[pd.DataFrame]:
+        """
+        Brings the stored history up to date for the requested range and returns that range.
+
+        :param mt5_api: Connected MT5API used for the missing ranges.
+        :param symbol: Trading instrument (e.g., "EURUSD").
+        :param timeframe: Period representing the bar frequency.
+        :param start: Start datetime of the requested range.
+        :param end: End datetime of the requested range.
+        :return: DataFrame of bars between start and end or None if nothing could be retrieved.
+        """
+        key = self.update(mt5_api, symbol, timeframe, start, end)
+        if key is None:
+            return None
+
+        return self.bar_cache.read(key, to_utc_naive(start), to_utc_naive(end))
+
+    def update(self,
+               mt5_api,
+               symbol: str,
+               timeframe: Period,
+               start: datetime,
+               end: datetime) -> Optional[str]:
+        """
+        Brings the stored history up to date for the requested range without returning the bars.
+
+        :return: Cache entry name of the history or None if nothing could be retrieved.
+        """
+        key = BarCache.key(symbol, timeframe)
+        start = to_utc_naive(start)
+        end = to_utc_naive(end)
+
+        meta = self.bar_cache.meta(key)
+        coverage = meta.get("coverage") if meta is not None else None
+
+        if coverage is None:
+            stored = None
+            held_start, held_end = end, end
+            missing = [(start, end)]
+        else:
+            stored = self.bar_cache.read(key)
+            held_start, held_end = pd.Timestamp(coverage[0]), pd.Timestamp(coverage[1])
+            missing = []
+            if start < held_start:
+                missing.append((start, held_start))
+            if end > held_end:
+                # Refetch from the last stored bar as it may have been incomplete when fetched
+                tail_start = min(held_end, stored.index.max()) if len(stored) else held_end
+                missing.append((tail_start, end))
+
+        fetched = []
+        for fetch_start, fetch_end in missing:
+            logging.info(f"Fetching missing {symbol} {timeframe} history from {fetch_start} to {fetch_end}.")
+            df = mt5_api.copy_rates_range(
+                symbol,
+                timeframe,
+                fetch_start.tz_localize("UTC").to_pydatetime(),
+                fetch_end.tz_localize("UTC").to_pydatetime())
+
+            if df is None:
+                logging.warning(f"Could not fetch {symbol} history from {fetch_start} to {fetch_end}.")
+                continue
+
+            fetched.append(df)
+            held_start = min(held_start, fetch_start)
+            held_end = max(held_end, fetch_end)
+
+        if stored is None and not fetched:
+            return None
+
+        if fetched:
+            merged = pd.concat(([stored] if stored is not None else []) + fetched)
+            merged = merged[~merged.index.duplicated(keep="last")]
+            self.bar_cache.write(key, merged, coverage=(held_start, held_end))
+            logging.info(f"Stored {symbol} {timeframe} history now covers {held_start} to {held_end}.")
+        else:
+            logging.info(f"Stored {symbol} {timeframe} history is up to date.")
+
+        return key
+
+
+def to_utc_naive(value: datetime) -> pd.Timestamp:
+    """Converts a datetime to a naive UTC timestamp, assuming UTC if it is naive."""
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert(timezone.utc).tz_localize(None)
+    return value
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import cProfile
+import logging
+import tracemalloc
+import pandas as pd
+from datetime import datetime
+from contextlib import contextmanager
+
+
+class Instrumentation:
+    """
+    Records wall time, CPU time, rows processed and memory of the stages of a run, per pair.
+
+    Peak memory per stage is only traced when trace_memory is on, as tracemalloc slows down
+    allocations. The process resident set size after each stage is always recorded.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.trace_memory = False
+        self.profile = False
+        self.records = []
+        self._process = None
+
+    def configure(self, enabled: bool = True, trace_memory: bool = False, profile: bool = False) -> None:
+        """
+        :param enabled: Record the stages.
+        :param trace_memory: Trace the peak Python memory of each stage with tracemalloc.
+        :param profile: Profile each pair's run with cProfile.
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.profile = profile
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, pair: str, name: str, rows: int = None):
+        """
+        Records one stage of a pair's run. The yielded record can be updated, e.g. with the
+        number of rows once they are known.
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        record = {'pair': pair, 'stage': name, 'rows': rows, 'started': datetime.now().isoformat(timespec='milliseconds')}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            traced_before, _ = tracemalloc.get_traced_memory()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start
+            record['peak_mb'] = None
+            if self.trace_memory:
+                _, traced_peak = tracemalloc.get_traced_memory()
+                record['peak_mb'] = (traced_peak - traced_before) / 2**20
+            record['rss_mb'] = self._rss_mb()
+            self.records.append(record)
+
+    def _rss_mb(self) -> float:
+        """Resident set size of this process in MB."""
+        # psutil is imported by the first stage recorded, and forked workers get their own handle
+        if self._process is None or self._process.pid != os.getpid():
+            import psutil
+            self._process = psutil.Process()
+        return self._process.memory_info().rss / 2**20
+
+    @contextmanager
+    def profiled(self, pair: str, output_path: str = 'output'):
+        """Profiles the enclosed code with cProfile if profiling is on, into <pair>_profile.prof."""
+        if not self.profile:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profile_file = os.path.join(output_path, f"{pair}_profile.prof")
+            profiler.dump_stats(profile_file)
+            logging.info(f"Profile of {pair} written to {profile_file}")
+
+    def collect(self) -> list:
+        """Returns the records so far and clears them, e.g. to send them from a worker process."""
+        records, self.records = self.records, []
+        return records
+
+    def export(self, output_path: str = 'output') -> None:
+        """Writes the records as a run report in json and csv."""
+        if not self.enabled or not self.records:
+            return
+
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+
+        report_file = os.path.join(output_path, f"run_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        with open(report_file + '.json', 'w') as f:
+            json.dump(self.records, f, indent=2)
+
+        report_df = pd.DataFrame(self.records, columns=['pair', 'stage', 'rows', 'wall_s', 'cpu_s', 'peak_mb', 'rss_mb', 'started'])
+        report_df.to_csv(report_file + '.csv', index=False)
+
+        totals = report_df.groupby('stage', sort=False)[['wall_s', 'cpu_s']].sum()
+        for stage, row in totals.iterrows():
+            logging.info(f"Stage {stage}: {row['wall_s']:.3f}s wall, {row['cpu_s']:.3f}s CPU")
+        logging.info(f"Run report written to {report_file}.json")
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,271 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Optional
+from src.tick_data import iter_tick_file
+
+
+RATE_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('tick_volume', '<u8'),
+    ('spread', '<i4'),
+    ('real_volume', '<u8')])
+
+TICK_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('last', '<f8'),
+    ('volume', '<u8'),
+    ('time_msc', '<i8'),
+    ('flags', '<u4'),
+    ('volume_real', '<f8')])
+
+# Error codes of MetaTrader5.last_error()
+RES_S_OK = 1
+RES_E_FAIL = -1
+RES_E_INVALID_PARAMS = -2
+RES_E_INTERNAL_FAIL_TIMEOUT = -10005
+RES_E_AUTH_FAILED = -6
+
+
+class LocalMT5:
+    """
+    Stand-in for the MetaTrader5 package, serving bars and ticks from local files.
+
+    Exposes the subset of the MetaTrader5 module used by MT5API (initialize, login, last_error,
+    copy_rates_range, copy_ticks_range, shutdown and the timeframe constants), with the same
+    return conventions: structured arrays on success, None on failure with the reason in
+    last_error(). Every call can be slowed down by a fixed and a random latency, requests returning
+    more than max_rows rows fail as they do past the terminal's bar limit, and calls fail at random
+    at failure_rate, so the fetch path can be load tested without a terminal.
+
+    Bars are read from data_dir/rates_filename, a csv with datetime, open, high, low and close
+    columns in UTC, and resampled to the requested timeframe. Ticks are read from
+    data_dir/tick_filename, a csv or Parquet file with datetime, bid and ask columns.
+    """
+
+    TIMEFRAME_M1 = 1
+    TIMEFRAME_M2 = 2
+    TIMEFRAME_M3 = 3
+    TIMEFRAME_M4 = 4
+    TIMEFRAME_M5 = 5
+    TIMEFRAME_M10 = 10
+    TIMEFRAME_M15 = 15
+    TIMEFRAME_M30 = 30
+    TIMEFRAME_H1 = 16385
+    TIMEFRAME_H2 = 16386
+    TIMEFRAME_H3 = 16387
+    TIMEFRAME_H4 = 16388
+    TIMEFRAME_H6 = 16390
+    TIMEFRAME_H8 = 16392
+    TIMEFRAME_H12 = 16396
+    TIMEFRAME_D1 = 16408
+    TIMEFRAME_W1 = 32769
+    TIMEFRAME_MN1 = 49153
+
+    COPY_TICKS_ALL = -1
+    COPY_TICKS_INFO = 1
+    COPY_TICKS_TRADE = 2
+
+    def __init__(self,
+                 data_dir: str = 'data',
+                 rates_filename: str = '{symbol}.csv',
+                 tick_filename: str = '{symbol}_ticks.csv',
+                 latency: float = 0.0,
+                 latency_jitter: float = 0.0,
+                 max_rows: int = 100_000,
+                 failure_rate: float = 0.0,
+                 seed: int = None) -> None:
+        """
+        :param data_dir: Directory of the bar and tick files.
+        :param rates_filename: Name of the bar file, {symbol} is replaced by the symbol.
+        :param tick_filename: Name of the tick file, {symbol} is replaced by the symbol.
+        :param latency: Seconds every call waits.
+        :param latency_jitter: Upper bound of a uniformly drawn number of seconds added to the latency.
+        :param max_rows: Most rows a single copy request may return, 0 for no limit.
+        :param failure_rate: Probability of any call failing.
+        :param seed: Seed of the latency and failure draws.
+        """
+        self.data_dir = data_dir
+        self.rates_filename = rates_filename
+        self.tick_filename = tick_filename
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.max_rows = max_rows
+        self.failure_rate = failure_rate
+
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._rates = {}
+        self._ticks = {}
+        self._error = (RES_S_OK, 'Success')
+        self._initialized = False
+
+        self.n_calls = 0
+        self.n_failures = 0
+        self.n_rows = 0
+        self.waited = 0.0
+
+    def initialize(self, *args, **kwargs) -> bool:
+        if not self._call('initialize'):
+            return False
+        self._initialized = True
+        return True
+
+    def login(self, login: int = None, password: str = None, server: str = None, **kwargs) -> bool:
+        if not self._call('login'):
+            return False
+        if not self._initialized:
+            self._error = (RES_E_AUTH_FAILED, 'Authorization failed')
+            return False
+        return True
+
+    def last_error(self) -> tuple:
+        return self._error
+
+    def shutdown(self) -> None:
+        self._initialized = False
+        logging.debug(f"Local MT5 served {self.n_rows} rows in {self.n_calls} calls, "
+                      f"{self.n_failures} failed, {self.waited:.2f}s of simulated latency")
+
+    def copy_rates_range(self, symbol: str, timeframe: int, date_from: datetime, date_to: datetime) -> Optional[np.ndarray]:
+        """Bars of a symbol opening from date_from to date_to, both included."""
+        if not self._call('copy_rates_range'):
+            return None
+
+        try:
+            rates = self._symbol_rates(symbol, timeframe)
+        except (OSError, ValueError) as err:
+            self._error = (RES_E_INVALID_PARAMS, f"Invalid params: {err}")
+            return None
+
+        first = np.searchsorted(rates['time'], _to_seconds(date_from), side='left')
+        last = np.searchsorted(rates['time'], _to_seconds(date_to), side='right')
+        return self._capped(rates[first:last])
+
+    def copy_ticks_range(self, symbol: str, date_from: datetime, date_to: datetime, flags: int) -> Optional[np.ndarray]:
+        """Ticks of a symbol from date_from to date_to, both included."""
+        if not self._call('copy_ticks_range'):
+            return None
+
+        try:
+            ticks = self._symbol_ticks(symbol)
+        except (OSError, ValueError) as err:
+            self._error = (RES_E_INVALID_PARAMS, f"Invalid params: {err}")
+            return None
+
+        first = np.searchsorted(ticks['time_msc'], _to_seconds(date_from) * 1000, side='left')
+        last = np.searchsorted(ticks['time_msc'], _to_seconds(date_to) * 1000, side='right')
+        return self._capped(ticks[first:last])
+
+    def _call(self, name: str) -> bool:
+        """Waits the simulated latency and draws whether the call fails."""
+        with self._lock:
+            self.n_calls += 1
+            wait = self.latency + self.latency_jitter * self._rng.random()
+            failed = self._rng.random() < self.failure_rate
+
+        if wait > 0:
+            time.sleep(wait)
+            self.waited += wait
+
+        if failed:
+            self.n_failures += 1
+            self._error = (RES_E_INTERNAL_FAIL_TIMEOUT, 'Terminal: Timeout (injected)')
+            logging.debug(f"Injected failure of local MT5 {name}")
+            return False
+
+        self._error = (RES_S_OK, 'Success')
+        return True
+
+    def _capped(self, rows: np.ndarray) -> Optional[np.ndarray]:
+        if self.max_rows and len(rows) > self.max_rows:
+            self._error = (RES_E_INVALID_PARAMS, f"Invalid params: {len(rows)} rows requested, at most {self.max_rows}")
+            return None
+        self.n_rows += len(rows)
+        return rows.copy()
+
+    def _symbol_rates(self, symbol: str, timeframe: int) -> np.ndarray:
+        key = (symbol, timeframe)
+        if key not in self._rates:
+            path = os.path.join(self.data_dir, self.rates_filename.format(symbol=symbol))
+            bars = pd.read_csv(path, index_col=0, parse_dates=True)
+            bars = _resample(bars, _timeframe_rule(timeframe))
+
+            rates = np.zeros(len(bars), dtype=RATE_DTYPE)
+            rates['time'] = bars.index.as_unit('s').asi8
+            for column in ('open', 'high', 'low', 'close'):
+                rates[column] = bars[column].to_numpy()
+            if 'tick_volume' in bars:
+                rates['tick_volume'] = bars['tick_volume'].to_numpy()
+            self._rates[key] = rates
+            logging.debug(f"Local MT5 loaded {len(rates)} {symbol} bars from {path}")
+        return self._rates[key]
+
+    def _symbol_ticks(self, symbol: str) -> np.ndarray:
+        if symbol not in self._ticks:
+            path = os.path.join(self.data_dir, self.tick_filename.format(symbol=symbol))
+            chunks = list(iter_tick_file(path))
+            times = np.concatenate([chunk[0] for chunk in chunks]) if chunks else np.zeros(0, dtype=np.int64)
+            order = np.argsort(times, kind='stable')
+
+            ticks = np.zeros(len(times), dtype=TICK_DTYPE)
+            ticks['time_msc'] = times[order] // 1_000_000
+            ticks['time'] = ticks['time_msc'] // 1000
+            for position, column in ((1, 'bid'), (2, 'ask')):
+                ticks[column] = np.concatenate([chunk[position] for chunk in chunks])[order] if chunks else []
+            self._ticks[symbol] = ticks
+            logging.debug(f"Local MT5 loaded {len(ticks)} {symbol} ticks from {path}")
+        return self._ticks[symbol]
+
+
+def _timeframe_rule(timeframe: int) -> str:
+    """Pandas frequency of an MT5 timeframe constant."""
+    if timeframe == LocalMT5.TIMEFRAME_MN1:
+        return 'MS'
+    if timeframe == LocalMT5.TIMEFRAME_W1:
+        return 'W-SUN'
+    if timeframe == LocalMT5.TIMEFRAME_D1:
+        return 'D'
+    if timeframe & 0x4000:
+        return f"{timeframe & 0x3FFF}h"
+    if 0 < timeframe <= 30:
+        return f"{timeframe}min"
+    raise ValueError(f"Unsupported timeframe {timeframe}")
+
+
+def _resample(bars: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """OHLC bars at the given frequency, labelled by their open, empty bars dropped."""
+    try:
+        bar_length = pd.Timedelta(rule)
+    except ValueError:
+        bar_length = None
+    if bar_length is not None and len(bars) > 1 and bars.index.to_series().diff().min() >= bar_length:
+        return bars
+
+    resampled = bars.resample(rule, label='left', closed='left')
+    aggregated = pd.DataFrame({
+        'open': resampled['open'].first(),
+        'high': resampled['high'].max(),
+        'low': resampled['low'].min(),
+        'close': resampled['close'].last()})
+    if 'tick_volume' in bars:
+        aggregated['tick_volume'] = resampled['tick_volume'].sum()
+    return aggregated.dropna(subset=['open'])
+
+
+def _to_seconds(value: datetime) -> int:
+    """Seconds since the epoch of a datetime, naive ones being UTC as in MetaTrader5."""
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp.value // 1_000_000_000
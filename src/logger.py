@@ -1,11 +1,36 @@
 import os
+import atexit
+import multiprocessing
 from datetime import datetime
 import logging
+from logging.handlers import QueueHandler, QueueListener
 
 
 class Logger:
-    
-    def __init__(self):
+    """
+    Logs to a daily file in output/ and to the console.
+
+    Records are put on a queue and written by a background listener thread, so logging calls
+    don't wait on file or console I/O. The queue is a multiprocessing one: worker processes
+    forward their records to it and the parent's listener writes them.
+    """
+
+    queue = None
+    listener = None
+
+    def __init__(self, filemode: str = 'w', queue: multiprocessing.Queue = None):
+        """
+        :param filemode: Mode the log file is opened with.
+        :param queue: Queue of a parent process to forward the records to, instead of writing them.
+        """
+        root = logging.getLogger()
+        root.setLevel(logging.DEBUG)
+
+        if queue is not None:
+            Logger.queue = queue
+            root.addHandler(QueueHandler(queue))
+            return
+
         output_path = os.path.join(os.getcwd(), "output")
         timestmp = datetime.now()
         filename_timestmp = os.path.join(output_path, f"Logger_{timestmp.strftime('%d%m%Y')}.log")
@@ -13,16 +38,29 @@ class Logger:
         if not os.path.exists(output_path):
             os.makedirs(output_path)
 
-        logging.basicConfig(
-            filename=filename_timestmp,
-            format='%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s',
-            datefmt='%d/%m/%Y %H:%M:%S',
-            filemode='w',
-            level=logging.DEBUG)
-        
+        file_handler = logging.FileHandler(filename_timestmp, mode=filemode)
+        file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s',
+            datefmt='%d/%m/%Y %H:%M:%S'))
+
         # Add console handler
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        logging.getLogger().addHandler(console_handler)
-        
+
+        Logger.queue = multiprocessing.Queue(-1)
+        Logger.listener = QueueListener(Logger.queue, file_handler, console_handler, respect_handler_level=True)
+        Logger.listener.start()
+        atexit.register(Logger.stop)
+
+        root.addHandler(QueueHandler(Logger.queue))
+
         logging.info("Logger initialized")
+
+    @staticmethod
+    def stop() -> None:
+        """Writes the queued records, stops the listener and closes the log file."""
+        if Logger.listener is not None:
+            Logger.listener.stop()
+            for handler in Logger.listener.handlers:
+                handler.close()
+            Logger.listener = None
@@ -1,16 +1,23 @@
 import os
 import logging
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from typing import Optional
-from src.mt5_api import MT5API
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+from src.mt5_api import MT5API, load_backend
+from src.bar_cache import BarCache
+from src.history_store import HistoryStore, to_utc_naive
 from src.configuration import Configuration
 from src.period import Period
+from src.tick_data import ticks_to_bars, iter_tick_file
+from src.utils import period_to_timedelta
 
 
 class MarketDataService:
     """Handles market data retrieval using either the MT5 API or local CSV files."""
 
+    STREAM_CHUNK_ROWS = 100_000
+
     def __init__(self, 
                  config: Configuration,
                  mt5_login: int = None,
@@ -24,6 +31,13 @@ class MarketDataService:
         """
         self.use_api = config.use_api
         self.time_series_filename = config.historical_data_filename
+        self.bar_cache = BarCache(config.bar_cache_dir) if config.use_bar_cache else None
+        self.history_store = HistoryStore(self.bar_cache) if self.bar_cache is not None else None
+
+        self.use_ticks = config.use_ticks
+        self.tick_data_filename = config.tick_data_filename
+        self.tick_chunk_size = config.tick_chunk_size
+        self.tick_price = config.tick_price
 
         self.mt5_login = mt5_login
         self.mt5_password = mt5_password
@@ -32,43 +46,93 @@ class MarketDataService:
         self.mt5_api = None
 
         if self.use_api:
-            if not all([self.mt5_login, self.mt5_password, self.mt5_server]):
+            if config.api_backend == 'metatrader5' and not all([self.mt5_login, self.mt5_password, self.mt5_server]):
                 msg = "Login, password, and server must all be provided in the config"
                 msg += " when using the MT5 API." 
                 logging.error(msg)
                 raise ValueError(msg)
 
             try:
-                self.mt5_api = MT5API(self.mt5_login, self.mt5_password, self.mt5_server)
-                logging.info("Successfully initialized MT5API.")
+                self.mt5_api = MT5API(
+                    self.mt5_login, 
+                    self.mt5_password, 
+                    self.mt5_server,
+                    self._create_backend(config),
+                    timedelta(days=config.api_chunk_days),
+                    config.api_retries,
+                    config.api_retry_delay)
+                logging.info(f"Successfully initialized MT5API with the {config.api_backend} backend.")
             except Exception as e:
                 logging.error(f"Failed to initialize MT5API: {e}")
                 raise
 
+    @staticmethod
+    def _create_backend(config: Configuration):
+        """The configured MT5 backend, the MetaTrader5 package or the local stand-in."""
+        if config.api_backend != 'local':
+            return load_backend(config.api_backend)
+
+        return load_backend(
+            'local',
+            data_dir=config.local_mt5_data_dir,
+            rates_filename=config.local_mt5_rates_filename,
+            tick_filename=config.local_mt5_tick_filename,
+            latency=config.local_mt5_latency_ms / 1000,
+            latency_jitter=config.local_mt5_latency_jitter_ms / 1000,
+            max_rows=config.local_mt5_max_rows,
+            failure_rate=config.local_mt5_failure_rate,
+            seed=config.local_mt5_seed)
+
+    @property
+    def single_series(self) -> bool:
+        """Whether every pair is read from the same csv or tick file, which holds a single series."""
+        if self.use_api and self.mt5_api:
+            return False
+        if self.use_ticks:
+            return '{symbol}' not in self.tick_data_filename
+        return True
+
     def load_market_data(
         self,
         fx_cross: str, 
         tick_interval: Period, 
         first_day: datetime, 
-        last_day: datetime
+        last_day: datetime,
+        columns: Optional[list] = None
     ) -> Optional[pd.DataFrame]:
         """
         Loads market data either from the MT5 module or a CSV file.
 
+        The CSV file is always loaded whole, whatever the requested dates, as the scan schedule
+        spans the days of the file.
+
         :param fx_cross: The currency pair symbol (e.g., "EURUSD").
         :param tick_interval: Period representing tick/time series frequency.
-        :param first_day: Start date for historical data.
-        :param last_day: End date for historical data.
+        :param first_day: Start date for historical data, used by the MT5 API.
+        :param last_day: End date for historical data, used by the MT5 API.
+        :param columns: Columns of the CSV bars to return, e.g. ['high', 'low'] when the other
+            prices are not exported. Only these are read from the bar cache. All by default.
         :return: A pandas DataFrame containing the historical data or None if an error occurs.
         """
         try:
+            if self.use_ticks:
+                return self._load_tick_bars(fx_cross, tick_interval, first_day, last_day)
+
             if self.use_api and self.mt5_api:
                 logging.info(f"Fetching market data from MT5 API for {fx_cross} from {first_day} to {last_day}.")
-                df = self.mt5_api.copy_rates_range(
-                    fx_cross, 
-                    tick_interval, 
-                    first_day, 
-                    last_day)
+                if self.history_store is not None:
+                    df = self.history_store.sync(
+                        self.mt5_api,
+                        fx_cross,
+                        tick_interval,
+                        first_day,
+                        last_day)
+                else:
+                    df = self.mt5_api.copy_rates_range(
+                        fx_cross, 
+                        tick_interval, 
+                        first_day, 
+                        last_day)
 
                 if df is not None:
                     logging.info("Market data successfully retrieved from MT5 API.")
@@ -79,22 +143,201 @@ class MarketDataService:
 
             else:
                 data_file = os.path.join('data', self.time_series_filename)
-                logging.info(f'Reading data from csv: {data_file}')
 
                 if not os.path.exists(data_file):
                     logging.error(f"CSV file {data_file} not found.")
                     return None
 
-                df = pd.read_csv(data_file, index_col="datetime")
-                df.index = pd.to_datetime(df.index)
+                # The csv holds a single series whatever the pair, so it is cached by file name
+                if self.bar_cache is not None:
+                    cache_key = os.path.splitext(self.time_series_filename)[0]
+                    source = BarCache.fingerprint(data_file)
 
-                logging.info("Market data successfully loaded from CSV.")
-                return df
+                    if self.bar_cache.is_valid(cache_key, source):
+                        logging.info(f'Reading data from bar cache: {cache_key}')
+                        return self.bar_cache.read(cache_key, columns=columns)
+
+                df = self._read_csv(data_file)
+
+                if self.bar_cache is not None:
+                    self.bar_cache.write(cache_key, df, source)
+
+                return df if columns is None else df[columns]
 
         except Exception as e:
             logging.error(f"Error loading market data: {e}")
             return None
 
+    def data_bounds(
+        self,
+        fx_cross: str,
+        tick_interval: Period,
+        first_day: datetime,
+        last_day: datetime
+    ) -> Optional[tuple]:
+        """
+        First and last bar timestamps that iter_session_bars can stream, without loading the bars.
+
+        With the MT5 API the stored history is first brought up to date. A csv file that is not
+        in the bar cache is read once, one chunk of timestamps at a time.
+
+        :return: Tuple of naive timestamps in the data timezone or None if there is no data.
+        """
+        source = self._stream_source(fx_cross, tick_interval, first_day, last_day)
+        if source is None:
+            return None
+
+        kind, location, start, end = source
+        if kind == 'cache':
+            return self.bar_cache.bounds(location, start, end)
+
+        bounds = None
+        for chunk in pd.read_csv(location, usecols=['datetime'], chunksize=self.STREAM_CHUNK_ROWS):
+            times = pd.to_datetime(chunk['datetime'])
+            if len(times):
+                first, last = times.min(), times.max()
+                bounds = (first, last) if bounds is None else (min(bounds[0], first), max(bounds[1], last))
+        return bounds
+
+    def iter_session_bars(
+        self,
+        fx_cross: str,
+        tick_interval: Period,
+        first_day: datetime,
+        last_day: datetime,
+        session_starts: pd.DatetimeIndex,
+        session_ends: pd.DatetimeIndex
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields the bars of one session at a time, so only about one session is held in memory.
+
+        Bars are read from the bar cache when the data is in it, otherwise the csv file is read
+        in chunks, which must then be in ascending time order.
+
+        :param session_starts: Naive session starts in the data timezone, ascending.
+        :param session_ends: Naive session ends in the data timezone, exclusive.
+        :return: Iterator of one DataFrame per session, possibly empty.
+        """
+        source = self._stream_source(fx_cross, tick_interval, first_day, last_day)
+        if source is None:
+            return
+
+        kind, location, start, end = source
+        if kind == 'cache':
+            for session_start, session_end in zip(session_starts, session_ends):
+                session_start = session_start if start is None else max(session_start, start)
+                session_end = session_end if end is None else min(session_end, end + pd.Timedelta(1, unit='ns'))
+                yield self.bar_cache.read(location, session_start, session_end - pd.Timedelta(1, unit='ns'))
+            return
+
+        chunks = pd.read_csv(location, index_col='datetime', chunksize=self.STREAM_CHUNK_ROWS)
+        buffer = None
+        exhausted = False
+        for session_start, session_end in zip(session_starts, session_ends):
+            # Read on until the buffer runs past the end of the session
+            while not exhausted and (buffer is None or len(buffer) == 0 or buffer.index[-1] < session_end):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+
+                chunk.index = pd.to_datetime(chunk.index)
+                if buffer is not None and len(buffer) and len(chunk) and chunk.index[0] < buffer.index[-1]:
+                    raise ValueError(f"{location} must be in ascending time order to be streamed")
+                buffer = chunk if buffer is None else pd.concat([buffer, chunk])
+
+            if buffer is None:
+                return
+
+            first, last = np.searchsorted(buffer.index.as_unit('ns').asi8, [session_start.value, session_end.value])
+            yield buffer.iloc[first:last]
+
+            # Bars before this session start can no longer be part of a later session
+            buffer = buffer.iloc[first:]
+
+    def _stream_source(
+        self,
+        fx_cross: str,
+        tick_interval: Period,
+        first_day: datetime,
+        last_day: datetime
+    ) -> Optional[tuple]:
+        """
+        Where bars are streamed from, as ('cache', entry name, start, end) or ('csv', path, None, None).
+        """
+        if self.use_ticks:
+            raise ValueError("Streaming is not supported for bars built from ticks")
+
+        if self.use_api and self.mt5_api:
+            if self.history_store is None:
+                raise ValueError("Streaming from the MT5 API requires the bar cache")
+
+            key = self.history_store.update(self.mt5_api, fx_cross, tick_interval, first_day, last_day)
+            if key is None:
+                return None
+            return 'cache', key, to_utc_naive(first_day), to_utc_naive(last_day)
+
+        data_file = os.path.join('data', self.time_series_filename)
+        if not os.path.exists(data_file):
+            logging.error(f"CSV file {data_file} not found.")
+            return None
+
+        if self.bar_cache is not None:
+            cache_key = os.path.splitext(self.time_series_filename)[0]
+            if self.bar_cache.is_valid(cache_key, BarCache.fingerprint(data_file)):
+                return 'cache', cache_key, None, None
+
+        return 'csv', data_file, None, None
+
+    def _load_tick_bars(
+        self,
+        fx_cross: str,
+        tick_interval: Period,
+        first_day: datetime,
+        last_day: datetime
+    ) -> Optional[pd.DataFrame]:
+        """
+        Aggregates ticks into bars of tick_interval, which can be shorter than a minute.
+
+        Ticks are streamed from the MT5 API, or from the tick file of the pair, in bounded chunks.
+        Bars aggregated from a file are kept in the bar cache until the file changes.
+        """
+        bar_length = period_to_timedelta(tick_interval)
+
+        if self.use_api and self.mt5_api:
+            logging.info(f"Aggregating ticks from MT5 API for {fx_cross} from {first_day} to {last_day}.")
+            return ticks_to_bars(self.mt5_api.iter_ticks_range(fx_cross, first_day, last_day), bar_length, self.tick_price)
+
+        data_file = os.path.join('data', self.tick_data_filename.format(symbol=fx_cross))
+        if not os.path.exists(data_file):
+            logging.error(f"Tick file {data_file} not found.")
+            return None
+
+        if self.bar_cache is not None:
+            cache_key = f"{os.path.splitext(os.path.basename(data_file))[0]}_{tick_interval}_{self.tick_price}"
+            source = BarCache.fingerprint(data_file)
+
+            if self.bar_cache.is_valid(cache_key, source):
+                logging.info(f'Reading tick bars from bar cache: {cache_key}')
+                return self.bar_cache.read(cache_key)
+
+        logging.info(f'Aggregating ticks from file: {data_file}')
+        df = ticks_to_bars(iter_tick_file(data_file, self.tick_chunk_size), bar_length, self.tick_price)
+
+        if df is not None and self.bar_cache is not None:
+            self.bar_cache.write(cache_key, df, source)
+
+        return df
+
+    def _read_csv(self, data_file: str) -> pd.DataFrame:
+        """Parses a csv file with a 'datetime' column into a DataFrame indexed by datetime."""
+        logging.info(f'Reading data from csv: {data_file}')
+        df = pd.read_csv(data_file, index_col="datetime")
+        df.index = pd.to_datetime(df.index)
+
+        logging.info("Market data successfully loaded from CSV.")
+        return df
+
     def close(self) -> None:
         """Closes the MT5 API connection if in use."""
         if self.use_api and self.mt5_api:
@@ -1,28 +1,68 @@
-import MetaTrader5 as mt5
+import time
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Iterator, Optional
 import logging
 from src.period import Period
+from src.utils import period_to_timedelta
+
+
+def load_backend(name: str = 'metatrader5', **options):
+    """
+    Data source backend exposing the MetaTrader5 module's interface.
+
+    The MetaTrader5 package is only imported when selected, as it only installs on Windows.
+
+    :param name: 'metatrader5' for the terminal, 'local' for the LocalMT5 stand-in serving local files.
+    :param options: Arguments of the LocalMT5 stand-in.
+    :raises ValueError: If the backend is unknown.
+    """
+    if name == 'metatrader5':
+        import MetaTrader5
+        return MetaTrader5
+    if name == 'local':
+        from src.local_mt5 import LocalMT5
+        return LocalMT5(**options)
+    raise ValueError(f"Unknown MT5 backend {name}, expected metatrader5 or local")
 
 
 class MT5API:
     """A wrapper for the MetaTrader 5 API with structured login and data retrieval methods."""
 
-    def __init__(self, login: int, password: str, server: str) -> None:
+    CHUNK_LENGTH = timedelta(days=180)
+    TICK_CHUNK_LENGTH = timedelta(days=1)
+
+    def __init__(self, 
+                 login: int, 
+                 password: str, 
+                 server: str, 
+                 backend=None, 
+                 chunk_length: timedelta = None,
+                 retries: int = 0,
+                 retry_delay: float = 1.0) -> None:
         """
         Initializes and logs into MetaTrader 5.
 
         :param login: Trading account login ID.
         :param password: Trading account password.
         :param server: Broker server name.
+        :param backend: Module or object with the MetaTrader5 interface, the MetaTrader5 package by default.
+        :param chunk_length: Date range of each rates request, CHUNK_LENGTH by default.
+        :param retries: Times a failed request is retried before giving up.
+        :param retry_delay: Seconds before the first retry, doubled at each further one.
         """
-        if not mt5.initialize():
+        self.mt5 = mt5 = backend if backend is not None else load_backend()
+        self.chunk_length = chunk_length or self.CHUNK_LENGTH
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+        if not self._request(mt5.initialize):
             msg = "Failed to initialize MetaTrader 5"
             logging.error(msg)
             raise ConnectionError(msg)
 
-        if not mt5.login(login=login, password=password, server=server):
+        if not self._request(mt5.login, login, password, server):
             error_code = mt5.last_error()
             mt5.shutdown()
 
@@ -41,48 +81,152 @@ class MT5API:
         """
         Retrieves historical rates for a symbol within a specified date range.
 
+        The chunks are written straight into one preallocated structured array, so the
+        full dataset is only copied once when it is wrapped in a DataFrame.
+
         :param symbol: Trading instrument (e.g., "EURUSD").
         :param timeframe: Timeframe constant from MT5 (e.g., mt5.TIMEFRAME_D1).
         :param start: Start datetime for historical data.
         :param end: End datetime for historical data.
-        :return: A DataFrame containing historical rates or None if an error occurs.
+        :return: A DataFrame containing historical rates in ascending time order or None if an error occurs.
+        """
+        buffer = None
+        n_rows = 0
+
+        try:
+            for rates in self.iter_rates_range(symbol, timeframe, start, end):
+                if buffer is None:
+                    buffer = np.empty(self._estimate_rows(timeframe, start, end), dtype=rates.dtype)
+
+                if n_rows + len(rates) > len(buffer):
+                    grown = np.empty(max(2 * len(buffer), n_rows + len(rates)), dtype=buffer.dtype)
+                    grown[:n_rows] = buffer[:n_rows]
+                    buffer = grown
+
+                buffer[n_rows:n_rows + len(rates)] = rates
+                n_rows += len(rates)
+
+        except ConnectionError:
+            return None
+
+        if buffer is None:
+            return None
+
+        rates = buffer[:n_rows]
+        full_df = pd.DataFrame({name: rates[name] for name in rates.dtype.names if name != "time"})
+        # Named like the index of the csv files and the bar cache, which the raw dump header shows
+        full_df.index = pd.DatetimeIndex(pd.to_datetime(rates["time"], unit="s"), name="datetime")
+        return full_df
+
+    def iter_rates_range(
+        self, symbol: str, 
+        timeframe: Period, 
+        start: datetime, 
+        end: datetime
+    ) -> Iterator[np.ndarray]:
+        """
+        Yields historical rates for a symbol chunk by chunk, as they are retrieved.
+
+        Chunks are MT5 structured arrays in ascending time order. Bars already yielded by a
+        previous chunk, which overlap at the chunk boundaries, are dropped.
+
+        :param symbol: Trading instrument (e.g., "EURUSD").
+        :param timeframe: Period representing the bar frequency.
+        :param start: Start datetime for historical data.
+        :param end: End datetime for historical data.
+        :raises ConnectionError: If a chunk cannot be retrieved.
         """
         mt5_timeframe = self._period_to_mt5_timeframe(timeframe)
 
         # There seems to be a max date range in the MT5 API. We subdivide the
         # date range in 6month intervals and make multiple calls instead of one large
         # call to handle this.
-        six_months = timedelta(days=180)  
         current_start = start
-        all_data = []
+        last_time = None
 
         while current_start < end:
-            current_end = min(current_start + six_months, end)
+            current_end = min(current_start + self.chunk_length, end)
 
             # Fetch data for the current range
-            rates = mt5.copy_rates_range(symbol, mt5_timeframe, current_start, current_end)
+            rates = self._request(self.mt5.copy_rates_range, symbol, mt5_timeframe, current_start, current_end)
 
             if rates is None:
                 msg = f"Warning: No data retrieved for {symbol} from "
-                msg += "{current_start} to {current_end}."
+                msg += f"{current_start} to {current_end}: {self.mt5.last_error()}."
                 logging.warning(msg)
-                return None
-            else:
-                df = pd.DataFrame(rates)
-                all_data.append(df)
+                raise ConnectionError(msg)
+
+            if last_time is not None:
+                rates = rates[rates["time"] > last_time]
+
+            if len(rates):
+                last_time = rates["time"][-1]
+                yield rates
             
             current_start = current_end
 
-        # Convert to DataFrame
-        full_df = pd.concat(all_data).drop_duplicates().reset_index(drop=True)
-        full_df.index = pd.to_datetime(full_df["time"], unit="s")
-        full_df.pop('time')
-        full_df.sort_index(ascending=False, inplace=True)
-        return full_df
+    def iter_ticks_range(
+        self, symbol: str,
+        start: datetime,
+        end: datetime
+    ) -> Iterator[tuple]:
+        """
+        Yields the bid and ask ticks of a symbol one day at a time, as they are retrieved.
+
+        Each chunk covers [chunk start, chunk end), so no tick is yielded twice.
+
+        :param symbol: Trading instrument (e.g., "EURUSD").
+        :param start: Start datetime for the ticks.
+        :param end: End datetime for the ticks.
+        :return: Iterator of (times, bid, ask) chunks, with the times as int64 nanoseconds.
+        :raises ConnectionError: If a chunk cannot be retrieved.
+        """
+        current_start = start
+
+        while current_start < end:
+            current_end = min(current_start + self.TICK_CHUNK_LENGTH, end)
+
+            ticks = self._request(self.mt5.copy_ticks_range, symbol, current_start, current_end, self.mt5.COPY_TICKS_INFO)
+
+            if ticks is None:
+                msg = f"Warning: No ticks retrieved for {symbol} from "
+                msg += f"{current_start} to {current_end}: {self.mt5.last_error()}."
+                logging.warning(msg)
+                raise ConnectionError(msg)
+
+            end_msc = int(pd.Timestamp(current_end).timestamp() * 1000)
+            ticks = ticks[ticks["time_msc"] < end_msc] if current_end < end else ticks
+
+            if len(ticks):
+                yield ticks["time_msc"].astype(np.int64) * 1_000_000, ticks["bid"], ticks["ask"]
+
+            current_start = current_end
+
+    def _request(self, request, *args):
+        """Calls an MT5 request, retrying with exponential backoff while it fails, returning None or False."""
+        result = request(*args)
+        for attempt in range(self.retries):
+            if result is not None and result is not False:
+                break
+            delay = self.retry_delay * 2 ** attempt
+            logging.debug(f"MT5 request failed with {self.mt5.last_error()}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            result = request(*args)
+        return result
+
+    def _estimate_rows(self, timeframe: Period, start: datetime, end: datetime) -> int:
+        """Upper estimate of the number of bars in a date range, used to preallocate."""
+        try:
+            bar_length = period_to_timedelta(timeframe)
+        except ValueError:
+            bar_length = timedelta(days=1)
+
+        n_chunks = int((end - start) / self.chunk_length) + 1
+        return int((end - start) / bar_length) + n_chunks
 
     def close(self) -> None:
         """Closes the connection to MetaTrader 5."""
-        mt5.shutdown()
+        self.mt5.shutdown()
         logging.debug("MT5 connection closed")
 
     def _period_to_mt5_timeframe(self, period: Period) -> int:
@@ -93,6 +237,7 @@ class MT5API:
         :return: Corresponding MT5 timeframe constant.
         :raises ValueError: If the period unit is unsupported.
         """
+        mt5 = self.mt5
         unit_mapping = {
             "min": {
                 1: mt5.TIMEFRAME_M1,
@@ -0,0 +1,214 @@
+import logging
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from src.configuration import Configuration
+from src.fx_time_interval_scanner import FxTimeIntervalScanner
+from src.market_data_service import MarketDataService
+from src.logger import Logger
+from src.instrumentation import instrumentation
+from src.results_store import ResultsStore
+from src.result_cache import ResultCache
+from src.projected_scan import ProjectedScan
+
+
+def create_scanner(cfg: Configuration,
+                   fx_rate: str,
+                   market_data_service: MarketDataService = None,
+                   ref_timezone: str = None,
+                   market_open_time: str = None,
+                   view_name: str = None,
+                   low_high_interval=None,
+                   spread: float = None,
+                   job_name: str = None,
+                   quiet: bool = False) -> FxTimeIntervalScanner:
+    """
+    Builds the scanner for one FX pair from the run configuration.
+
+    :param ref_timezone: Reference timezone of the view, the first configured one by default.
+    :param market_open_time: Market open time of the view, the first configured one by default.
+    :param view_name: Name prefixed to the exported files of the view, None when there is a single view.
+    :param low_high_interval: Window length, the configured one by default.
+    :param spread: Spread, the configured one by default.
+    :param job_name: Name of the batch job the scanner runs for, if any.
+    :param quiet: Whether the scanner logs its progress at debug level only.
+    """
+    return FxTimeIntervalScanner(
+        cfg.tick_interval,
+        fx_rate,
+        low_high_interval or cfg.low_high_interval,
+        cfg.historical_data_horizon,
+        cfg.historical_data_filename,
+        market_data_service,
+        cfg.spread if spread is None else spread,
+        cfg.market_data_timezone,
+        ref_timezone or cfg.ref_timezone,
+        market_open_time or cfg.market_open_time,
+        cfg.state_dir,
+        cfg.log_every_n_days,
+        cfg.holiday_calendars,
+        cfg.bootstrap_resamples,
+        cfg.confidence_level,
+        cfg.streaming,
+        ResultCache(cfg.result_cache_dir, cfg.result_cache_max_mb) if cfg.use_result_cache else None,
+        view_name,
+        cfg.walk_forward_lookback,
+        cfg.data_quality,
+        cfg.min_session_coverage,
+        job_name,
+        cfg.scan_workers,
+        quiet)
+
+
+def create_scanners(cfg: Configuration,
+                    fx_rate: str,
+                    market_data_service: MarketDataService = None,
+                    job_name: str = None) -> list:
+    """
+    Builds one scanner per configured reference timezone and market open time of an FX pair.
+
+    :param job_name: Name of the batch job, prefixed to the exported files of every view.
+    """
+    views = [(ref_timezone, market_open_time) for ref_timezone in cfg.ref_timezones for market_open_time in cfg.market_open_times]
+    return [
+        create_scanner(
+            cfg,
+            fx_rate,
+            market_data_service,
+            ref_timezone,
+            market_open_time,
+            '_'.join(filter(None, [job_name, f"{ref_timezone.replace('/', '-')}_{market_open_time}" if len(views) > 1 else None])) or None,
+            job_name=job_name)
+        for ref_timezone, market_open_time in views]
+
+
+def scan_pair(cfg: Configuration,
+              fx_rate: str,
+              market_data_service: MarketDataService = None,
+              fx_data_df: pd.DataFrame = None,
+              update: bool = False,
+              job_name: str = None) -> list:
+    """
+    Scans one FX pair for every configured view.
+
+    Full runs of several views scan the pair once and project the results into each view. Updates
+    and streamed runs scan the views one after the other.
+
+    :param fx_data_df: Bars already loaded, loaded from the market data service by default.
+    :param update: Update the saved scanner states instead of running full scans.
+    :param job_name: Name of the batch job, prefixed to the exported files.
+    :return: The scanners of the views, holding their results.
+    """
+    scanners = create_scanners(cfg, fx_rate, market_data_service, job_name)
+    streamed = cfg.streaming and fx_data_df is None
+
+    if len(scanners) > 1 and not update and not streamed:
+        ProjectedScan(scanners).run(fx_data_df)
+    else:
+        for scanner in scanners:
+            if update:
+                scanner.update_scanner(fx_data_df)
+            else:
+                scanner.run_scanner(fx_data_df)
+    return scanners
+
+
+def run_pairs_parallel(cfg: Configuration,
+                       market_data_service: MarketDataService,
+                       update: bool = False,
+                       results_store: ResultsStore = None) -> dict:
+    """
+    Scans all configured FX pairs with a pool of worker processes.
+
+    Market data is loaded one pair at a time on a single I/O thread, as the MT5 connection
+    belongs to this process, while the workers scan the pairs already loaded. At most two
+    pairs per worker are held in memory ahead of the scans.
+
+    :param cfg: Run configuration. cfg.workers sets the number of processes.
+    :param market_data_service: Service used to load the market data.
+    :param update: Update the saved scanner states instead of running full scans.
+    :param results_store: Store collecting the results of every pair, if any.
+    :return: Dictionary of the pairs that failed, mapped to their error.
+    """
+    failures = {}
+    in_flight = threading.BoundedSemaphore(2 * cfg.workers)
+    log_level = logging.getLogger().level
+    settings = (instrumentation.enabled, instrumentation.trace_memory, instrumentation.profile)
+
+    def load(scanner: FxTimeIntervalScanner) -> pd.DataFrame:
+        in_flight.acquire()
+        try:
+            return scanner.load_market_data()
+        except Exception:
+            in_flight.release()
+            raise
+
+    with ThreadPoolExecutor(max_workers=1) as io_pool, \
+            ProcessPoolExecutor(max_workers=cfg.workers, initializer=init_worker, initargs=(log_level, Logger.queue, settings)) as cpu_pool:
+
+        loads = {
+            fx_rate: io_pool.submit(load, create_scanner(cfg, fx_rate, market_data_service))
+            for fx_rate in cfg.fx_rates}
+
+        scans = {}
+        for fx_rate, load_future in loads.items():
+            try:
+                fx_data_df = load_future.result()
+            except Exception as err:
+                logging.error(f'Error loading market data for {fx_rate}: {err}')
+                failures[fx_rate] = err
+                continue
+
+            logging.info(f"Starting run for {fx_rate}")
+            scans[fx_rate] = cpu_pool.submit(scan_pair_task, cfg, fx_rate, fx_data_df, update)
+            scans[fx_rate].add_done_callback(lambda _: in_flight.release())
+
+        for fx_rate, scan_future in scans.items():
+            try:
+                records, results_df = scan_future.result()
+                instrumentation.records += records
+                if results_store is not None:
+                    results_store.add(results_df)
+                logging.info(f"Finished run for {fx_rate}")
+            except Exception as err:
+                logging.error(f'Error running {fx_rate}: {err}')
+                failures[fx_rate] = err
+
+    return failures
+
+
+def init_worker(log_level: int, log_queue, instrumentation_settings: tuple) -> None:
+    """Sets up logging and instrumentation in a worker process, forwarding records to the parent's log queue."""
+    # Forked workers inherit the parent's queue handler, spawned ones start without any
+    if not logging.getLogger().handlers:
+        if log_queue is not None:
+            Logger(queue=log_queue)
+        else:
+            Logger(filemode='a')
+    logging.getLogger().setLevel(log_level)
+    instrumentation.configure(*instrumentation_settings)
+
+
+def scan_pair_task(cfg: Configuration, fx_rate: str, fx_data_df: pd.DataFrame, update: bool, job_name: str = None) -> tuple:
+    """
+    Scans and exports one FX pair from already loaded market data, as a task of a worker process
+    set up by init_worker.
+
+    :param job_name: Name of the batch job, prefixed to the exported files and added to the results table.
+    :return: Tuple of the stage records and the results table of every view, None if not kept.
+    """
+    # Forked workers start with a copy of the parent's records
+    instrumentation.collect()
+
+    with instrumentation.profiled(fx_rate if job_name is None else f"{job_name}_{fx_rate}"):
+        scanners = scan_pair(cfg, fx_rate, fx_data_df=fx_data_df, update=update, job_name=job_name)
+        if cfg.output_format != 'parquet':
+            for scanner in scanners:
+                scanner.export_results(cfg.full_results)
+
+    results_df = None
+    if cfg.output_format != 'csv':
+        results_df = pd.concat([scanner.results_frame() for scanner in scanners], ignore_index=True)
+        if job_name is not None:
+            results_df.insert(0, 'job', job_name)
+    return instrumentation.collect(), results_df
@@ -0,0 +1,170 @@
+import os
+import logging
+import pandas as pd
+from src.market_data_service import MarketDataService
+from src.period import Period
+from src.utils import create_intra_day_time_grid, shift_date_by_period, period_to_timedelta
+from src.trading_calendar import get_calendar
+from src.bar_series import BarSeries
+from src.data_quality import assess_sessions
+from src.window_scan_engine import WindowScanEngine, WindowScanResult, SessionLayout, RangeExtremeIndex, count_hits
+
+
+class ParameterSweep:
+    """
+    Scans every combination of tick intervals, window lengths, spreads and market open times.
+
+    Market data is loaded once per tick interval. For each market open time the sessions are laid
+    out once and indexed with a sparse table, from which every window length is read off, and every
+    spread is applied to the same window extremes.
+    """
+
+    def __init__(self,
+                 fx_rate: str,
+                 historical_data_range: Period,
+                 market_data_service: MarketDataService,
+                 tick_intervals: list,
+                 high_low_intervals: list,
+                 spreads: list,
+                 market_open_times: list,
+                 market_data_timezone: str = None,
+                 ref_timezone: str = None,
+                 holiday_calendars: tuple = (),
+                 data_quality: bool = True,
+                 min_session_coverage: float = 0.0) -> None:
+        """
+        :param fx_rate: The currency pair symbol (e.g., "EURUSD").
+        :param historical_data_range: Period of history to scan.
+        :param market_data_service: Service used to load the market data.
+        :param tick_intervals: Periods between consecutive window starts.
+        :param high_low_intervals: Window lengths.
+        :param spreads: Tolerances applied to the daily high and low.
+        :param market_open_times: Session open times as hhmm strings in the market data timezone.
+        :param market_data_timezone: Timezone of the market data.
+        :param ref_timezone: Timezone in which the windows are expressed.
+        :param holiday_calendars: Names of the holiday calendars excluded from the trading days.
+        :param data_quality: Whether to leave the sessions covering less than min_session_coverage of
+            their bars out of the sweep, as the scanner does.
+        :param min_session_coverage: Share of its bars below which a session is left out.
+        """
+        self.fx_rate = fx_rate
+        self.historical_data_range = historical_data_range
+        self.market_data_service = market_data_service
+        self.tick_intervals = tick_intervals
+        self.high_low_intervals = high_low_intervals
+        self.spreads = spreads
+        self.market_open_times = market_open_times
+        self.timezone = market_data_timezone
+        self.ref_timezone = ref_timezone
+        self.calendar = get_calendar(tuple(holiday_calendars))
+        self.data_quality = data_quality
+        self.min_session_coverage = min_session_coverage
+
+        self.results_df = None
+
+        n_combinations = len(tick_intervals) * len(high_low_intervals) * len(spreads) * len(market_open_times)
+        logging.info(f"Configured parameter sweep for {fx_rate} over {n_combinations} combinations")
+
+    def run(self) -> pd.DataFrame:
+        """
+        Runs the sweep.
+
+        :return: Tidy DataFrame with one row per parameter combination and window.
+        """
+        results = []
+        for tick_interval in self.tick_intervals:
+            fx_data_df = self._load_market_data(tick_interval)
+            bars = BarSeries.from_frame(fx_data_df, fx_data_df.index.tz_localize(self.timezone))
+            del fx_data_df
+
+            # Shift by one day as first date is never full with TwelveData, kept as in
+            # FxTimeIntervalScanner.bars_schedule so the sweep scans the same sessions
+            first_day = pd.Timestamp(bars.times[0], tz='UTC').tz_convert(self.ref_timezone) + pd.Timedelta(days=1)
+            last_day = pd.Timestamp(bars.times[-1], tz='UTC').tz_convert(self.ref_timezone) + pd.Timedelta(days=1)
+            window_lengths = [period_to_timedelta(interval).value for interval in self.high_low_intervals]
+
+            for market_open_time in self.market_open_times:
+                historical_period, session_opens, _ = self.calendar.sessions(
+                    first_day,
+                    last_day,
+                    market_open_time,
+                    self.timezone,
+                    self.ref_timezone)
+                session_opens = session_opens.as_unit('ns').asi8
+                if self.data_quality:
+                    used = assess_sessions(bars, session_opens).mask(self.min_session_coverage)
+                    historical_period, session_opens = historical_period[used], session_opens[used]
+
+                layout = SessionLayout(
+                    bars.times,
+                    bars.highs,
+                    bars.lows,
+                    session_opens,
+                    [period_to_timedelta(tick_interval).value] + window_lengths,
+                    bars.decimals)
+                index = RangeExtremeIndex(layout, layout.window_slots([0], max(window_lengths))[1])
+
+                for high_low_interval in self.high_low_intervals:
+                    logging.info(f"Sweeping {self.fx_rate}: {tick_interval} tick interval, "
+                                 f"{high_low_interval} windows, market open {market_open_time}")
+
+                    grid = create_intra_day_time_grid(
+                        last_day,
+                        market_open_time,
+                        self.timezone,
+                        self.ref_timezone,
+                        tick_interval,
+                        high_low_interval)
+
+                    engine = WindowScanEngine(tick_interval, high_low_interval)
+                    grid = engine.extend_grid(session_opens, self.ref_timezone, grid)
+                    extremes = engine.scan_layout(index)
+                    grid_idx = engine.map_to_grid(session_opens, self.ref_timezone, grid)
+
+                    for spread in self.spreads:
+                        scan = WindowScanResult(
+                            session_opens,
+                            extremes.window_high,
+                            extremes.window_low,
+                            layout.daily_high - spread,
+                            layout.daily_low + spread)
+
+                        result_df = pd.DataFrame({
+                            'tick_interval': str(tick_interval),
+                            'low_high_interval': str(high_low_interval),
+                            'spread': spread,
+                            'market_open_time': market_open_time,
+                            'window': grid,
+                            'high_count': count_hits(scan.high_hits, grid_idx, len(grid)),
+                            'low_count': count_hits(scan.low_hits, grid_idx, len(grid)),
+                            'low_or_high_count': count_hits(scan.low_or_high_hits, grid_idx, len(grid))})
+
+                        for counter in ('high', 'low', 'low_or_high'):
+                            result_df[counter + '_probability'] = result_df[counter + '_count'] / len(historical_period)
+                        results.append(result_df)
+
+        self.results_df = pd.concat(results, ignore_index=True)
+        return self.results_df
+
+    def export_results(self) -> None:
+        if not os.path.exists('output'):
+            os.makedirs('output')
+
+        logging.info(f"Exporting parameter sweep to csv")
+        self.results_df.to_csv(os.path.join('output', self.fx_rate + '_parameter_sweep.csv'), index=False)
+
+    def _load_market_data(self, tick_interval: Period) -> pd.DataFrame:
+        # Define full date range for when using API
+        last_day = pd.Timestamp.today(tz=self.ref_timezone) - pd.Timedelta(days=1)
+        first_day = shift_date_by_period(self.historical_data_range, last_day, "-")
+
+        fx_data_df = self.market_data_service.load_market_data(
+            self.fx_rate,
+            tick_interval,
+            first_day.to_pydatetime(),
+            last_day.to_pydatetime(),
+            ['high', 'low'])
+
+        if fx_data_df is None:
+            raise ValueError(f"No market data available for {self.fx_rate}")
+        return fx_data_df
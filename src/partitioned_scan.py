@@ -0,0 +1,124 @@
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from src.bar_series import BarSeries
+from src.scanner_state import ScannerState
+from src.window_scan_engine import WindowScanEngine, DAY_NS
+
+
+# Fewest sessions per partition, below which starting a process costs more than it saves
+MIN_PARTITION_DAYS = 20
+
+
+class SharedBars:
+    """
+    Arrays of a BarSeries copied once into shared memory blocks, which worker processes map
+    without copying them. The blocks are unlinked when the context exits.
+    """
+
+    def __init__(self, bars: BarSeries) -> None:
+        self.blocks = []
+        self.arrays = []
+        self.decimals = bars.decimals
+
+        try:
+            for values in (bars.times, bars.highs, bars.lows):
+                block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(values.shape, values.dtype, buffer=block.buf)[:] = values
+                self.arrays.append((block.name, values.shape, values.dtype.str))
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def spec(self) -> tuple:
+        """Picklable description of the blocks, from which attach_bars maps the bars."""
+        return tuple(self.arrays), self.decimals
+
+    def close(self) -> None:
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self) -> 'SharedBars':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def attach_bars(spec: tuple) -> tuple:
+    """
+    Maps the bars described by a SharedBars spec.
+
+    :return: Tuple of the BarSeries viewing the blocks and the blocks, to close once the views are released.
+    """
+    arrays, decimals = spec
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in arrays]
+    views = [np.ndarray(shape, dtype, buffer=block.buf) for block, (_, shape, dtype) in zip(blocks, arrays)]
+    return BarSeries(*views, decimals), blocks
+
+
+def partition_count(n_days: int, workers: int) -> int:
+    """
+    Partitions to split n_days sessions into for `workers` processes, 1 to scan them in this process.
+
+    Worker processes of a pool, e.g. those scanning pairs in parallel, always scan in process.
+    """
+    if workers <= 1 or multiprocessing.parent_process() is not None:
+        return 1
+    return max(1, min(workers, n_days // MIN_PARTITION_DAYS))
+
+
+def scan_partitions(bars: BarSeries,
+                    day_opens: np.ndarray,
+                    dates: np.ndarray,
+                    windows: list,
+                    engine_params: tuple,
+                    ref_timezone: str,
+                    n_partitions: int) -> ScannerState:
+    """
+    Scans the sessions in contiguous partitions of days on a pool of processes.
+
+    The bars are placed in shared memory once, and each worker lays out and scans only the bars
+    of its partition's sessions. As every day's hits depend on its own session alone, the per-day
+    states of the partitions joined in day order, and the counters summed over them, are those
+    of a scan of all the sessions at once.
+
+    :param bars: Bars of the sessions.
+    :param day_opens: Sorted session opens as int64 UTC nanoseconds.
+    :param dates: Session dates aligned with the opens.
+    :param windows: Intra-day grid the hits are mapped onto.
+    :param engine_params: (tick_interval, high_low_interval, spread) of the WindowScanEngine.
+    :param ref_timezone: Reference timezone of the grid.
+    :param n_partitions: Number of partitions and processes.
+    :return: ScannerState of all the sessions.
+    """
+    partitions = np.array_split(np.arange(len(day_opens)), n_partitions)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+
+    with SharedBars(bars) as shared, ProcessPoolExecutor(max_workers=n_partitions) as pool:
+        futures = [
+            pool.submit(_scan_partition, shared.spec, engine_params, ref_timezone, windows, day_opens[days], dates[days])
+            for days in partitions if len(days)]
+        states = [future.result() for future in futures]
+
+    return ScannerState.concatenate(states, int(bars.times[-1]) if len(bars) else 0, windows)
+
+
+def _scan_partition(spec: tuple, engine_params: tuple, ref_timezone: str, windows: list, day_opens: np.ndarray, dates: np.ndarray) -> ScannerState:
+    """Scans the sessions of one partition from the shared bars, in a worker process."""
+    bars, blocks = attach_bars(spec)
+    try:
+        engine = WindowScanEngine(*engine_params)
+        scan = engine.scan_bars(bars.between(day_opens[0], day_opens[-1] + DAY_NS), day_opens)
+        grid_idx = engine.map_to_grid(scan.day_opens, ref_timezone, windows)
+        return ScannerState.from_scan(scan, grid_idx, windows, dates, 0)
+    finally:
+        # The views must be released before the blocks are closed
+        del bars
+        for block in blocks:
+            block.close()
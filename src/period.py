@@ -1,5 +1,4 @@
-import pandas as pd
-from src.utils import split_tenor_string
+import re
 
 
 class Period:
@@ -12,10 +11,17 @@ class Period:
     def _check_frequency(self, tenor: str):
         if tenor == "m":
             raise ValueError("Superfluous 'm' tenor. Use min for minutes or M for month.")
-        elif tenor not in ("min", "b", "d", "W", "M", "Q", "SA", "Y", "D", "B"):
+        elif tenor not in ("s", "min", "b", "d", "W", "M", "Q", "SA", "Y", "D", "B"):
             raise ValueError("tenor not recognized")
         
         return tenor
 
     def __str__(self):
         return str(self.units) + self.tenor
+
+
+def split_tenor_string(entry):
+    regex = re.compile(r"^(?P<numbers>\d*)(?P<letters>\w*)$")
+    (numbers, letters) = regex.search(entry).groups()
+    numbers = 1 if numbers == "" else numbers
+    return (int(numbers), letters or None)
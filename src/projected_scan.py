@@ -0,0 +1,80 @@
+import logging
+import numpy as np
+import pandas as pd
+from src.window_scan_engine import BarTimeline
+from src.utils import period_to_timedelta
+from src.instrumentation import instrumentation
+
+
+class ProjectedScan:
+    """
+    Scans one FX pair once for several views, each a scanner with its own reference timezone and
+    market open time.
+
+    The bars are loaded, compacted and laid out on a single UTC BarTimeline shared by the session
+    schedules of every view. Each view then only reads its window and session extremes off the
+    timeline and maps them onto its own intra-day grid, in which the windows of sessions falling
+    on other wall-clock times across DST changes are added. N views cost one load and one layout
+    instead of N.
+    """
+
+    def __init__(self, scanners: list) -> None:
+        """
+        :param scanners: Scanners of the same pair and market data, one per view.
+        """
+        if not scanners:
+            raise ValueError("At least one scanner is required")
+        if len({(scanner.fx_rate, scanner.timezone) for scanner in scanners}) > 1:
+            raise ValueError("Projected scanners must share the FX pair and market data timezone")
+
+        self.scanners = scanners
+        self.fx_rate = scanners[0].fx_rate
+
+    def run(self, fx_data_df: pd.DataFrame = None) -> None:
+        """
+        Runs every view's scanner from one load of the market data, saving the state of each
+        scanner that has a state directory.
+
+        :param fx_data_df: Bars already loaded, by default those of the first scanner's range.
+        """
+        if fx_data_df is None:
+            fx_data_df = self.scanners[0].load_market_data()
+
+        bars = self.scanners[0].compact_bars(fx_data_df)
+        del fx_data_df
+
+        views = []
+        for scanner in self.scanners:
+            historical_period, session_opens, overlapping_intra_day_grid = scanner.bars_schedule(bars)
+            key, state = scanner.cache_lookup(bars, historical_period, overlapping_intra_day_grid)
+            views.append((scanner, historical_period, session_opens, overlapping_intra_day_grid, key, state))
+
+        # Only the sessions of the views missing from the result cache are laid out
+        missing = [view for view in views if view[5] is None]
+        timeline = None
+        if missing:
+            with instrumentation.stage(self.fx_rate, 'bar_timeline', len(bars)):
+                timeline = self._timeline(bars, missing)
+                logging.info(f"Laid out {len(bars)} {self.fx_rate} bars for {len(missing)} views on "
+                             f"{timeline.n_slots} slots of {pd.Timedelta(timeline.resolution)}")
+
+        for scanner, historical_period, session_opens, overlapping_intra_day_grid, key, state in views:
+            if state is None:
+                logging.info(f"Projecting {self.fx_rate} onto {scanner.ref_timezone} with the market open at {scanner.market_open_time}")
+                state = scanner.scan_sessions(bars, historical_period, session_opens, overlapping_intra_day_grid, timeline)
+                if key is not None:
+                    scanner.result_cache.put(key, state)
+
+            scanner.set_results(state, len(historical_period))
+            if scanner.state_dir is not None:
+                state.save(scanner.state_path())
+
+    @staticmethod
+    def _timeline(bars, views: list) -> BarTimeline:
+        """BarTimeline supporting the sessions, tick intervals and window lengths of the given views."""
+        day_opens = np.concatenate([view[2].as_unit('ns').asi8 for view in views])
+        lengths = set()
+        for scanner, *_ in views:
+            lengths.add(period_to_timedelta(scanner.tick_interval).value)
+            lengths.add(period_to_timedelta(scanner.high_low_interval).value)
+        return BarTimeline(bars.times, bars.highs, bars.lows, day_opens, sorted(lengths), bars.decimals)
@@ -0,0 +1,135 @@
+import os
+import json
+import glob
+import hashlib
+import logging
+import pandas as pd
+from typing import Optional
+from src.bar_series import BarSeries
+from src.scanner_state import ScannerState
+
+
+RESULT_CACHE_DIR = os.path.join('output', 'result_cache')
+
+# Bump when the scan or the saved state changes, so entries of older versions are never hit
+CACHE_VERSION = 1
+
+
+class ResultCache:
+    """
+    Content-addressed cache of scan results.
+
+    Entries are saved ScannerStates named by a hash of the bars scanned and the scan parameters,
+    so an unchanged pair and configuration is answered from disk without scanning. Entries are
+    written atomically and evicted least recently used first once the cache exceeds its size.
+    """
+
+    def __init__(self, cache_dir: str = RESULT_CACHE_DIR, max_mb: float = 512) -> None:
+        """
+        :param cache_dir: Directory of the entries. Created on first write.
+        :param max_mb: Size of the cache in MB above which entries are evicted.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 2 ** 20)
+
+    @staticmethod
+    def key(bars: BarSeries, **params) -> str:
+        """Hash of the bars and the scan parameters."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps(
+            {'version': CACHE_VERSION, 'decimals': bars.decimals, 'dtype': str(bars.highs.dtype),
+             **{name: str(value) for name, value in params.items()}},
+            sort_keys=True).encode())
+        for values in (bars.times, bars.highs, bars.lows):
+            digest.update(values.data if values.flags.c_contiguous else values.tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def frame_key(df: pd.DataFrame, **params) -> str:
+        """Hash of every column and the index of a DataFrame, and of the given parameters."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps(
+            {'version': CACHE_VERSION, 'columns': [str(column) for column in df.columns],
+             **{name: str(value) for name, value in params.items()}},
+            sort_keys=True).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def get(self, key: str) -> Optional[ScannerState]:
+        """Returns the state cached under key and marks it as recently used, None if there is none."""
+        path = self.path(key)
+        try:
+            state = ScannerState.load(path)
+            if state is not None:
+                os.utime(path)
+        except Exception as err:
+            logging.warning(f"Ignoring unreadable result cache entry {path}: {err}")
+            return None
+        return state
+
+    def put(self, key: str, state: ScannerState) -> None:
+        """Stores a state under key, then evicts the least recently used entries over the size limit."""
+        path = self.path(key)
+        temp_path = f"{path[:-len('.npz')]}.{os.getpid()}.tmp.npz"
+        state.save(temp_path)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                logging.debug(f"Evicted result cache entry {path}")
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        paths = self._entries()
+        for path in paths + glob.glob(os.path.join(self.cache_dir, 'exports', '*.json')):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        logging.info(f"Cleared {len(paths)} entries from the result cache in {self.cache_dir}")
+
+    def export_is_current(self, path: str, key: str) -> bool:
+        """Whether the file at path is still the one exported from the data hashed to key."""
+        record_path = self._export_record_path(path)
+        if not os.path.exists(path) or not os.path.exists(record_path):
+            return False
+
+        stat = os.stat(path)
+        with open(record_path) as f:
+            record = json.load(f)
+        return record == {'key': key, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def mark_exported(self, path: str, key: str) -> None:
+        """Records that the file at path was exported from the data hashed to key."""
+        os.makedirs(os.path.join(self.cache_dir, 'exports'), exist_ok=True)
+        stat = os.stat(path)
+        with open(self._export_record_path(path), 'w') as f:
+            json.dump({'key': key, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}, f)
+
+    def _export_record_path(self, path: str) -> str:
+        name = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, 'exports', name + '.json')
+
+    def _entries(self) -> list:
+        """Paths of the entries, without the files still being written."""
+        return [path for path in glob.glob(os.path.join(self.cache_dir, '*.npz')) if not path.endswith('.tmp.npz')]
@@ -0,0 +1,80 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+
+RESULTS_DIR = os.path.join('output', 'results')
+
+
+class ResultsStore:
+    """
+    Collects the window counters of every pair of a run into one tidy table, written as a single
+    Parquet file per run.
+
+    Windows are stored as integer start and end minutes of the day in the reference timezone,
+    next to the pair, the scan parameters and the run id, so the files of all runs in the results
+    directory read back as one dataset with pd.read_parquet. Writing it requires pyarrow, which the
+    configuration checks for when the Parquet output is enabled.
+    """
+
+    def __init__(self, output_path: str = RESULTS_DIR, run_id: str = None) -> None:
+        """
+        :param output_path: Directory of the results dataset.
+        :param run_id: Identifier of the run, its start time by default.
+        """
+        self.output_path = output_path
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.frames = []
+
+    def add(self, results_df: pd.DataFrame) -> None:
+        """Adds the results of one pair, as built by FxTimeIntervalScanner.results_frame."""
+        if results_df is not None and len(results_df):
+            self.frames.append(results_df)
+
+    def write(self) -> str:
+        """
+        Writes the collected results.
+
+        :return: Path of the file written, None if there were no results.
+        """
+        if not self.frames:
+            return None
+
+        if not os.path.exists(self.output_path):
+            os.makedirs(self.output_path)
+
+        results_df = pd.concat(self.frames, ignore_index=True)
+        results_df.insert(0, 'run_id', self.run_id)
+
+        # Pair and parameter columns repeat on every window
+        for column in results_df.columns[results_df.dtypes == object]:
+            results_df[column] = results_df[column].astype('category')
+
+        path = os.path.join(self.output_path, f"results_{self.run_id}.parquet")
+        results_df.to_parquet(path, index=False)
+
+        logging.info(f"Results of {results_df['pair'].nunique()} pairs written to {path}")
+        return path
+
+
+def dense_rank(counts: np.ndarray) -> np.ndarray:
+    """Rank of each count among the distinct counts, 1 for the highest."""
+    distinct, inverse = np.unique(counts, return_inverse=True)
+    return len(distinct) - inverse
+
+
+def top_k_mask(counts: np.ndarray, k: int = 3) -> np.ndarray:
+    """
+    Flags the windows with the k highest distinct counts, stopping at the first count by which
+    at least k windows are flagged.
+    """
+    counts = np.asarray(counts)
+    if len(counts) == 0:
+        return np.zeros(0, dtype=bool)
+
+    distinct, occurrences = np.unique(counts, return_counts=True)
+    distinct, occurrences = distinct[::-1], occurrences[::-1]
+    last = min(np.searchsorted(np.cumsum(occurrences), k), k - 1, len(distinct) - 1)
+    return counts >= distinct[last]
@@ -0,0 +1,419 @@
+import copy
+import json
+import time
+import asyncio
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from src.configuration import Configuration
+from src.market_data_service import MarketDataService
+from src.parallel_runner import create_scanner
+from src.window_scan_engine import BarTimeline, DAY_NS
+from src.result_cache import ResultCache
+from src.instrumentation import instrumentation
+from src.utils import period_to_timedelta
+from src.period import Period
+
+
+COUNTERS = ('high', 'low', 'low_or_high')
+
+# Largest request head read from a client, requests are query strings only
+MAX_REQUEST_BYTES = 64 * 1024
+
+STATUS_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class ResidentPair:
+    """
+    Bars of one FX pair held in memory, laid out once on a BarTimeline at midnight UTC day
+    boundaries so that the sessions of any market open time and reference timezone are read
+    off it without touching the bars again.
+    """
+
+    def __init__(self, fx_rate: str, bars, tick_interval: Period) -> None:
+        """
+        :param fx_rate: FX pair of the bars.
+        :param bars: BarSeries of the pair's historical data range.
+        :param tick_interval: Tick interval the bars were loaded at.
+        """
+        self.fx_rate = fx_rate
+        self.bars = bars
+        self.digest = ResultCache.key(bars)
+        self.loaded_at = pd.Timestamp.now(tz='UTC')
+
+        # Sessions open at most a day after the last bar, as the schedule is shifted by one day
+        first_midnight = int(bars.times[0]) // DAY_NS * DAY_NS - DAY_NS
+        last_midnight = int(bars.times[-1]) // DAY_NS * DAY_NS + 2 * DAY_NS
+
+        # Slots as fine as the bars, so windows of any multiple of the bar length are served
+        steps = np.diff(bars.times)
+        steps = steps[steps > 0]
+        bar_ns = int(np.median(steps)) if len(steps) else DAY_NS
+        self.timeline = BarTimeline(
+            bars.times,
+            bars.highs,
+            bars.lows,
+            np.arange(first_midnight, last_midnight + 1, DAY_NS, dtype=np.int64),
+            [period_to_timedelta(tick_interval).value, bar_ns, DAY_NS],
+            bars.decimals)
+
+    def supports(self, day_opens: np.ndarray, lengths_ns: list) -> bool:
+        """Whether the timeline holds the sessions and its slots divide the window lengths."""
+        timeline = self.timeline
+        offsets = day_opens - timeline.origin
+        return (not any(length % timeline.resolution for length in lengths_ns)
+                and not np.any(offsets % timeline.resolution)
+                and not np.any(offsets < 0)
+                and not np.any(offsets + DAY_NS > timeline.n_slots * timeline.resolution))
+
+    def describe(self) -> dict:
+        return {
+            'bars': len(self.bars),
+            'first_bar': str(pd.Timestamp(self.bars.times[0], tz='UTC')),
+            'last_bar': str(pd.Timestamp(self.bars.times[-1], tz='UTC')),
+            'loaded_at': str(self.loaded_at),
+            'timeline_slots': int(self.timeline.n_slots),
+            'timeline_resolution': str(pd.Timedelta(self.timeline.resolution))}
+
+
+class ScanService:
+    """
+    Long-running local service answering scan queries from bars kept in memory.
+
+    The bars of every pair are loaded once, compacted and laid out on a BarTimeline, from which a
+    query (pair, window length, spread, market open time, reference timezone and date range) only
+    reads the window and session extremes of its sessions. Queries run on a pool of threads, as
+    the resident data is shared and numpy releases the GIL over the reductions, and identical
+    queries on unchanged data are answered from a bounded cache. The data is reloaded in the
+    background every refresh_minutes, and swapped in once laid out so queries never wait on it.
+
+    Queries are served as JSON over HTTP/1.1 on a TCP port or a Unix socket:
+
+        GET /scan?pair=EURUSD&low_high_interval=60min&spread=0.0003&market_open_time=0900
+                 &ref_timezone=Europe/London&start=2024-03-01&end=2024-06-30&top_k=3&full=false
+        GET /pairs
+        POST /refresh
+    """
+
+    def __init__(self,
+                 cfg: Configuration,
+                 market_data_service: MarketDataService,
+                 workers: int = 4,
+                 refresh_minutes: float = 15.0,
+                 cache_size: int = 256) -> None:
+        """
+        :param cfg: Run configuration supplying the defaults of every query parameter. Result
+            caching, saved states, streaming, bootstrap intervals and walk-forward statistics are
+            turned off on a copy of it, queries are answered from memory.
+        :param market_data_service: Source of the bars.
+        :param workers: Threads answering queries concurrently.
+        :param refresh_minutes: Minutes between background reloads of the resident pairs, 0 to never reload.
+        :param cache_size: Responses kept for repeated queries.
+        """
+        cfg = copy.copy(cfg)
+        cfg.use_result_cache = False
+        cfg.state_dir = None
+        cfg.streaming = False
+        cfg.bootstrap_resamples = 0
+        cfg.walk_forward_lookback = None
+        cfg.scan_workers = 1
+
+        self.cfg = cfg
+        self.market_data_service = market_data_service
+        self.refresh_minutes = refresh_minutes
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(max(1, workers), thread_name_prefix='scan')
+
+        self.pairs = {}
+        self.responses = OrderedDict()
+        self.schedules = OrderedDict()
+        # The market data backends are not thread safe, loads are made one at a time
+        self._load_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+
+    def resident(self, fx_rate: str) -> ResidentPair:
+        """Resident data of a pair, loaded on its first query."""
+        pair = self.pairs.get(fx_rate)
+        if pair is None:
+            with self._load_lock:
+                pair = self.pairs.get(fx_rate)
+                if pair is None:
+                    pair = self._load(fx_rate)
+                    self.pairs[fx_rate] = pair
+        return pair
+
+    def refresh(self) -> None:
+        """Reloads every resident pair, keeping the current data of a pair whose reload fails."""
+        for fx_rate in list(self.pairs):
+            try:
+
+                with self._load_lock:
+                    pair = self._load(fx_rate)
+                if pair.digest != self.pairs[fx_rate].digest:
+                    self.pairs[fx_rate] = pair
+
+            except Exception as err:
+                logging.error(f'Error refreshing {fx_rate}: {err}')
+
+    def _load(self, fx_rate: str) -> ResidentPair:
+        scanner = create_scanner(self.cfg, fx_rate, self.market_data_service, quiet=True)
+        start = time.perf_counter()
+        bars = scanner.compact_bars(scanner.load_market_data(['high', 'low']), export_raw=False)
+        if len(bars) == 0:
+            raise ValueError(f"No market data available for {fx_rate}")
+
+        pair = ResidentPair(fx_rate, bars, self.cfg.tick_interval)
+        logging.info(f"Loaded {len(bars)} {fx_rate} bars in {time.perf_counter() - start:.2f}s, laid out on "
+                     f"{pair.timeline.n_slots} slots of {pd.Timedelta(pair.timeline.resolution)}")
+        return pair
+
+    def query(self, params: dict) -> dict:
+        """
+        Scans the resident bars of a pair with the given parameters, the configured ones by default.
+
+        :param params: Query parameters as strings: pair (required), low_high_interval, spread,
+            market_open_time, ref_timezone, start and end dates, top_k and full.
+        :return: Days scanned and the top windows of every counter, with every window if full.
+        :raises ValueError: If a parameter is invalid or no session falls within the date range.
+        """
+        query = parse_query(params, self.cfg)
+        if self.market_data_service.single_series and query['pair'] not in [fx_rate.upper() for fx_rate in self.cfg.fx_rates]:
+            # A csv or single tick file holds one series, which would be answered for any pair
+            raise ValueError(f"{query['pair']} is not one of the configured pairs ({', '.join(self.cfg.fx_rates)}) served from the data file")
+        pair = self.resident(query['pair'])
+
+        cache_key = (pair.digest,) + tuple(sorted(query.items()))
+        response = self._cached(self.responses, cache_key)
+        if response is None:
+            response = self._remember(self.responses, cache_key, self._scan(pair, query))
+        return response
+
+    def _cached(self, cache: OrderedDict, key: tuple):
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _remember(self, cache: OrderedDict, key: tuple, value):
+        with self._cache_lock:
+            cache[key] = value
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return value
+
+    def _scan(self, pair: ResidentPair, query: dict) -> dict:
+        scanner = create_scanner(
+            self.cfg,
+            query['pair'],
+            self.market_data_service,
+            query['ref_timezone'],
+            query['market_open_time'],
+            low_high_interval=Period(query['low_high_interval']),
+            spread=query['spread'],
+            quiet=True)
+
+        # Queries differing only in spread or date range share the schedule and its quality check
+        schedule_key = (pair.digest, query['ref_timezone'], query['market_open_time'], query['low_high_interval'])
+        schedule = self._cached(self.schedules, schedule_key)
+        if schedule is None:
+            schedule = self._remember(self.schedules, schedule_key, scanner.bars_schedule(pair.bars))
+        historical_period, session_opens, overlapping_intra_day_grid = schedule
+
+        dates = pd.DatetimeIndex(historical_period).date
+        selected = np.ones(len(dates), dtype=bool)
+        if query['start'] is not None:
+            selected &= dates >= query['start']
+        if query['end'] is not None:
+            selected &= dates <= query['end']
+        if not selected.any():
+            raise ValueError(f"No {query['pair']} sessions between {query['start']} and {query['end']}")
+        historical_period, session_opens = historical_period[selected], session_opens[selected]
+
+        # Windows that are not a whole number of timeline slots are scanned from the bars
+        day_opens = session_opens.as_unit('ns').asi8
+        lengths = [period_to_timedelta(scanner.tick_interval).value, period_to_timedelta(scanner.high_low_interval).value]
+        timeline = pair.timeline if pair.supports(day_opens, lengths) else None
+
+        state = scanner.scan_sessions(pair.bars, historical_period, session_opens, overlapping_intra_day_grid, timeline)
+        scanner.set_results(state, len(historical_period))
+        return scan_response(scanner, query, pair, dates[selected])
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, socket_path: str = None) -> None:
+        """
+        Loads the configured pairs and serves queries until cancelled.
+
+        :param socket_path: Unix socket to listen on instead of the TCP host and port.
+        """
+        # Stage records would pile up with every query of a resident service
+        instrumentation.configure(False)
+
+        loop = asyncio.get_running_loop()
+        for fx_rate in self.cfg.fx_rates:
+            try:
+                await loop.run_in_executor(self.executor, self.resident, fx_rate)
+            except Exception as err:
+                logging.error(f'Error loading {fx_rate}: {err}')
+
+        if socket_path:
+            server = await asyncio.start_unix_server(self._handle, socket_path, limit=MAX_REQUEST_BYTES)
+            logging.info(f"Scan service listening on {socket_path}")
+        else:
+            server = await asyncio.start_server(self._handle, host, port, limit=MAX_REQUEST_BYTES)
+            logging.info(f"Scan service listening on http://{host}:{port}")
+
+        refresher = asyncio.create_task(self._refresh_periodically()) if self.refresh_minutes > 0 else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _refresh_periodically(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.refresh_minutes * 60)
+            await loop.run_in_executor(self.executor, self.refresh)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves the requests of one connection, kept alive until the client closes it."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                headers = dict(line.lower().split(':', 1) for line in header_lines if ':' in line)
+                content_length = int(headers.get('content-length', 0) or 0)
+                if content_length:
+                    await reader.readexactly(content_length)
+
+                method, target, version = (request_line.split(' ') + ['', ''])[:3]
+                status, body = await self._dispatch(method, target)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').strip().lower() != 'close'
+
+                payload = json.dumps(body).encode()
+                writer.write((f"HTTP/1.1 {status} {STATUS_REASONS[status]}\r\n"
+                              f"Content-Type: application/json\r\n"
+                              f"Content-Length: {len(payload)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str) -> tuple:
+        """Answers one request, as its status and JSON body."""
+        url = urlsplit(target)
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+
+            if url.path == '/scan' and method == 'GET':
+                body = await loop.run_in_executor(self.executor, self.query, dict(parse_qsl(url.query)))
+                body = dict(body, elapsed_ms=round((time.perf_counter() - start) * 1000, 3))
+            elif url.path == '/pairs' and method == 'GET':
+                body = {fx_rate: pair.describe() for fx_rate, pair in self.pairs.items()}
+            elif url.path == '/refresh' and method == 'POST':
+                await loop.run_in_executor(self.executor, self.refresh)
+                body = {fx_rate: pair.describe() for fx_rate, pair in self.pairs.items()}
+            elif url.path in ('/scan', '/pairs', '/refresh'):
+                return 405, {'error': f"{method} not allowed on {url.path}"}
+            else:
+                return 404, {'error': f"Unknown path {url.path}"}
+            return 200, body
+
+        except ValueError as err:
+            return 400, {'error': str(err)}
+        except Exception as err:
+            logging.exception(f'Error answering {target}')
+            return 500, {'error': str(err)}
+
+
+def parse_query(params: dict, cfg: Configuration) -> dict:
+    """
+    Validated scan parameters of a query, the configured ones where missing.
+
+    :raises ValueError: If a parameter is missing or invalid.
+    """
+    unknown = set(params) - {'pair', 'low_high_interval', 'spread', 'market_open_time', 'ref_timezone', 'start', 'end', 'top_k', 'full'}
+    if unknown:
+        raise ValueError(f"Unknown query parameters {', '.join(sorted(unknown))}")
+    if not params.get('pair'):
+        raise ValueError("The pair query parameter is required")
+
+    market_open_time = params.get('market_open_time', cfg.market_open_time)
+    if len(market_open_time) != 4 or not market_open_time.isdigit() or int(market_open_time[:2]) > 23 or int(market_open_time[2:]) > 59:
+        raise ValueError(f"Invalid market_open_time {market_open_time}, expected hhmm")
+
+    ref_timezone = params.get('ref_timezone', cfg.ref_timezone)
+    try:
+        pd.Timestamp(0, tz=ref_timezone)
+    except Exception:
+        raise ValueError(f"Unknown ref_timezone {ref_timezone}")
+
+    dates = {}
+    for bound in ('start', 'end'):
+        try:
+            dates[bound] = pd.Timestamp(params[bound]).date() if params.get(bound) else None
+        except ValueError:
+            raise ValueError(f"Invalid {bound} date {params[bound]}")
+
+    full = params.get('full', 'false').lower()
+    if full not in ('true', 'false', '1', '0'):
+        raise ValueError(f"Invalid full {full}, expected true or false")
+
+    return {
+        'pair': params['pair'].upper(),
+        # Period raises a ValueError on invalid tenors, and normalises the others
+        'low_high_interval': str(Period(params['low_high_interval'])) if 'low_high_interval' in params else str(cfg.low_high_interval),
+        'spread': float(params.get('spread', cfg.spread)),
+        'market_open_time': market_open_time,
+        'ref_timezone': ref_timezone,
+        'start': dates['start'],
+        'end': dates['end'],
+        'top_k': int(params.get('top_k', 3)),
+        'full': full in ('true', '1')}
+
+
+def scan_response(scanner, query: dict, pair: ResidentPair, dates: np.ndarray) -> dict:
+    """JSON body of a query answered by a scanner holding its results."""
+    labels = [f"{start:%H:%M}-{end:%H:%M}" for start, end in scanner.windows]
+
+    # Windows tied on their count are listed in grid order
+    top = {}
+    for counter in COUNTERS:
+        counts = np.asarray(getattr(scanner, counter + '_counts'))
+        ranked = np.argsort(-counts, kind='stable')[:max(query['top_k'], 0)]
+        top[counter] = [
+            {'window': labels[window], 'count': int(counts[window]), 'probability': float(counts[window] / scanner.n_days)}
+            for window in ranked]
+
+    response = {
+        'pair': query['pair'],
+        'tick_interval': str(scanner.tick_interval),
+        'low_high_interval': query['low_high_interval'],
+        'spread': query['spread'],
+        'market_open_time': query['market_open_time'],
+        'ref_timezone': query['ref_timezone'],
+        'first_date': str(dates[0]),
+        'last_date': str(dates[-1]),
+        'n_days': int(scanner.n_days),
+        'data_loaded_at': str(pair.loaded_at),
+        'top': top}
+    if query['full']:
+        results_df = scanner.results_frame().drop(columns=['pair', 'historical_data_range', 'market_data_timezone'])
+        results_df.insert(0, 'window', labels)
+        response['windows'] = results_df.to_dict(orient='records')
+    return response
@@ -0,0 +1,208 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from typing import Optional
+from src.utils import time_to_ns, ns_to_time
+from src.window_scan_engine import WindowScanResult, hits_on_grid
+
+
+class ScannerState:
+    """
+    Per-day window hit records and counters of a scan, persisted between runs.
+
+    Hits are stored per day on the intra-day grid, so days can be added to or dropped from the
+    counters without rescanning the rest of the horizon.
+    """
+
+    def __init__(self,
+                 windows: list,
+                 day_opens: np.ndarray,
+                 dates: np.ndarray,
+                 daily_high: np.ndarray,
+                 daily_low: np.ndarray,
+                 opening_window_hits: np.ndarray,
+                 high_hits: np.ndarray,
+                 low_hits: np.ndarray,
+                 low_or_high_hits: np.ndarray,
+                 data_end: int,
+                 counts: Optional[tuple] = None) -> None:
+        """
+        :param windows: Intra-day grid of (datetime.time, datetime.time) windows.
+        :param day_opens: Session opens as int64 UTC nanoseconds, one per day.
+        :param dates: Session dates in the reference timezone as datetime64[D].
+        :param daily_high: Session high minus the spread tolerance.
+        :param daily_low: Session low plus the spread tolerance.
+        :param opening_window_hits: Whether the opening window holds the session low or high.
+        :param high_hits: (days x grid windows) windows holding the session high.
+        :param low_hits: (days x grid windows) windows holding the session low.
+        :param low_or_high_hits: (days x grid windows) windows holding the session low or high.
+        :param data_end: Timestamp of the last bar scanned as int64 UTC nanoseconds.
+        :param counts: Optional (high, low, low or high) counters, summed from the hits if omitted.
+        """
+        self.windows = windows
+        self.day_opens = day_opens
+        self.dates = dates
+        self.daily_high = daily_high
+        self.daily_low = daily_low
+        self.opening_window_hits = opening_window_hits
+        self.high_hits = high_hits
+        self.low_hits = low_hits
+        self.low_or_high_hits = low_or_high_hits
+        self.data_end = data_end
+
+        if counts is None:
+            counts = tuple(hits.sum(axis=0, dtype=np.int64) for hits in (high_hits, low_hits, low_or_high_hits))
+        self.high_counts, self.low_counts, self.low_or_high_counts = counts
+
+    @classmethod
+    def from_scan(cls,
+                  scan: WindowScanResult,
+                  grid_idx: np.ndarray,
+                  windows: list,
+                  dates: np.ndarray,
+                  data_end: int) -> 'ScannerState':
+        """Builds the state of the days of a scan, mapped onto the intra-day grid."""
+        opening_window_hits = scan.low_or_high_hits[:, 0] if scan.n_windows else np.zeros(scan.n_days, dtype=bool)
+        return cls(
+            windows,
+            scan.day_opens,
+            np.asarray(dates, dtype='datetime64[D]'),
+            scan.daily_high,
+            scan.daily_low,
+            opening_window_hits,
+            hits_on_grid(scan.high_hits, grid_idx, len(windows)),
+            hits_on_grid(scan.low_hits, grid_idx, len(windows)),
+            hits_on_grid(scan.low_or_high_hits, grid_idx, len(windows)),
+            data_end)
+
+    @classmethod
+    def concatenate(cls, states: list, data_end: int, windows: list = None) -> 'ScannerState':
+        """
+        Joins the states of consecutive days scanned separately on the same grid.
+
+        :param windows: Grid of the states, which gives an empty state on it when there are none.
+        """
+        if not states:
+            n_windows = len(windows or [])
+            return cls(
+                windows or [],
+                np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype='datetime64[D]'),
+                np.zeros(0),
+                np.zeros(0),
+                np.zeros(0, dtype=bool),
+                np.zeros((0, n_windows), dtype=bool),
+                np.zeros((0, n_windows), dtype=bool),
+                np.zeros((0, n_windows), dtype=bool),
+                data_end)
+
+        def join(name):
+            return np.concatenate([getattr(state, name) for state in states])
+
+        return cls(
+            states[0].windows,
+            join('day_opens'),
+            join('dates'),
+            join('daily_high'),
+            join('daily_low'),
+            join('opening_window_hits'),
+            join('high_hits'),
+            join('low_hits'),
+            join('low_or_high_hits'),
+            data_end)
+
+    @property
+    def n_days(self) -> int:
+        return len(self.day_opens)
+
+    def complete_days(self, day_length: int) -> np.ndarray:
+        """Flags the days whose session had fully elapsed by the last bar scanned."""
+        return self.day_opens + day_length <= self.data_end
+
+    def fold(self, keep: np.ndarray, new_days: 'ScannerState') -> 'ScannerState':
+        """
+        Drops the days not flagged in keep and adds new days, updating the counters incrementally.
+
+        :param keep: Boolean flag per stored day.
+        :param new_days: State of the newly scanned days, on the same grid.
+        :return: New state with the days ordered by session open.
+        """
+        counts = tuple(
+            counter - hits[~keep].sum(axis=0, dtype=np.int64) + new_hits.sum(axis=0, dtype=np.int64)
+            for counter, hits, new_hits in (
+                (self.high_counts, self.high_hits, new_days.high_hits),
+                (self.low_counts, self.low_hits, new_days.low_hits),
+                (self.low_or_high_counts, self.low_or_high_hits, new_days.low_or_high_hits)))
+
+        day_opens = np.concatenate([self.day_opens[keep], new_days.day_opens])
+        order = np.argsort(day_opens, kind='stable')
+
+        def merge(stored, new):
+            return np.concatenate([stored[keep], new])[order]
+
+        return ScannerState(
+            self.windows,
+            day_opens[order],
+            merge(self.dates, new_days.dates),
+            merge(self.daily_high, new_days.daily_high),
+            merge(self.daily_low, new_days.daily_low),
+            merge(self.opening_window_hits, new_days.opening_window_hits),
+            merge(self.high_hits, new_days.high_hits),
+            merge(self.low_hits, new_days.low_hits),
+            merge(self.low_or_high_hits, new_days.low_or_high_hits),
+            max(self.data_end, new_days.data_end),
+            counts)
+
+    @staticmethod
+    def key(**params) -> str:
+        """Short hash identifying a scan configuration."""
+        encoded = json.dumps({name: str(value) for name, value in params.items()}, sort_keys=True)
+        return hashlib.sha1(encoded.encode()).hexdigest()[:12]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez(
+            path,
+            window_starts=np.array([time_to_ns(window[0]) for window in self.windows], dtype=np.int64),
+            window_ends=np.array([time_to_ns(window[1]) for window in self.windows], dtype=np.int64),
+            day_opens=self.day_opens,
+            dates=self.dates,
+            daily_high=self.daily_high,
+            daily_low=self.daily_low,
+            opening_window_hits=self.opening_window_hits,
+            high_hits=np.packbits(self.high_hits, axis=1),
+            low_hits=np.packbits(self.low_hits, axis=1),
+            low_or_high_hits=np.packbits(self.low_or_high_hits, axis=1),
+            high_counts=self.high_counts,
+            low_counts=self.low_counts,
+            low_or_high_counts=self.low_or_high_counts,
+            data_end=np.int64(self.data_end))
+        logging.debug(f"Saved scanner state with {self.n_days} days to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional['ScannerState']:
+        """Loads a saved state or returns None if there is none."""
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as data:
+            windows = [(ns_to_time(start), ns_to_time(end))
+                       for start, end in zip(data['window_starts'], data['window_ends'])]
+
+            def unpack(name):
+                return np.unpackbits(data[name], axis=1, count=len(windows)).astype(bool)
+
+            return cls(
+                windows,
+                data['day_opens'],
+                data['dates'],
+                data['daily_high'],
+                data['daily_low'],
+                data['opening_window_hits'],
+                unpack('high_hits'),
+                unpack('low_hits'),
+                unpack('low_or_high_hits'),
+                int(data['data_end']),
+                (data['high_counts'], data['low_counts'], data['low_or_high_counts']))
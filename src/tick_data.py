@@ -0,0 +1,188 @@
+import os
+import time
+import logging
+import numpy as np
+import pandas as pd
+from typing import Iterator, Optional
+
+
+SIDES = ('bid', 'ask', 'mid')
+FIELDS = ('open', 'high', 'low', 'close')
+
+
+class TickBarAggregator:
+    """
+    Aggregates a stream of tick chunks into bid, ask and mid OHLC bars.
+
+    Each chunk is reduced to bars with vectorized group reductions, and only the last bar,
+    which the next chunk may extend, is carried over. Memory is bounded by the chunk size and
+    the bars, never by the length of the tick history.
+    """
+
+    def __init__(self, bar_length: pd.Timedelta, price: str = 'mid') -> None:
+        """
+        :param bar_length: Length of the bars, bars are aligned on multiples of it since the epoch.
+        :param price: Side ('bid', 'ask' or 'mid') copied into the open, high, low and close columns.
+        """
+        if price not in SIDES:
+            raise ValueError(f"Unknown tick price {price}, expected one of {', '.join(SIDES)}")
+
+        self.bar_ns = pd.Timedelta(bar_length).value
+        if self.bar_ns <= 0:
+            raise ValueError("The bar length must be positive")
+
+        self.price = price
+        self.n_ticks = 0
+        self.n_chunks = 0
+        self.n_bars = 0
+        self.elapsed = 0.0
+        self._started = None
+        self._partial = None
+
+    def update(self, times: np.ndarray, bid: np.ndarray, ask: np.ndarray) -> Optional[pd.DataFrame]:
+        """
+        Adds a chunk of ticks.
+
+        :param times: Tick timestamps as int64 nanoseconds since the epoch.
+        :param bid: Bid prices aligned with times.
+        :param ask: Ask prices aligned with times.
+        :return: The bars completed by this chunk, None if there are none.
+        :raises ValueError: If the chunk starts before the bar still open.
+        """
+        start = time.perf_counter()
+        if self._started is None:
+            self._started = start
+        times = np.asarray(times, dtype=np.int64)
+        bid = np.asarray(bid, dtype=np.float64)
+        ask = np.asarray(ask, dtype=np.float64)
+
+        # Ticks without both quotes are skipped
+        quoted = np.isfinite(bid) & np.isfinite(ask)
+        if not quoted.all():
+            times, bid, ask = times[quoted], bid[quoted], ask[quoted]
+        if len(times) == 0:
+            return None
+
+        if np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind='stable')
+            times, bid, ask = times[order], bid[order], ask[order]
+
+        bars = self._reduce(times, bid, ask)
+
+        if self._partial is not None:
+            if bars['bar'][0] < self._partial['bar'][0]:
+                raise ValueError("Tick chunks must be in ascending time order")
+            if bars['bar'][0] == self._partial['bar'][0]:
+                bars = _merge_first(self._partial, bars)
+            else:
+                bars = {name: np.concatenate([self._partial[name], values]) for name, values in bars.items()}
+
+        # The last bar stays open until a later chunk starts a new one
+        self._partial = {name: values[-1:] for name, values in bars.items()}
+        completed = {name: values[:-1] for name, values in bars.items()}
+
+        self.n_ticks += len(times)
+        self.n_chunks += 1
+        self.elapsed += time.perf_counter() - start
+        logging.debug("Aggregated tick chunk %d: %d ticks, %.0f ticks/s",
+                      self.n_chunks, len(times), self.n_ticks / max(time.perf_counter() - self._started, 1e-9))
+
+        return self._to_frame(completed)
+
+    def finish(self) -> Optional[pd.DataFrame]:
+        """Closes the last bar and returns it, None if no tick was added."""
+        if self._partial is None:
+            return None
+
+        partial, self._partial = self._partial, None
+        wall = time.perf_counter() - self._started
+        logging.info(f"Aggregated {self.n_ticks} ticks in {self.n_chunks} chunks into {self.n_bars + 1} bars "
+                     f"in {wall:.1f}s ({self.n_ticks / max(wall, 1e-9):,.0f} ticks/s, {self.elapsed:.1f}s aggregating)")
+        return self._to_frame(partial)
+
+    def _reduce(self, times: np.ndarray, bid: np.ndarray, ask: np.ndarray) -> dict:
+        """Bars of one sorted chunk of ticks."""
+        bar = times // self.bar_ns
+        starts = np.flatnonzero(np.r_[True, bar[1:] != bar[:-1]])
+        ends = np.r_[starts[1:], len(times)]
+
+        bars = {'bar': bar[starts], 'tick_volume': (ends - starts).astype(np.int64)}
+        for side, prices in (('bid', bid), ('ask', ask), ('mid', (bid + ask) / 2)):
+            bars[side + '_open'] = prices[starts]
+            bars[side + '_high'] = np.maximum.reduceat(prices, starts)
+            bars[side + '_low'] = np.minimum.reduceat(prices, starts)
+            bars[side + '_close'] = prices[ends - 1]
+        return bars
+
+    def _to_frame(self, bars: dict) -> Optional[pd.DataFrame]:
+        if len(bars['bar']) == 0:
+            return None
+
+        self.n_bars += len(bars['bar'])
+        columns = {field: bars[f"{self.price}_{field}"] for field in FIELDS}
+        columns.update({f"{side}_{field}": bars[f"{side}_{field}"] for side in ('bid', 'ask') for field in FIELDS})
+        columns['tick_volume'] = bars['tick_volume']
+
+        index = pd.DatetimeIndex((bars['bar'] * self.bar_ns).astype('datetime64[ns]'), name='datetime')
+        return pd.DataFrame(columns, index=index)
+
+
+def _merge_first(partial: dict, bars: dict) -> dict:
+    """Extends the first bar of a chunk with the bar carried over from the previous chunk."""
+    bars['tick_volume'][0] += partial['tick_volume'][0]
+    for side in SIDES:
+        bars[side + '_open'][0] = partial[side + '_open'][0]
+        bars[side + '_high'][0] = max(bars[side + '_high'][0], partial[side + '_high'][0])
+        bars[side + '_low'][0] = min(bars[side + '_low'][0], partial[side + '_low'][0])
+    return bars
+
+
+def ticks_to_bars(tick_chunks: Iterator[tuple], bar_length: pd.Timedelta, price: str = 'mid') -> Optional[pd.DataFrame]:
+    """
+    Aggregates a stream of (times, bid, ask) tick chunks into bars.
+
+    :return: DataFrame indexed by a naive 'datetime' index, None if there were no ticks.
+    """
+    aggregator = TickBarAggregator(bar_length, price)
+    frames = []
+    for times, bid, ask in tick_chunks:
+        bars = aggregator.update(times, bid, ask)
+        if bars is not None:
+            frames.append(bars)
+
+    last_bar = aggregator.finish()
+    if last_bar is not None:
+        frames.append(last_bar)
+
+    return pd.concat(frames) if frames else None
+
+
+def iter_tick_file(path: str, chunk_size: int = 1_000_000) -> Iterator[tuple]:
+    """
+    Reads a csv or Parquet tick file chunk by chunk.
+
+    The file needs 'datetime', 'bid' and 'ask' columns. Reading Parquet requires pyarrow.
+
+    :param path: Path of the tick file.
+    :param chunk_size: Number of ticks per chunk.
+    :return: Iterator of (times, bid, ask) chunks, with the times as int64 nanoseconds.
+    """
+    if os.path.splitext(path)[1].lower() == '.parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=['datetime', 'bid', 'ask']):
+            chunk = batch.to_pandas()
+            yield _chunk_arrays(chunk)
+    else:
+        for chunk in pd.read_csv(path, usecols=['datetime', 'bid', 'ask'], chunksize=chunk_size):
+            yield _chunk_arrays(chunk)
+
+
+def _chunk_arrays(chunk: pd.DataFrame) -> tuple:
+    times = chunk['datetime']
+    if not pd.api.types.is_datetime64_any_dtype(times):
+        times = pd.to_datetime(times, format='ISO8601')
+    if times.dt.tz is not None:
+        times = times.dt.tz_convert(None)
+    times = times.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return times, chunk['bid'].to_numpy(dtype=np.float64), chunk['ask'].to_numpy(dtype=np.float64)
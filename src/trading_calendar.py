@@ -0,0 +1,113 @@
+import logging
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+
+
+class TradingCalendar:
+    """
+    Trading days as business days minus the holidays of the given calendars.
+
+    Calendars are names from the holidays package, either financial markets (e.g. "NYSE", "ECB")
+    or countries (e.g. "US", "GB"). Schedules and session bounds are built for the whole range at
+    once and cached, so every pair and parameter set sharing a calendar reuses them.
+    """
+
+    def __init__(self, holiday_calendars: tuple = ()) -> None:
+        """
+        :param holiday_calendars: Names of the holiday calendars, none for weekends only.
+        """
+        self.holiday_calendars = tuple(holiday_calendars)
+        if not self.holiday_calendars:
+            return
+
+        # Only imported when calendars are configured, it is slow to import
+        import holidays
+
+        financial = holidays.list_supported_financial()
+        countries = holidays.list_supported_countries()
+        for name in self.holiday_calendars:
+            if name not in financial and name not in countries:
+                raise ValueError(f"Unknown holiday calendar {name}")
+
+    def holidays_between(self, start_year: int, end_year: int) -> np.ndarray:
+        """Sorted holiday dates of all calendars between the given years, as datetime64[D]."""
+        return _holiday_dates(self.holiday_calendars, start_year, end_year)
+
+    def schedule(self, start_date: pd.Timestamp, end_date: pd.Timestamp, check_bdays: bool = True) -> pd.DatetimeIndex:
+        """
+        Trading days from start_date to the day after end_date, at the time of day of start_date.
+
+        As with the original day by day schedule, start_date is always included and days are
+        stepped by 24 hours.
+        """
+        n_days = max(int((end_date - start_date) // pd.Timedelta(days=1)) + 1, 0)
+        days = start_date + pd.to_timedelta(np.arange(n_days + 1), unit='D')
+        if not check_bdays:
+            return days
+
+        dates = _wall_dates(days)
+        is_trading_day = days.dayofweek < 5
+        if self.holiday_calendars:
+            is_trading_day &= ~np.isin(dates, self.holidays_between(days.min().year, days.max().year))
+        is_trading_day[0] = True
+
+        return days[is_trading_day]
+
+    @lru_cache(maxsize=64)
+    def sessions(self,
+                 start_date: pd.Timestamp,
+                 end_date: pd.Timestamp,
+                 market_open_time: str,
+                 market_timezone: str,
+                 ref_timezone: str) -> tuple:
+        """
+        Trading schedule with the open and close of each session in the reference timezone.
+
+        Sessions open at market_open_time (hhmm) in the market timezone and close at the same
+        wall-clock time the next day, so sessions spanning a DST change are 23 or 25 hours long.
+
+        :return: Tuple of (schedule, session opens, session closes) DatetimeIndexes.
+        """
+        schedule = self.schedule(start_date, end_date)
+        logging.debug(f"Built trading schedule of {len(schedule)} days from {start_date} to {end_date}")
+
+        session_dates = pd.DatetimeIndex(_wall_dates(schedule))
+        open_time = pd.Timedelta(hours=int(market_open_time[:2]), minutes=int(market_open_time[2:]))
+        session_opens = (session_dates + open_time).tz_localize(market_timezone).tz_convert(ref_timezone)
+        session_closes = (session_dates + pd.Timedelta(days=1) + open_time).tz_localize(
+            market_timezone,
+            ambiguous='NaT',
+            nonexistent='NaT').tz_convert(ref_timezone)
+
+        return schedule, session_opens, session_closes
+
+
+@lru_cache(maxsize=None)
+def get_calendar(holiday_calendars: tuple = ()) -> TradingCalendar:
+    """Shared calendar for the given holiday calendars."""
+    return TradingCalendar(holiday_calendars)
+
+
+@lru_cache(maxsize=64)
+def _holiday_dates(holiday_calendars: tuple, start_year: int, end_year: int) -> np.ndarray:
+    if not holiday_calendars:
+        return np.array([], dtype='datetime64[D]')
+
+    import holidays
+
+    years = range(start_year, end_year + 1)
+    dates = set()
+    for name in holiday_calendars:
+        if name in holidays.list_supported_financial():
+            dates.update(holidays.financial_holidays(name, years=years))
+        else:
+            dates.update(holidays.country_holidays(name, years=years))
+    return np.array(sorted(dates), dtype='datetime64[D]')
+
+
+def _wall_dates(days: pd.DatetimeIndex) -> np.ndarray:
+    """Calendar dates of the days in their own timezone, as datetime64[D]."""
+    if days.tz is not None:
+        days = days.tz_localize(None)
+    return days.to_numpy().astype('datetime64[D]')
@@ -1,6 +1,6 @@
 import pandas as pd
-import holidays
-import re
+from src.trading_calendar import get_calendar
+from src.period import Period
 
 
 def create_overlapping_time_grid(start_date, end_date, tick_interval, horizon_length, time_only=True):
@@ -20,19 +20,27 @@ def create_overlapping_time_grid(start_date, end_date, tick_interval, horizon_le
     else:
         return time_grid
 
-def create_daily_date_schedule(start_date: pd.Timestamp, end_date: pd.Timestamp, check_bdays = True):
-    new_date = start_date
-    historical_period = [start_date]
-    while new_date <= end_date:
-        new_date += pd.Timedelta(days=1)
-
-        if check_bdays:
-            if market_open(new_date):
-                historical_period.append(new_date)
-        else:
-            historical_period.append(new_date)
-
-    return historical_period
+def create_intra_day_time_grid(day, market_open_time, market_timezone, ref_timezone, tick_interval, horizon_length):
+    """Time-only overlapping windows over one session, opening on `day` at market_open_time (hhmm)."""
+    start = pd.Timestamp(
+        day.year, 
+        day.month, 
+        day.day, 
+        int(market_open_time[:2]), 
+        int(market_open_time[2:]),
+        tz=market_timezone)
+    
+    start = start.tz_convert(ref_timezone)
+    
+    return create_overlapping_time_grid(
+        start, 
+        start + pd.Timedelta(days=1), 
+        tick_interval, 
+        horizon_length,
+        True)
+
+def create_daily_date_schedule(start_date: pd.Timestamp, end_date: pd.Timestamp, check_bdays = True, holiday_calendars = ()):
+    return list(get_calendar(tuple(holiday_calendars)).schedule(start_date, end_date, check_bdays))
 
 def count_points_between_dates(start_date: pd.Timestamp, later_date: pd.Timestamp, interval: str):
     data_points = (later_date - start_date).total_seconds() // pd.Timedelta(interval).total_seconds()
@@ -48,6 +56,29 @@ def high_low_per_window(window, df):
     min = filtered_df["low"].min()
     return min, max
 
+def period_to_timedelta(period) -> pd.Timedelta:
+    """Converts a fixed-length Period (seconds, minutes, days or weeks) into a Timedelta."""
+    tenor = period.tenor.upper()
+    if tenor == "S":
+        return pd.Timedelta(seconds=period.units)
+    elif tenor == "MIN":
+        return pd.Timedelta(minutes=period.units)
+    elif tenor == "D":
+        return pd.Timedelta(days=period.units)
+    elif tenor == "W":
+        return pd.Timedelta(weeks=period.units)
+    else:
+        raise ValueError(f"Period {period} does not have a fixed length")
+
+def time_to_ns(time_of_day) -> int:
+    """Nanoseconds since midnight of a datetime.time."""
+    seconds = time_of_day.hour * 3600 + time_of_day.minute * 60 + time_of_day.second
+    return seconds * 10**9 + time_of_day.microsecond * 1000
+
+def ns_to_time(ns):
+    """datetime.time from nanoseconds since midnight."""
+    return (pd.Timestamp(0) + pd.Timedelta(int(ns), unit='ns')).time()
+
 def market_open(date, market_calendar='NYSE'):
     if date.dayofweek > 4:
         return False
@@ -58,15 +89,6 @@ def market_open(date, market_calendar='NYSE'):
 
     return True
 
-def split_tenor_string(entry):
-    regex = re.compile("^(?P<numbers>\d*)(?P<letters>\w*)$")
-    (numbers, letters) = regex.search(entry).groups()
-    numbers = 1 if numbers == "" else numbers
-    return (int(numbers), letters or None)
-
-
-class Period: ...
-
 def shift_date_by_period(period: Period, input_date: pd.Timestamp, direction: str = "+") -> pd.Timestamp:
     if direction not in ("+", "-"):
         raise ValueError("Operation to be performed not recognized")
@@ -75,7 +97,9 @@ def shift_date_by_period(period: Period, input_date: pd.Timestamp, direction: st
     units = period.units if direction == "+" else -period.units
 
     # Adjust the input_date based on period.tenor
-    if period.tenor.upper() == "MIN":  # mihnutes
+    if period.tenor.upper() == "S":  # Seconds
+        input_date += pd.Timedelta(seconds=units)
+    elif period.tenor.upper() == "MIN":  # mihnutes
         input_date += pd.Timedelta(minutes=units)
     elif period.tenor.upper() == "W":  # Weeks
         input_date += pd.Timedelta(weeks=units)
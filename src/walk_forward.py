@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from src.period import Period
+from src.utils import shift_date_by_period
+
+
+COUNTERS = ('high', 'low', 'low_or_high')
+
+
+def trailing_periods(dates: np.ndarray, lookback: Period) -> tuple:
+    """
+    Trailing periods of `lookback` ending on each scanned day, as day ranges of the scan.
+
+    A period ending on day d holds the scanned days after d - lookback, up to and including d.
+    Only periods whose start falls within the scanned history are complete and returned.
+
+    :param dates: Sorted session dates as datetime64[D].
+    :param lookback: Length of the trailing periods.
+    :return: Tuple of the first day index, the end index (exclusive) and the end date of each period.
+    """
+    days = pd.DatetimeIndex(np.asarray(dates, dtype='datetime64[D]'))
+    if len(days) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), days
+
+    bounds = shift_date_by_period(lookback, days, '-')
+    complete = np.asarray(bounds >= days[0] - pd.Timedelta(days=1))
+    starts = np.searchsorted(days, bounds[complete], side='right')
+    ends = np.flatnonzero(complete) + 1
+    return starts, ends, days[complete]
+
+
+def rolling_counts(hits: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Hits of each window over the days from every start (inclusive) to its end (exclusive).
+
+    Every period is the difference of two rows of the cumulative sums along the day axis, so all
+    periods cost O(days x windows) however long or many they are.
+
+    :param hits: (days x windows) matrix flagging the windows hit on each day.
+    :return: (periods x windows) int32 matrix of the counts.
+    """
+    cumulative = np.zeros((hits.shape[0] + 1, hits.shape[1]), dtype=np.int32)
+    np.cumsum(hits, axis=0, out=cumulative[1:])
+    return cumulative[ends] - cumulative[starts]
+
+
+def walk_forward(hits: dict, dates: np.ndarray, windows: list, lookback: Period, top_k: int = 3) -> pd.DataFrame:
+    """
+    Top windows and their probabilities over every trailing period of `lookback`, stepped daily.
+
+    Windows tied on their count are ranked in grid order.
+
+    :param hits: (days x windows) hit matrices by counter name ('high', 'low', 'low_or_high').
+    :param dates: Session dates of the hit matrices' rows as datetime64[D].
+    :param windows: Intra-day grid of the hit matrices' columns.
+    :param lookback: Length of the trailing periods.
+    :param top_k: Number of top windows per period and counter.
+    :return: Tidy DataFrame with one row per period end, counter and rank.
+    """
+    starts, ends, end_dates = trailing_periods(dates, lookback)
+    n_days = (ends - starts).astype(np.int32)
+    top_k = min(top_k, len(windows))
+    window_labels = pd.Series(windows, dtype=object)
+
+    frames = []
+    for counter, counter_hits in hits.items():
+        counts = rolling_counts(counter_hits, starts, ends)
+        top = np.argsort(-counts, axis=1, kind='stable')[:, :top_k]
+        top_counts = np.take_along_axis(counts, top, axis=1)
+
+        frames.append(pd.DataFrame({
+            'date': np.repeat(end_dates.date, top_k),
+            'lookback': str(lookback),
+            'n_days': np.repeat(n_days, top_k),
+            'counter': counter,
+            'rank': np.tile(np.arange(1, top_k + 1, dtype=np.int16), len(ends)),
+            'window': window_labels.to_numpy()[top.ravel()] if len(windows) else [],
+            'count': top_counts.ravel(),
+            'probability': (top_counts / np.maximum(n_days, 1)[:, None]).ravel()}))
+
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,583 @@
+import numpy as np
+import pandas as pd
+from math import gcd
+from src.period import Period
+from src.bar_series import BarSeries, INT32, decode_prices
+from src.utils import period_to_timedelta, time_to_ns, ns_to_time
+
+
+DAY_NS = pd.Timedelta(days=1).value
+
+
+class WindowScanResult:
+    """Per-day, per-window extremes and hit flags produced by the WindowScanEngine."""
+
+    def __init__(self,
+                 day_opens: np.ndarray,
+                 window_high: np.ndarray,
+                 window_low: np.ndarray,
+                 daily_high: np.ndarray,
+                 daily_low: np.ndarray) -> None:
+        """
+        :param day_opens: Session opens as int64 UTC nanoseconds, one per day.
+        :param window_high: (days x windows) highest high per window, NaN if the window is empty.
+        :param window_low: (days x windows) lowest low per window, NaN if the window is empty.
+        :param daily_high: Session high minus the spread tolerance, NaN if the session is empty.
+        :param daily_low: Session low plus the spread tolerance, NaN if the session is empty.
+        """
+        self.day_opens = day_opens
+        self.window_high = window_high
+        self.window_low = window_low
+        self.daily_high = daily_high
+        self.daily_low = daily_low
+
+        self.high_hits = window_high >= daily_high[:, None]
+        self.low_hits = window_low <= daily_low[:, None]
+        self.low_or_high_hits = self.high_hits | self.low_hits
+
+    @property
+    def n_days(self) -> int:
+        return self.window_high.shape[0]
+
+    @property
+    def n_windows(self) -> int:
+        return self.window_high.shape[1]
+
+
+class WindowScanEngine:
+    """
+    Computes the high and low of every overlapping intra-day window for all trading days at once.
+
+    The bars are laid out in a dense (days x intra-day slots) matrix, where a slot is the greatest
+    common divisor of the tick interval and the window length, and bars between slot boundaries
+    fall in half slots.
+    Window extremes are then obtained with a blocked sliding max/min (van Herk/Gil-Werman) over the
+    slot axis, which costs O(days x slots) regardless of the window length.
+    """
+
+    def __init__(self, tick_interval: Period, high_low_interval: Period, spread: float = 0.0) -> None:
+        """
+        :param tick_interval: Step between consecutive window starts.
+        :param high_low_interval: Length of each window.
+        :param spread: Tolerance applied to the daily high and low when flagging hits.
+        """
+        self.tick_ns = period_to_timedelta(tick_interval).value
+        self.window_ns = period_to_timedelta(high_low_interval).value
+        self.spread = spread
+
+        if self.tick_ns <= 0 or self.window_ns <= 0:
+            raise ValueError("Tick interval and window length must be positive")
+
+        if self.window_ns > DAY_NS:
+            self.n_windows = 0
+        else:
+            self.n_windows = (DAY_NS - self.window_ns) // self.tick_ns + 1
+
+    def window_offsets(self) -> np.ndarray:
+        """Window start offsets from the session open in nanoseconds."""
+        return np.arange(self.n_windows, dtype=np.int64) * self.tick_ns
+
+    def scan(self,
+             bar_times: np.ndarray,
+             highs: np.ndarray,
+             lows: np.ndarray,
+             day_opens: np.ndarray,
+             decimals: int = None) -> WindowScanResult:
+        """
+        Scans every session in one pass.
+
+        A session runs from its open (inclusive) to one day later (exclusive). A window includes
+        both of its end points, mirroring utils.high_low_per_window.
+
+        :param bar_times: Bar timestamps as int64 UTC nanoseconds, in any order.
+        :param highs: Bar highs aligned with bar_times.
+        :param lows: Bar lows aligned with bar_times.
+        :param day_opens: Session opens as int64 UTC nanoseconds.
+        :param decimals: Decimals of int pip prices, as encoded by a BarSeries. None for float prices.
+        :return: WindowScanResult holding the (days x windows) extremes and hit flags.
+        """
+        layout = SessionLayout(bar_times, highs, lows, day_opens, [self.tick_ns, self.window_ns], decimals)
+        return self.scan_layout(layout)
+
+    def scan_bars(self, bars: BarSeries, day_opens: np.ndarray) -> WindowScanResult:
+        """Scans every session of compact bars in one pass."""
+        return self.scan(bars.times, bars.highs, bars.lows, day_opens, bars.decimals)
+
+    def scan_layout(self, layout) -> WindowScanResult:
+        """
+        Scans sessions that were already laid out, by a SessionLayout or a RangeExtremeIndex.
+
+        :param layout: Object exposing day_opens, resolution, daily_high, daily_low and window_extremes.
+        :return: WindowScanResult holding the (days x windows) extremes and hit flags.
+        """
+        if self.tick_ns % layout.resolution or self.window_ns % layout.resolution:
+            raise ValueError("Session layout resolution does not divide the tick interval and window length")
+
+        starts, width = layout.window_slots(self.window_offsets(), self.window_ns)
+        window_high, window_low = layout.window_extremes(starts, width)
+
+        return WindowScanResult(
+            layout.day_opens,
+            window_high,
+            window_low,
+            layout.daily_high - self.spread,
+            layout.daily_low + self.spread)
+
+    def scan_timeline(self, timeline, day_opens: np.ndarray) -> WindowScanResult:
+        """
+        Scans the sessions opening at day_opens from bars laid out on a BarTimeline, which the
+        session schedules of several market open times and reference timezones can share.
+
+        :param timeline: BarTimeline built with these session opens among its own.
+        :param day_opens: Session opens as int64 UTC nanoseconds.
+        :return: WindowScanResult holding the (days x windows) extremes and hit flags.
+        """
+        day_opens = np.asarray(day_opens, dtype=np.int64)
+        daily_high, daily_low = timeline.session_extremes(day_opens)
+        window_high, window_low = timeline.window_extremes(day_opens, self.window_offsets(), self.window_ns)
+
+        return WindowScanResult(
+            day_opens,
+            window_high,
+            window_low,
+            daily_high - self.spread,
+            daily_low + self.spread)
+
+    def extend_grid(self,
+                    day_opens: np.ndarray,
+                    ref_timezone: str,
+                    time_grid: list) -> list:
+        """
+        Adds the windows of the given sessions missing from a time-only window grid.
+
+        Sessions are 24 hours long, so when the reference timezone observes DST the windows of
+        sessions on the other side of a change, or spanning it, fall on other wall-clock times than
+        those of the session the grid was built from. The grid is returned unchanged when every
+        window matches.
+
+        :return: The grid with the missing windows, ordered by their start from the grid's first window.
+        """
+        day_opens = np.asarray(day_opens, dtype=np.int64)
+        missing = self.map_to_grid(day_opens, ref_timezone, time_grid) < 0
+        if not missing.any():
+            return time_grid
+
+        window_starts = (day_opens[:, None] + self.window_offsets()[None, :])[missing]
+        missing_windows = np.unique(np.stack([
+            _wall_clock_time_of_day(window_starts, ref_timezone),
+            _wall_clock_time_of_day(window_starts + self.window_ns, ref_timezone)], axis=1), axis=0)
+
+        windows = [(time_to_ns(start), time_to_ns(end)) for start, end in time_grid]
+        windows += [(int(start), int(end)) for start, end in missing_windows]
+        first_start = windows[0][0]
+        windows.sort(key=lambda window: ((window[0] - first_start) % DAY_NS, (window[1] - first_start) % DAY_NS))
+        return [(ns_to_time(start), ns_to_time(end)) for start, end in windows]
+
+    def map_to_grid(self,
+                    day_opens: np.ndarray,
+                    ref_timezone: str,
+                    time_grid: list) -> np.ndarray:
+        """
+        Maps each day's windows onto a time-only window grid, as built by create_overlapping_time_grid.
+
+        :param day_opens: Session opens as int64 UTC nanoseconds.
+        :param ref_timezone: Timezone in which window times are expressed.
+        :param time_grid: List of (datetime.time, datetime.time) windows.
+        :return: (days x windows) int64 grid positions, -1 where a window has no match in the grid.
+        """
+        day_opens = np.asarray(day_opens, dtype=np.int64)
+        window_starts = day_opens[:, None] + self.window_offsets()[None, :]
+        start_of_day = _wall_clock_time_of_day(window_starts, ref_timezone)
+        end_of_day = _wall_clock_time_of_day(window_starts + self.window_ns, ref_timezone)
+
+        grid_starts = np.array([time_to_ns(window[0]) for window in time_grid], dtype=np.int64)
+        grid_ends = np.array([time_to_ns(window[1]) for window in time_grid], dtype=np.int64)
+        if len(grid_starts) == 0:
+            return np.full(window_starts.shape, -1, dtype=np.int64)
+
+        if len(np.unique(grid_starts)) < len(grid_starts):
+            # Grids extended over DST changes hold windows sharing a start
+            grid = pd.MultiIndex.from_arrays([grid_starts, grid_ends])
+            windows = pd.MultiIndex.from_arrays([start_of_day.ravel(), end_of_day.ravel()])
+            return grid.get_indexer(windows).astype(np.int64).reshape(start_of_day.shape)
+
+        sorter = np.argsort(grid_starts, kind='stable')
+        position = np.searchsorted(grid_starts, start_of_day, sorter=sorter).clip(max=len(sorter) - 1)
+        grid_idx = sorter[position]
+        matched = (grid_starts[grid_idx] == start_of_day) & (grid_ends[grid_idx] == end_of_day)
+        return np.where(matched, grid_idx, -1)
+
+
+class SessionLayout:
+    """
+    Bars laid out in dense (days x intra-day slots) high and low matrices.
+
+    Slots are `resolution` nanoseconds wide, the greatest common divisor of one day and the given
+    lengths, so every window boundary falls on a slot boundary. When bars fall between boundaries,
+    each slot is split in two columns, the boundary and the half slot after it, which keeps the
+    inclusive windows exact without narrowing the slots to the bar offsets. Empty slots hold -inf in the high matrix and +inf in the low matrix, or the
+    int32 minimum and maximum when the prices are int pips. Matrices keep the dtype of the prices,
+    which are only decoded to float64 once reduced to window and daily extremes.
+    """
+
+    def __init__(self,
+                 bar_times: np.ndarray,
+                 highs: np.ndarray,
+                 lows: np.ndarray,
+                 day_opens: np.ndarray,
+                 lengths_ns: list,
+                 decimals: int = None) -> None:
+        """
+        :param bar_times: Bar timestamps as int64 UTC nanoseconds, in any order.
+        :param highs: Bar highs aligned with bar_times.
+        :param lows: Bar lows aligned with bar_times.
+        :param day_opens: Session opens as int64 UTC nanoseconds.
+        :param lengths_ns: Tick intervals and window lengths, in nanoseconds, the layout must support.
+        :param decimals: Decimals of int pip prices, as encoded by a BarSeries. None for float prices.
+        """
+        day_opens = np.asarray(day_opens, dtype=np.int64)
+        n_days = len(day_opens)
+        times, highs, lows, high_fill, low_fill = _sorted_prices(bar_times, highs, lows, decimals)
+
+        # Assign bars to sessions. Sessions may overlap around DST changes in the market
+        # timezone, so each session takes its own slice of the sorted bars.
+        first = np.searchsorted(times, day_opens, side='left')
+        last = np.searchsorted(times, day_opens + DAY_NS, side='left')
+        counts = last - first
+        day_idx = np.repeat(np.arange(n_days), counts)
+        bar_idx = (np.arange(counts.sum())
+                   - np.repeat(np.cumsum(counts) - counts, counts)
+                   + np.repeat(first, counts))
+        offsets = times[bar_idx] - day_opens[day_idx]
+
+        resolution = gcd(DAY_NS, *[int(length) for length in lengths_ns])
+        slot_idx, split = _slot_columns(offsets, resolution)
+        n_slots = DAY_NS // resolution
+
+        # One trailing column for the session close, which is never populated
+        high_matrix = np.full((n_days, n_slots * split + 1), high_fill, dtype=highs.dtype)
+        low_matrix = np.full((n_days, n_slots * split + 1), low_fill, dtype=lows.dtype)
+        if len(slot_idx) and np.any((np.diff(day_idx) == 0) & (np.diff(slot_idx) == 0)):
+            np.maximum.at(high_matrix, (day_idx, slot_idx), highs[bar_idx])
+            np.minimum.at(low_matrix, (day_idx, slot_idx), lows[bar_idx])
+        else:
+            high_matrix[day_idx, slot_idx] = highs[bar_idx]
+            low_matrix[day_idx, slot_idx] = lows[bar_idx]
+
+        self.day_opens = day_opens
+        self.resolution = resolution
+        self.split = split
+        self.decimals = decimals
+        self.high_fill = high_fill
+        self.low_fill = low_fill
+        self.high_matrix = high_matrix
+        self.low_matrix = low_matrix
+
+        self.daily_high = _as_prices(high_matrix.max(axis=1), decimals)
+        self.daily_low = _as_prices(low_matrix.min(axis=1), decimals)
+
+    def window_slots(self, offsets_ns: np.ndarray, window_ns: int) -> tuple:
+        """
+        Start columns and width in columns of the windows starting offsets_ns after the session
+        open, including both of their end points.
+        """
+        return _window_columns(offsets_ns, window_ns, self.resolution, self.split)
+
+    def window_extremes(self, starts: np.ndarray, width: int) -> tuple:
+        """
+        Highest high and lowest low over `width` columns from each start column, for every day.
+
+        :return: Tuple of (days x starts) highs and lows, NaN where a window holds no bar.
+        """
+        window_high = _sliding_extreme(self.high_matrix, width, np.maximum, self.high_fill)[:, starts]
+        window_low = _sliding_extreme(self.low_matrix, width, np.minimum, self.low_fill)[:, starts]
+        return _as_prices(window_high, self.decimals), _as_prices(window_low, self.decimals)
+
+
+class BarTimeline:
+    """
+    Bars laid out on one continuous UTC timeline of `resolution` wide slots, from the first session
+    open to one day after the last. Slots are split in two columns when bars fall between their
+    boundaries, as in a SessionLayout.
+
+    Unlike a SessionLayout, the layout does not depend on the session opens, so the schedules of
+    several market open times and reference timezones share it. Window extremes are read from a
+    sparse table over the slots, and session extremes are reduced over the segments between
+    session bounds, so each schedule costs O(days x windows) lookups.
+    """
+
+    def __init__(self,
+                 bar_times: np.ndarray,
+                 highs: np.ndarray,
+                 lows: np.ndarray,
+                 day_opens: np.ndarray,
+                 lengths_ns: list,
+                 decimals: int = None) -> None:
+        """
+        :param bar_times: Bar timestamps as int64 UTC nanoseconds, in any order.
+        :param highs: Bar highs aligned with bar_times.
+        :param lows: Bar lows aligned with bar_times.
+        :param day_opens: Opens, as int64 UTC nanoseconds, of every session that will be scanned.
+        :param lengths_ns: Tick intervals and window lengths, in nanoseconds, the timeline must support.
+        :param decimals: Decimals of int pip prices, as encoded by a BarSeries. None for float prices.
+        """
+        day_opens = np.unique(np.asarray(day_opens, dtype=np.int64))
+        times, highs, lows, high_fill, low_fill = _sorted_prices(bar_times, highs, lows, decimals)
+
+        origin = day_opens[0] if len(day_opens) else 0
+        end = day_opens[-1] + DAY_NS if len(day_opens) else 0
+        first, last = np.searchsorted(times, [origin, end], side='left')
+        times, highs, lows = times[first:last], highs[first:last], lows[first:last]
+
+        offsets = times - origin
+        resolution = gcd(DAY_NS, *[int(length) for length in lengths_ns])
+        if len(day_opens):
+            resolution = gcd(resolution, int(np.gcd.reduce(day_opens - origin)))
+        slot_idx, split = _slot_columns(offsets, resolution)
+
+        # One trailing column past the close of the last session, which is never populated
+        n_slots = (end - origin) // resolution
+        high = np.full(n_slots * split + 1, high_fill, dtype=highs.dtype)
+        low = np.full(n_slots * split + 1, low_fill, dtype=lows.dtype)
+        if len(slot_idx) and np.any(np.diff(slot_idx) == 0):
+            np.maximum.at(high, slot_idx, highs)
+            np.minimum.at(low, slot_idx, lows)
+        else:
+            high[slot_idx] = highs
+            low[slot_idx] = lows
+
+        self.origin = origin
+        self.resolution = resolution
+        self.split = split
+        self.n_slots = n_slots
+        self.decimals = decimals
+        self.high = high
+        self.low = low
+
+        n_levels = max(max(int(length) // resolution * split + 1 for length in lengths_ns).bit_length(), 1)
+        self.high_levels = _sparse_table(high[None, :], n_levels, np.maximum)
+        self.low_levels = _sparse_table(low[None, :], n_levels, np.minimum)
+
+    def session_extremes(self, day_opens: np.ndarray) -> tuple:
+        """
+        Highest high and lowest low of each session, from its open (inclusive) to one day later (exclusive).
+
+        :return: Tuple of the daily highs and lows, NaN where a session holds no bar.
+        """
+        first = self._slots(day_opens)
+        last = first + DAY_NS // self.resolution * self.split
+
+        # Reduce the slots between consecutive bounds, then each session over its segments,
+        # which are several only where sessions overlap
+        bounds = np.unique(np.concatenate([first, last]))
+        segment_high = np.maximum.reduceat(self.high[:bounds[-1]], bounds[:-1]) if len(bounds) else self.high[:0]
+        segment_low = np.minimum.reduceat(self.low[:bounds[-1]], bounds[:-1]) if len(bounds) else self.low[:0]
+
+        first_segment = np.searchsorted(bounds, first)
+        n_segments = np.searchsorted(bounds, last) - first_segment
+        n_levels = max(int(n_segments.max()).bit_length(), 1) if len(n_segments) else 1
+        daily_high = _range_extreme(_sparse_table(segment_high[None, :], n_levels, np.maximum), first_segment, n_segments, np.maximum)
+        daily_low = _range_extreme(_sparse_table(segment_low[None, :], n_levels, np.minimum), first_segment, n_segments, np.minimum)
+        return _as_prices(daily_high, self.decimals), _as_prices(daily_low, self.decimals)
+
+    def window_extremes(self, day_opens: np.ndarray, offsets_ns: np.ndarray, window_ns: int) -> tuple:
+        """
+        Highest high and lowest low of the windows starting offsets_ns after each session open. A
+        window includes both of its end points but never the session close.
+
+        :return: Tuple of (days x windows) highs and lows, NaN where a window holds no bar.
+        """
+        offsets_ns = np.asarray(offsets_ns, dtype=np.int64)
+        if np.any(offsets_ns % self.resolution) or window_ns % self.resolution:
+            raise ValueError("Timeline resolution does not divide the window offsets and length")
+
+        offsets, width = _window_columns(offsets_ns, window_ns, self.resolution, self.split)
+        widths = np.minimum(width, DAY_NS // self.resolution * self.split - offsets)
+        if len(widths) and widths.max() >= 1 << len(self.high_levels):
+            raise ValueError(f"Window of {widths.max()} slots exceeds the indexed width")
+
+        starts = self._slots(day_opens)[:, None] + offsets[None, :]
+        widths = np.broadcast_to(widths, starts.shape)
+        window_high = _range_extreme(self.high_levels, starts, widths, np.maximum)
+        window_low = _range_extreme(self.low_levels, starts, widths, np.minimum)
+        return _as_prices(window_high, self.decimals), _as_prices(window_low, self.decimals)
+
+    def _slots(self, day_opens: np.ndarray) -> np.ndarray:
+        offsets = np.asarray(day_opens, dtype=np.int64) - self.origin
+        if np.any(offsets % self.resolution) or np.any(offsets < 0) or np.any(offsets + DAY_NS > self.n_slots * self.resolution):
+            raise ValueError("Session opens are not part of the timeline")
+        return offsets // self.resolution * self.split
+
+
+class RangeExtremeIndex:
+    """
+    Sparse table over the slot axis of a SessionLayout.
+
+    Level k holds the extreme over every run of 2**k slots, so the extreme over any run of up
+    to `max_width` slots is answered with two lookups. Building it costs O(days x slots x levels)
+    once, after which windows of any length and step are read off without rescanning the bars.
+    """
+
+    def __init__(self, layout: SessionLayout, max_width: int) -> None:
+        """
+        :param layout: Session layout to index.
+        :param max_width: Longest run of slots that will be queried.
+        """
+        self.day_opens = layout.day_opens
+        self.resolution = layout.resolution
+        self.split = layout.split
+        self.daily_high = layout.daily_high
+        self.daily_low = layout.daily_low
+        self.decimals = layout.decimals
+
+        n_levels = max(int(max_width).bit_length(), 1)
+        self.high_levels = _sparse_table(layout.high_matrix, n_levels, np.maximum)
+        self.low_levels = _sparse_table(layout.low_matrix, n_levels, np.minimum)
+
+    def window_slots(self, offsets_ns: np.ndarray, window_ns: int) -> tuple:
+        """Start columns and width in columns of the windows, as given by SessionLayout.window_slots."""
+        return _window_columns(offsets_ns, window_ns, self.resolution, self.split)
+
+    def window_extremes(self, starts: np.ndarray, width: int) -> tuple:
+        """
+        Highest high and lowest low over `width` columns from each start column, for every day.
+
+        :return: Tuple of (days x starts) highs and lows, NaN where a window holds no bar.
+        """
+        level = int(width).bit_length() - 1
+        if level >= len(self.high_levels):
+            raise ValueError(f"Window of {width} slots exceeds the indexed width")
+
+        tail = starts + width - (1 << level)
+        highs = self.high_levels[level]
+        lows = self.low_levels[level]
+        window_high = np.maximum(highs[:, starts], highs[:, tail])
+        window_low = np.minimum(lows[:, starts], lows[:, tail])
+        return _as_prices(window_high, self.decimals), _as_prices(window_low, self.decimals)
+
+
+def count_hits(hits: np.ndarray, grid_idx: np.ndarray, n_grid: int) -> np.ndarray:
+    """
+    Folds a (days x windows) hit matrix into dense per-grid-window counters.
+
+    :raises ValueError: If a hit falls on a window that is not part of the grid.
+    """
+    if np.any(hits & (grid_idx < 0)):
+        raise ValueError("Problem with time window")
+    return np.bincount(grid_idx[hits], minlength=n_grid).astype(np.int64)
+
+
+def hits_on_grid(hits: np.ndarray, grid_idx: np.ndarray, n_grid: int) -> np.ndarray:
+    """
+    Re-indexes a (days x windows) hit matrix onto the grid, giving a (days x grid windows) hit matrix.
+
+    :raises ValueError: If a hit falls on a window that is not part of the grid.
+    """
+    if np.any(hits & (grid_idx < 0)):
+        raise ValueError("Problem with time window")
+
+    on_grid = np.zeros((hits.shape[0], n_grid), dtype=bool)
+    days, windows = np.nonzero(hits)
+    on_grid[days, grid_idx[days, windows]] = True
+    return on_grid
+
+
+def _slot_columns(offsets: np.ndarray, resolution: int) -> tuple:
+    """
+    Columns of bars at the given offsets from the start of a layout.
+
+    Bars on slot boundaries take the boundary's column. When some bars fall between boundaries,
+    every slot is split in a boundary column and a half slot column holding the bars after it, so
+    an inclusive window from one boundary to another takes exactly its bars.
+
+    :return: Tuple of the columns and the number of columns per slot, 1 or 2.
+    """
+    slots, remainders = np.divmod(offsets, resolution)
+    if not np.any(remainders):
+        return slots, 1
+    return 2 * slots + (remainders != 0), 2
+
+
+def _window_columns(offsets_ns: np.ndarray, window_ns: int, resolution: int, split: int) -> tuple:
+    """Start columns and width in columns of inclusive windows on a layout of `split` columns per slot."""
+    offsets_ns = np.asarray(offsets_ns, dtype=np.int64)
+    return offsets_ns // resolution * split, window_ns // resolution * split + 1
+
+
+def _sliding_extreme(matrix: np.ndarray, width: int, ufunc, fill: float) -> np.ndarray:
+    """Max or min over every run of `width` consecutive columns, one row at a time."""
+    n_rows, n_cols = matrix.shape
+    n_blocks = -(-n_cols // width)
+    padded = np.full((n_rows, n_blocks * width), fill, dtype=matrix.dtype)
+    padded[:, :n_cols] = matrix
+
+    blocks = padded.reshape(n_rows, n_blocks, width)
+    prefix = ufunc.accumulate(blocks, axis=2).reshape(n_rows, -1)
+    suffix = ufunc.accumulate(blocks[:, :, ::-1], axis=2)[:, :, ::-1].reshape(n_rows, -1)
+
+    n_out = n_blocks * width - width + 1
+    return ufunc(suffix[:, :n_out], prefix[:, width - 1:])
+
+
+def _sparse_table(matrix: np.ndarray, n_levels: int, ufunc) -> list:
+    """Levels of a sparse table along the columns; level k has one column per run of 2**k columns."""
+    levels = [matrix]
+    for level in range(1, n_levels):
+        previous = levels[-1]
+        half = 1 << (level - 1)
+        if previous.shape[1] <= half:
+            break
+        levels.append(ufunc(previous[:, :-half], previous[:, half:]))
+    return levels
+
+
+def _range_extreme(levels: list, starts: np.ndarray, widths: np.ndarray, ufunc) -> np.ndarray:
+    """Extremes over [start, start + width) from a one-row sparse table, for widths of at least one."""
+    extremes = np.empty(starts.shape, dtype=levels[0].dtype)
+    level_of = np.floor(np.log2(np.maximum(widths, 1))).astype(np.int64)
+    for level in np.unique(level_of):
+        selected = level_of == level
+        row = levels[level][0]
+        first = starts[selected]
+        extremes[selected] = ufunc(row[first], row[first + widths[selected] - (1 << level)])
+    return extremes
+
+
+def _sorted_prices(bar_times: np.ndarray, highs: np.ndarray, lows: np.ndarray, decimals: int = None) -> tuple:
+    """
+    Bar times, highs and lows sorted by time, with missing prices replaced by fills that never win
+    a max or a min.
+
+    :return: Tuple of the times, highs, lows, high fill and low fill.
+    """
+    times = np.asarray(bar_times, dtype=np.int64)
+    if decimals is None:
+        # Missing prices are skipped, as pandas' max/min do
+        highs = np.asarray(highs, dtype=np.result_type(highs, np.float32))
+        lows = np.asarray(lows, dtype=np.result_type(lows, np.float32))
+        high_fill, low_fill = -np.inf, np.inf
+        highs = np.where(np.isnan(highs), high_fill, highs)
+        lows = np.where(np.isnan(lows), low_fill, lows)
+    else:
+        highs = np.asarray(highs, dtype=np.int32)
+        lows = np.asarray(lows, dtype=np.int32)
+        high_fill, low_fill = INT32.min, INT32.max
+
+    if len(times) and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind='stable')
+        times, highs, lows = times[order], highs[order], lows[order]
+    return times, highs, lows, high_fill, low_fill
+
+
+def _as_prices(values: np.ndarray, decimals: int = None) -> np.ndarray:
+    """Decodes extremes to float64 prices, with NaN for the fill of empty slots."""
+    if decimals is not None:
+        return decode_prices(values, decimals)
+    return np.where(np.isinf(values), np.nan, values.astype(np.float64))
+
+
+def _wall_clock_time_of_day(utc_ns: np.ndarray, timezone: str) -> np.ndarray:
+    """Nanoseconds since local midnight in `timezone` for an array of UTC nanosecond stamps."""
+    local = pd.DatetimeIndex(pd.to_datetime(utc_ns.ravel(), unit='ns', utc=True)).tz_convert(timezone)
+    wall = local.tz_localize(None).as_unit('ns').asi8
+    return (wall % DAY_NS).reshape(utc_ns.shape)
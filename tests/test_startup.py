@@ -0,0 +1,25 @@
+import os
+import sys
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from benchmarks.run_benchmarks import benchmark_startup, STARTUP_TARGET_SECONDS
+
+
+@pytest.fixture(scope='module')
+def startup_records():
+    """Startup of main.py --help and of parsing run.cfg, timed over a few fresh interpreters."""
+    records, _ = benchmark_startup(repeats=5, target=STARTUP_TARGET_SECONDS)
+    return {record['stage']: record for record in records}
+
+
+@pytest.mark.parametrize('stage', ['startup_help', 'startup_config'])
+def test_startup_meets_target(startup_records, stage):
+    assert startup_records[stage]['seconds'] <= STARTUP_TARGET_SECONDS
+
+
+@pytest.mark.parametrize('stage', ['startup_help', 'startup_config'])
+def test_startup_imports_no_lazy_module(startup_records, stage):
+    assert startup_records[stage]['lazy_imports'] == []
@@ -0,0 +1,56 @@
+import os
+import sys
+import types
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from benchmarks.synthetic_data import generate_fx_bars
+from src.period import Period
+from src.fx_time_interval_scanner import FxTimeIntervalScanner
+from src.market_data_service import MarketDataService
+
+
+def market_data_service(filename):
+    config = types.SimpleNamespace(
+        use_api=False, historical_data_filename=filename, use_bar_cache=False, bar_cache_dir='',
+        use_ticks=False, tick_data_filename='', tick_chunk_size=1, tick_price='mid')
+    return MarketDataService(config)
+
+
+def run_scanner(filename, streaming, min_session_coverage=0.0):
+    scanner = FxTimeIntervalScanner(
+        Period('5min'), 'EURUSD', Period('60min'), Period('1Y'), filename, market_data_service(filename),
+        0.0, 'Europe/London', 'Europe/London', '0900', streaming=streaming,
+        min_session_coverage=min_session_coverage, quiet=True)
+    scanner.run_scanner()
+    return scanner
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Working directory of a run, the market data being read from its data folder."""
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'output').mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / 'data'
+
+
+def test_streaming_matches_in_memory_scan(data_dir):
+    generate_fx_bars(days=20, timezone='Europe/London').to_csv(data_dir / 'bars.csv')
+
+    streamed = run_scanner('bars.csv', streaming=True)
+    in_memory = run_scanner('bars.csv', streaming=False)
+
+    assert streamed.n_days == in_memory.n_days > 0
+    for counter in ('high_counter_df', 'low_counter_df', 'low_or_high_counter_df'):
+        assert getattr(streamed, counter).equals(getattr(in_memory, counter))
+
+
+def test_streaming_with_every_session_left_out(data_dir):
+    generate_fx_bars(days=20, timezone='Europe/London').iloc[::20].to_csv(data_dir / 'sparse.csv')
+
+    scanner = run_scanner('sparse.csv', streaming=True, min_session_coverage=0.5)
+
+    assert scanner.n_days == 0
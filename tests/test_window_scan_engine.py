@@ -0,0 +1,56 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from benchmarks.synthetic_data import generate_fx_bars
+from src.period import Period
+from src.bar_series import BarSeries
+from src.utils import create_overlapping_time_grid, high_low_per_window
+from src.window_scan_engine import WindowScanEngine
+
+
+def london_bars(start, bar_offset):
+    """Synthetic bars over a DST change, as London wall-clock times read back to UTC."""
+    bars = generate_fx_bars(start=start, days=14, timezone='Europe/London')
+    bars.index = bars.index.tz_localize('Europe/London', ambiguous='infer').tz_convert('UTC') + bar_offset
+    return bars
+
+
+def reference_extremes(bars, day_open, tick_interval, high_low_interval):
+    """Lowest low and highest high of every window of one session, with utils.high_low_per_window."""
+    session_close = day_open + pd.Timedelta(days=1)
+    session_bars = bars[(bars.index >= day_open) & (bars.index < session_close)]
+    windows = create_overlapping_time_grid(day_open, session_close, tick_interval, high_low_interval, False)
+    return np.array([high_low_per_window(window, session_bars) for window in windows]).T
+
+
+@pytest.mark.parametrize('start', ['2020-03-22', '2020-10-18'])
+@pytest.mark.parametrize('tick_interval, high_low_interval, bar_offset', [
+    ('15min', '60min', pd.Timedelta(0)),
+    ('10min', '25min', pd.Timedelta(0)),
+    # Bars off the slot grid fall in half slots
+    ('15min', '60min', pd.Timedelta(minutes=2)),
+])
+def test_window_extremes_match_high_low_per_window(start, tick_interval, high_low_interval, bar_offset):
+    tick_interval, high_low_interval = Period(tick_interval), Period(high_low_interval)
+    bars = london_bars(start, bar_offset)
+    session_dates = pd.date_range(start, periods=13, freq='D')
+    day_opens = (session_dates + pd.Timedelta(hours=9)).tz_localize('Europe/London').tz_convert('UTC')
+
+    engine = WindowScanEngine(tick_interval, high_low_interval)
+    compact = BarSeries.from_frame(bars, bars.index)
+    scans = [
+        engine.scan(bars.index.as_unit('ns').asi8, bars['high'].to_numpy(), bars['low'].to_numpy(), day_opens.asi8),
+        engine.scan_bars(compact, day_opens.asi8),
+    ]
+
+    for day, day_open in enumerate(day_opens):
+        low, high = reference_extremes(bars, day_open, tick_interval, high_low_interval)
+        for scan in scans:
+            np.testing.assert_array_equal(scan.window_low[day], low)
+            np.testing.assert_array_equal(scan.window_high[day], high)